@@ -0,0 +1,747 @@
+"""
+Benchmark - End-to-end timings for every Claude Modeling Labs MCP tool
+
+Runs each @mcp.tool() function against the in-memory controller in mock_cml.py
+at several lab sizes and reports p50/p99 latency and the number of API requests
+per call. No live controller is needed, so regressions can be caught locally.
+A second table sweeps the interface tools over nodes with 4, 16 and 48
+interfaces, against controllers with and without bulk (data=true) listings.
+With --tls-server the mock is also served over HTTPS by uvicorn, to measure
+the connection pool and wait_for_lab_nodes on the event websocket.
+
+    python benchmark.py                              # 100, 1000 and 10000 nodes
+    python benchmark.py --scales 100 --iterations 5  # quick run
+    python benchmark.py --latency 0.005 --error-rate 0.01
+
+License: MIT
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import argparse
+import datetime
+import tempfile
+import threading
+import contextlib
+import subprocess
+import logging
+from typing import Dict, List, Tuple, Any, Callable, Awaitable
+
+import httpx
+
+import claude_modeling_labs as cml
+from mock_cml import MockCML
+
+BASE_URL = "http://mock-cml"
+
+# Tools timed against nodes of growing interface counts, with and without bulk listings
+INTERFACE_SWEEP_TOOLS = ("get_node_interfaces", "get_physical_interfaces")
+
+
+class Scenario:
+    """How to call one tool: a setup coroutine producing its arguments, run once per iteration"""
+
+    def __init__(self, tool: str, setup: Callable[[], Awaitable[Dict[str, Any]]], build: bool = False, variant: str = ""):
+        """
+        Initialize the scenario
+
+        Args:
+            tool: Name of the MCP tool
+            setup: Coroutine function returning the keyword arguments for one call; not timed
+            build: Whether the call builds a lab of the full scale, run --build-iterations times
+            variant: Label telling apart scenarios that call the same tool with different arguments (optional)
+        """
+        self.tool = tool
+        self.setup = setup
+        self.build = build
+        self.variant = variant
+
+    @property
+    def name(self) -> str:
+        """Name shown in the report"""
+        return f"{self.tool}[{self.variant}]" if self.variant else self.tool
+
+
+def _tool_names() -> List[str]:
+    """Names of every @mcp.tool() function, in source order"""
+    with open(cml.__file__, encoding="utf-8") as source:
+        return re.findall(r"@mcp\.tool\(\)\s*\n(?:@\w+\s*\n)*async def (\w+)", source.read())
+
+
+def _percentile(samples: List[float], percentile: float) -> float:
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(samples)
+    return ordered[max(0, min(len(ordered) - 1, int(round(percentile / 100.0 * len(ordered) + 0.5)) - 1))]
+
+
+def _is_error(result: Any) -> bool:
+    """Whether a tool result reports a failure, following the tools' error conventions"""
+    if isinstance(result, dict):
+        return "error" in result or result.get("status") in ("failed", "partial")
+    if isinstance(result, str):
+        return result.startswith("Error")
+    return False
+
+
+class Bench:
+    """Fixture state shared by the scenarios for one scale"""
+
+    def __init__(self, mock: MockCML, scale: int):
+        self.mock = mock
+        self.scale = scale
+        self.counter = 0
+        self.fixture_lab = None
+        self.fixture_nodes = []
+        self.scratch_lab = None
+        self.spec = cml._plan_ospf_network(scale, "ring", title="bench-fixture")
+
+    def unique(self, prefix: str) -> str:
+        self.counter += 1
+        return f"{prefix}-{self.counter}"
+
+    async def prepare(self) -> None:
+        """Build the fixture lab through the API and seed labs for the listing tools"""
+        result = await cml.import_topology(self.spec)
+        if _is_error(result):
+            raise RuntimeError(f"Could not import the fixture lab: {result}")
+        self.fixture_lab = result["lab_id"]
+        self.fixture_nodes = list(result["node_ids"].values())
+        self.scratch_lab = self.mock.add_lab("bench-scratch")["id"]
+        for index in range(self.scale):
+            self.mock.add_lab(f"bench-seed-{index}", owner="admin" if index % 2 else "other", state="STOPPED" if index % 3 else "DEFINED_ON_CORE")
+
+    def scratch_node(self, interface_count: int = 0, node_definition: str = "iosv") -> str:
+        return self.mock.add_node(self.scratch_lab, self.unique("n"), node_definition, interface_count=interface_count)["id"]
+
+    def scenarios(self) -> List[Scenario]:
+        mock = self.mock
+        scale = self.scale
+        fixture = self.fixture_lab
+
+        async def initialize_client():
+            return {"base_url": BASE_URL, "username": mock.username, "password": mock.password}
+
+        async def fixture_lab():
+            return {"lab_id": fixture}
+
+        async def fixture_node():
+            return {"lab_id": fixture, "node_id": self.fixture_nodes[0]}
+
+        async def new_lab():
+            return {"lab_id": mock.add_lab(self.unique("bench-delete"))["id"]}
+
+        async def teardown():
+            title = self.unique("bench-teardown")
+            for _ in range(5):
+                lab_id = mock.add_lab(title, state="STARTED")["id"]
+                mock.add_node(lab_id, "R1", "iosv", interface_count=1)
+            return {"title_contains": title, "dry_run": False}
+
+        async def add_node():
+            return {"lab_id": self.scratch_lab, "label": self.unique("node"), "node_definition": "iosv"}
+
+        async def create_interface():
+            return {"lab_id": self.scratch_lab, "node_id": self.scratch_node(), "slot": 3}
+
+        async def create_link_v3():
+            interface_a = mock._add_interface(mock.nodes[self.scratch_node()], 0)
+            interface_b = mock._add_interface(mock.nodes[self.scratch_node()], 0)
+            return {"lab_id": self.scratch_lab, "interface_id_a": interface_a["id"], "interface_id_b": interface_b["id"]}
+
+        async def link_nodes():
+            return {"lab_id": self.scratch_lab, "node_id_a": self.scratch_node(4), "node_id_b": self.scratch_node(4)}
+
+        async def delete_link():
+            interface_a = mock._add_interface(mock.nodes[self.scratch_node()], 0)
+            interface_b = mock._add_interface(mock.nodes[self.scratch_node()], 0)
+            return {"lab_id": self.scratch_lab, "link_id": mock.add_link(self.scratch_lab, interface_a["id"], interface_b["id"])["id"]}
+
+        async def configure_node():
+            return {"lab_id": fixture, "node_id": self.fixture_nodes[0], "config": f"hostname {self.unique('R')}"}
+
+        async def configure_nodes():
+            # Change every configuration so each call uploads the whole lab
+            revision = self.unique("revision")
+            return {"lab_id": fixture, "configs": {node_id: f"hostname R\n! {revision}" for node_id in self.fixture_nodes}}
+
+        async def start_lab():
+            mock.set_lab_state(fixture, "STOPPED", "STOPPED")
+            return {"lab_id": fixture}
+
+        async def wait_for_lab_nodes():
+            mock.set_lab_state(fixture, "STARTED", "BOOTED")
+            return {"lab_id": fixture, "use_events": False}
+
+        async def stop_lab():
+            mock.set_lab_state(fixture, "STARTED", "BOOTED")
+            return {"lab_id": fixture, "wait": True}
+
+        async def topology_spec():
+            return {"spec": dict(self.spec, title=self.unique("bench-import"))}
+
+        async def render_config_template():
+            return {
+                "template": "basic-router",
+                "variable_sets": [
+                    {"hostname": f"R{index}", "interface_ip": f"10.{index // 256 % 256}.{index % 256}.1", "interface_mask": "255.255.255.0"}
+                    for index in range(scale)
+                ]
+            }
+
+        async def stp_config():
+            return {"switch_name": "SW1"}
+
+        def switching_fabric(push):
+            async def setup():
+                # Same 4/16/80 tier split create_stp_lab uses, which keeps every switch within 16 interfaces
+                num_core = max(2, scale * 4 // 100)
+                num_distribution = max(2, scale * 16 // 100)
+                return {
+                    "title": self.unique("bench-fabric"),
+                    "num_core": num_core,
+                    "num_distribution": num_distribution,
+                    "num_access": max(2, scale - num_core - num_distribution),
+                    "push": push
+                }
+            return setup
+
+        def stp_lab(push):
+            return lambda: no_arguments_with(title=self.unique("bench-stp"), num_switches=scale, push=push)
+
+        def ospf_network(push):
+            return lambda: no_arguments_with(title=self.unique("bench-ospf"), num_routers=scale, push=push)
+
+        async def no_arguments():
+            return {}
+
+        return [
+            Scenario("initialize_client", initialize_client),
+            Scenario("list_labs", no_arguments),
+            Scenario("create_lab", lambda: no_arguments_with(title=self.unique("bench-create"))),
+            Scenario("get_lab_details", fixture_lab),
+            Scenario("delete_lab", new_lab),
+            Scenario("teardown_labs", teardown),
+            Scenario("list_node_definitions", lambda: no_arguments_with(refresh=True)),
+            Scenario("get_lab_nodes", fixture_lab),
+            Scenario("add_node", add_node),
+            Scenario("create_router", lambda: no_arguments_with(lab_id=self.scratch_lab, label=self.unique("router"))),
+            Scenario("create_switch", lambda: no_arguments_with(lab_id=self.scratch_lab, label=self.unique("switch"))),
+            Scenario("get_node_interfaces", fixture_node),
+            Scenario("get_physical_interfaces", fixture_node),
+            Scenario("get_lab_interfaces", fixture_lab),
+            Scenario("create_interface", create_interface),
+            Scenario("create_link_v3", create_link_v3),
+            Scenario("link_nodes", link_nodes),
+            Scenario("get_lab_links", fixture_lab),
+            Scenario("delete_link", delete_link),
+            Scenario("configure_node", configure_node),
+            Scenario("get_node_config", fixture_node),
+            Scenario("configure_nodes", configure_nodes),
+            Scenario("start_lab", start_lab),
+            Scenario("wait_for_lab_nodes", wait_for_lab_nodes),
+            Scenario("stop_lab", stop_lab),
+            Scenario("get_lab_topology", lambda: no_arguments_with(lab_id=fixture, refresh=True)),
+            Scenario("import_topology", topology_spec, build=True),
+            Scenario("validate_topology", topology_spec),
+            Scenario("render_config_template", render_config_template),
+            Scenario("create_simple_network", no_arguments),
+            Scenario("generate_switch_stp_config", stp_config),
+            # Builds run once per push mode, so the gain from importing a whole topology is measured
+            Scenario("create_switching_fabric", switching_fabric("import"), build=True, variant="import"),
+            Scenario("create_switching_fabric", switching_fabric("api"), build=True, variant="api"),
+            Scenario("create_stp_lab", stp_lab("import"), build=True, variant="import"),
+            Scenario("create_stp_lab", stp_lab("api"), build=True, variant="api"),
+            Scenario("create_ospf_network", ospf_network("import"), build=True, variant="import"),
+            Scenario("create_ospf_network", ospf_network("api"), build=True, variant="api"),
+            Scenario("create_ospf_lab", no_arguments)
+        ]
+
+
+async def no_arguments_with(**kwargs: Any) -> Dict[str, Any]:
+    """Setup returning fixed keyword arguments"""
+    return kwargs
+
+
+@contextlib.contextmanager
+def _mock_transport(mock: MockCML):
+    """Route every CMLAuth the tools create, including initialize_client's, to the mock"""
+    original = cml.CMLAuth
+
+    class MockCMLAuth(original):
+        def __init__(self, *args, **kwargs):
+            kwargs.setdefault("transport", httpx.ASGITransport(app=mock))
+            super().__init__(*args, **kwargs)
+
+    cml.CMLAuth = MockCMLAuth
+    try:
+        yield
+    finally:
+        cml.CMLAuth = original
+
+
+def _reset_module_state() -> None:
+    """Forget per-controller caches so every scale starts cold"""
+    for cache in (cml._interface_indexes, cml._config_hashes, cml._lab_graphs):
+        cache.clear()
+
+
+async def _time_calls(
+    mock: MockCML,
+    tool_name: str,
+    setup: Callable[[], Awaitable[Dict[str, Any]]],
+    iterations: int,
+    args: argparse.Namespace,
+    label: str
+) -> Dict[str, Any]:
+    """
+    Call one tool repeatedly and summarize its latency and API requests
+
+    Args:
+        mock: Controller the tool talks to
+        tool_name: Name of the MCP tool
+        setup: Coroutine function returning the keyword arguments for one call; not timed
+        iterations: Number of calls
+        args: Parsed command line arguments
+        label: Prefix for printed errors
+
+    Returns:
+        Result row with the call count, p50/p99 latency, mean requests per call and errors
+    """
+    tool = getattr(cml, tool_name)
+    timings = []
+    request_counts = []
+    errors = 0
+    for _ in range(iterations):
+        kwargs = await setup()
+        mock.reset_counts()
+        start_time = time.perf_counter()
+        try:
+            result = await tool(**kwargs)
+        except Exception as e:
+            result = {"error": f"{type(e).__name__}: {e}"}
+        timings.append(time.perf_counter() - start_time)
+        request_counts.append(mock.total_requests)
+        if _is_error(result):
+            errors += 1
+            if args.show_errors:
+                print(f"[{label}] {tool_name}: {str(result)[:300]}", file=sys.stderr)
+    return {
+        "tool": tool_name,
+        "calls": len(timings),
+        "p50_ms": _percentile(timings, 50) * 1000,
+        "p99_ms": _percentile(timings, 99) * 1000,
+        "requests": sum(request_counts) / len(request_counts),
+        "errors": errors
+    }
+
+
+async def run_scale(scale: int, args: argparse.Namespace, tools: List[str]) -> List[Dict[str, Any]]:
+    """
+    Run every selected scenario against a fresh mock controller
+
+    Args:
+        scale: Number of nodes in the fixture lab and of seeded labs
+        args: Parsed command line arguments
+        tools: Names of the tools to run
+
+    Returns:
+        One result row per tool
+    """
+    mock = MockCML(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=0.0,
+        boot_time=args.boot_time,
+        seed=args.seed
+    )
+    rows = []
+    with _mock_transport(mock):
+        _reset_module_state()
+        await cml.initialize_client(BASE_URL, mock.username, mock.password)
+        bench = Bench(mock, scale)
+        await bench.prepare()
+
+        # Faults only start once the fixture exists, so every scale measures the same lab
+        mock.error_rate = args.error_rate
+
+        for scenario in bench.scenarios():
+            if scenario.tool not in tools:
+                continue
+            iterations = args.build_iterations if scenario.build else args.iterations
+            row = await _time_calls(mock, scenario.tool, scenario.setup, iterations, args, str(scale))
+            rows.append(dict(row, scale=scale, tool=scenario.name))
+            print(f"  {scale:>6}  {scenario.name:<32} p50 {rows[-1]['p50_ms']:10.2f} ms", file=sys.stderr)
+
+        await cml.cml_auth.client.aclose()
+    return rows
+
+
+async def run_interface_sweep(counts: List[int], args: argparse.Namespace, tools: List[str]) -> List[Dict[str, Any]]:
+    """
+    Time the interface tools on nodes with more and more interfaces
+
+    Each count is measured twice: once with listings that honour data=true,
+    and once against a controller that only returns IDs, which forces one
+    request per interface. The mock always adds --sweep-latency, since the
+    cost of those extra round trips is invisible without it.
+
+    Args:
+        counts: Interface counts to sweep
+        args: Parsed command line arguments
+        tools: Names of the tools to run
+
+    Returns:
+        One result row per interface count, listing mode and tool
+    """
+    mock = MockCML(latency=args.sweep_latency, jitter=args.jitter, seed=args.seed)
+    rows = []
+    with _mock_transport(mock):
+        _reset_module_state()
+        await cml.initialize_client(BASE_URL, mock.username, mock.password)
+        lab_id = mock.add_lab("bench-interfaces")["id"]
+        for count in counts:
+            node_id = mock.add_node(lab_id, f"R{count}", "iosv", interface_count=count)["id"]
+            for listing in ("bulk", "per-interface"):
+                mock.bulk_listings = listing == "bulk"
+                for tool_name in INTERFACE_SWEEP_TOOLS:
+                    if tool_name not in tools:
+                        continue
+                    row = await _time_calls(mock, tool_name, lambda: no_arguments_with(lab_id=lab_id, node_id=node_id), args.iterations, args, f"{count} interfaces")
+                    rows.append(dict(row, interfaces=count, listing=listing))
+                    print(f"  {count:>6}  {tool_name:<28} {listing:<14} p50 {row['p50_ms']:10.2f} ms", file=sys.stderr)
+        await cml.cml_auth.client.aclose()
+    return rows
+
+
+def _self_signed_certificate(directory: str) -> Tuple[str, str]:
+    """
+    Write a throwaway certificate and key for 127.0.0.1
+
+    Uses the cryptography package when it is installed and the openssl
+    command line tool otherwise.
+
+    Args:
+        directory: Directory to write cert.pem and key.pem to
+
+    Returns:
+        Tuple of (certificate path, key path)
+    """
+    certfile = os.path.join(directory, "cert.pem")
+    keyfile = os.path.join(directory, "key.pem")
+    try:
+        import ipaddress
+        from cryptography import x509
+        from cryptography.x509.oid import NameOID
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import ec
+    except ImportError:
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "ec", "-pkeyopt", "ec_paramgen_curve:prime256v1", "-nodes",
+             "-keyout", keyfile, "-out", certfile, "-days", "1", "-subj", "/CN=127.0.0.1"],
+            check=True,
+            capture_output=True
+        )
+        return certfile, keyfile
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=5))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]), critical=False)
+        .sign(key, hashes.SHA256())
+    )
+    with open(certfile, "wb") as output:
+        output.write(certificate.public_bytes(serialization.Encoding.PEM))
+    with open(keyfile, "wb") as output:
+        output.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+    return certfile, keyfile
+
+
+@contextlib.asynccontextmanager
+async def _tls_server(mock: MockCML):
+    """
+    Serve the mock over HTTPS with uvicorn on a free local port, in a background thread
+
+    The mock is only touched from the server's event loop while it runs, so
+    scenarios have to change it through the API rather than its seeding helpers.
+
+    Yields:
+        Base URL of the server
+    """
+    import uvicorn
+
+    with tempfile.TemporaryDirectory() as directory:
+        certfile, keyfile = _self_signed_certificate(directory)
+        config = uvicorn.Config(mock, host="127.0.0.1", port=0, ssl_certfile=certfile, ssl_keyfile=keyfile, log_level="warning")
+        server = uvicorn.Server(config)
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        while not server.started:
+            if not thread.is_alive():
+                raise RuntimeError("uvicorn failed to start")
+            await asyncio.sleep(0.01)
+        port = server.servers[0].sockets[0].getsockname()[1]
+        try:
+            yield f"https://127.0.0.1:{port}"
+        finally:
+            server.should_exit = True
+            await asyncio.get_running_loop().run_in_executor(None, thread.join)
+
+
+async def run_pool_benchmark(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """
+    Measure API throughput over real TLS connections for several pool sizes, with HTTP/2 off and on
+
+    uvicorn only speaks HTTP/1.1, and httpx falls back to it when the h2
+    package is missing, so the protocol column reports what was actually
+    negotiated rather than what was asked for.
+
+    Args:
+        args: Parsed command line arguments
+
+    Returns:
+        One result row per pool size and HTTP/2 setting
+    """
+    mock = MockCML(latency=args.pool_latency, jitter=args.jitter, seed=args.seed)
+    lab_id = mock.add_lab("bench-pool")["id"]
+    rows = []
+    async with _tls_server(mock) as base_url:
+        for max_connections in [int(size) for size in args.pool_sizes.split(",") if size.strip()]:
+            for http2 in (False, True):
+                _reset_module_state()
+                await cml.initialize_client(
+                    base_url,
+                    mock.username,
+                    mock.password,
+                    verify_ssl=False,
+                    max_concurrency=args.pool_concurrency,
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections,
+                    http2=http2
+                )
+                # Warm the pool so handshakes are measured once per connection, not per run
+                await cml.cml_auth.request_many([("GET", f"/api/v0/labs/{lab_id}")] * max_connections)
+                start_time = time.perf_counter()
+                responses = await cml.cml_auth.request_many([("GET", f"/api/v0/labs/{lab_id}")] * args.pool_requests)
+                elapsed = time.perf_counter() - start_time
+                protocols = {response.http_version for response in responses if isinstance(response, httpx.Response)}
+                rows.append({
+                    "max_connections": max_connections,
+                    "http2": http2,
+                    "protocol": ",".join(sorted(protocols)) or "-",
+                    "requests": len(responses),
+                    "seconds": elapsed,
+                    "requests_per_second": len(responses) / elapsed,
+                    "errors": sum(1 for response in responses if not isinstance(response, httpx.Response))
+                })
+                print(f"  pool {max_connections:>4}  http2={http2!s:<5} {rows[-1]['requests_per_second']:10.1f} req/s", file=sys.stderr)
+                await cml.cml_auth.client.aclose()
+    return rows
+
+
+async def run_event_benchmark(args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """
+    Time wait_for_lab_nodes following the event websocket and polling, over a real TLS socket
+
+    The lab is started through the API each time, so nodes boot on the
+    server's event loop and their state changes reach /ws/client like they
+    would from a controller.
+
+    Args:
+        args: Parsed command line arguments
+
+    Returns:
+        One result row for the event stream and one for polling
+    """
+    mock = MockCML(latency=args.pool_latency, boot_time=args.event_boot_time, seed=args.seed)
+    lab_id = mock.add_lab("bench-events", state="STOPPED")["id"]
+    for index in range(args.event_nodes):
+        mock.add_node(lab_id, f"R{index}", "iosv")
+    rows = []
+    async with _tls_server(mock) as base_url:
+        _reset_module_state()
+        await cml.initialize_client(base_url, mock.username, mock.password, verify_ssl=False)
+        for use_events in (True, False):
+            await cml.start_lab(lab_id)
+            # The server is idle between calls, so its counters can be read from here
+            requests_before = mock.total_requests
+            start_time = time.perf_counter()
+            result = await cml.wait_for_lab_nodes(lab_id, timeout=max(10, int(args.event_boot_time * 4)), use_events=use_events)
+            elapsed = time.perf_counter() - start_time
+            stream = cml.cml_auth._event_stream
+            rows.append({
+                "mode": "events" if use_events else "polling",
+                "nodes": args.event_nodes,
+                "stream": "connected" if use_events and stream and stream.connected else "-",
+                "seconds": elapsed,
+                "requests": mock.total_requests - requests_before,
+                "errors": 0 if result.startswith("All nodes") else 1
+            })
+            if args.show_errors and rows[-1]["errors"]:
+                print(f"[events] wait_for_lab_nodes: {result[:300]}", file=sys.stderr)
+            print(f"  {rows[-1]['mode']:<8} {elapsed:8.2f} s  {rows[-1]['requests']} requests", file=sys.stderr)
+            await cml.stop_lab(lab_id, wait=True)
+        if cml.cml_auth._event_stream:
+            await cml.cml_auth._event_stream.close()
+        await cml.cml_auth.client.aclose()
+    return rows
+
+
+def format_table(rows: List[Dict[str, Any]], args: argparse.Namespace) -> str:
+    """Render result rows as a fixed-width table"""
+    lines = [
+        f"Claude Modeling Labs benchmark - {time.strftime('%Y-%m-%d %H:%M:%S')}",
+        f"iterations={args.iterations} build_iterations={args.build_iterations} latency={args.latency}s "
+        f"jitter={args.jitter}s error_rate={args.error_rate} boot_time={args.boot_time}s",
+        "",
+        f"{'scale':>6}  {'tool':<32} {'calls':>5} {'p50 ms':>10} {'p99 ms':>10} {'req/call':>9} {'errors':>6}"
+    ]
+    for row in rows:
+        lines.append(
+            f"{row['scale']:>6}  {row['tool']:<32} {row['calls']:>5} {row['p50_ms']:>10.2f} "
+            f"{row['p99_ms']:>10.2f} {row['requests']:>9.1f} {row['errors']:>6}"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def format_sweep_table(rows: List[Dict[str, Any]], args: argparse.Namespace) -> str:
+    """Render interface sweep rows as a fixed-width table"""
+    lines = [
+        f"Interface sweep - latency={args.sweep_latency}s; per-interface means the controller ignores data=true",
+        "",
+        f"{'ifaces':>6}  {'tool':<28} {'listing':<14} {'calls':>5} {'p50 ms':>10} {'p99 ms':>10} {'req/call':>9} {'errors':>6}"
+    ]
+    for row in rows:
+        lines.append(
+            f"{row['interfaces']:>6}  {row['tool']:<28} {row['listing']:<14} {row['calls']:>5} {row['p50_ms']:>10.2f} "
+            f"{row['p99_ms']:>10.2f} {row['requests']:>9.1f} {row['errors']:>6}"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def format_pool_table(rows: List[Dict[str, Any]], args: argparse.Namespace) -> str:
+    """Render connection pool rows as a fixed-width table"""
+    lines = [
+        f"Connection pool over TLS (uvicorn) - latency={args.pool_latency}s concurrency={args.pool_concurrency}",
+        "",
+        f"{'pool':>6}  {'http2':<5} {'protocol':<10} {'requests':>8} {'seconds':>8} {'req/s':>9} {'errors':>6}"
+    ]
+    for row in rows:
+        lines.append(
+            f"{row['max_connections']:>6}  {row['http2']!s:<5} {row['protocol']:<10} {row['requests']:>8} "
+            f"{row['seconds']:>8.2f} {row['requests_per_second']:>9.1f} {row['errors']:>6}"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def format_event_table(rows: List[Dict[str, Any]], args: argparse.Namespace) -> str:
+    """Render event stream rows as a fixed-width table"""
+    lines = [
+        f"wait_for_lab_nodes over TLS (uvicorn) - boot_time={args.event_boot_time}s latency={args.pool_latency}s",
+        "",
+        f"{'mode':<8} {'nodes':>6} {'stream':<10} {'seconds':>8} {'requests':>8} {'errors':>6}"
+    ]
+    for row in rows:
+        lines.append(
+            f"{row['mode']:<8} {row['nodes']:>6} {row['stream']:<10} {row['seconds']:>8.2f} {row['requests']:>8} {row['errors']:>6}"
+        )
+    return "\n".join(lines) + "\n"
+
+
+async def main_async(args: argparse.Namespace) -> int:
+    tools = _tool_names()
+    covered = {scenario.tool for scenario in Bench(MockCML(), 2).scenarios()}
+    missing = [tool for tool in tools if tool not in covered]
+    if missing:
+        print(f"No benchmark scenario for: {', '.join(missing)}", file=sys.stderr)
+        return 1
+    if args.tools:
+        selected = [tool.strip() for tool in args.tools.split(",") if tool.strip()]
+        unknown = [tool for tool in selected if tool not in tools]
+        if unknown:
+            print(f"Unknown tools: {', '.join(unknown)}", file=sys.stderr)
+            return 1
+        tools = selected
+
+    # Logging is part of what's measured only when asked for; otherwise it would bury the report
+    if not args.verbose:
+        cml.logger.setLevel(logging.CRITICAL)
+
+    rows = []
+    for scale in [int(scale) for scale in args.scales.split(",")]:
+        print(f"Scale {scale}", file=sys.stderr)
+        rows.extend(await run_scale(scale, args, tools))
+
+    sweep_rows = []
+    counts = [int(count) for count in args.interface_counts.split(",") if count.strip()]
+    if counts and any(tool in tools for tool in INTERFACE_SWEEP_TOOLS):
+        print("Interface sweep", file=sys.stderr)
+        sweep_rows = await run_interface_sweep(counts, args, tools)
+
+    pool_rows = []
+    event_rows = []
+    if args.tls_server:
+        print("Connection pool over TLS", file=sys.stderr)
+        pool_rows = await run_pool_benchmark(args)
+        if "wait_for_lab_nodes" in tools:
+            print("Event stream over TLS", file=sys.stderr)
+            event_rows = await run_event_benchmark(args)
+
+    table = format_table(rows, args)
+    if sweep_rows:
+        table += "\n" + format_sweep_table(sweep_rows, args)
+    if pool_rows:
+        table += "\n" + format_pool_table(pool_rows, args)
+    if event_rows:
+        table += "\n" + format_event_table(event_rows, args)
+    print(table)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            output.write(table)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as output:
+            json.dump({"tools": rows, "interface_sweep": sweep_rows, "connection_pool": pool_rows, "event_stream": event_rows}, output, indent=2)
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark every MCP tool against the mock CML controller")
+    parser.add_argument("--scales", default="100,1000,10000", help="comma-separated lab sizes in nodes")
+    parser.add_argument("--iterations", type=int, default=20, help="calls per tool and scale")
+    parser.add_argument("--build-iterations", type=int, default=1, help="calls per scale for tools that build a full-size lab")
+    parser.add_argument("--tools", default="", help="comma-separated subset of tools to run")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the mock adds to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random delay of up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests the mock fails")
+    parser.add_argument("--boot-time", type=float, default=0.0, help="seconds the mock takes to boot a node")
+    parser.add_argument("--interface-counts", default="4,16,48", help="comma-separated interface counts for the interface sweep; empty to skip it")
+    parser.add_argument("--sweep-latency", type=float, default=0.005, help="seconds the mock adds to every response during the interface sweep")
+    parser.add_argument("--tls-server", action="store_true", help="also serve the mock over HTTPS with uvicorn and measure the connection pool")
+    parser.add_argument("--pool-sizes", default="1,4,10,20", help="comma-separated max_connections values for --tls-server")
+    parser.add_argument("--pool-requests", type=int, default=500, help="requests per pool size for --tls-server")
+    parser.add_argument("--pool-concurrency", type=int, default=32, help="max_concurrency for --tls-server, above the largest pool so the pool is the limit")
+    parser.add_argument("--pool-latency", type=float, default=0.005, help="seconds the mock adds to every response for --tls-server")
+    parser.add_argument("--event-nodes", type=int, default=20, help="nodes booted for the --tls-server wait_for_lab_nodes comparison")
+    parser.add_argument("--event-boot-time", type=float, default=2.0, help="seconds a node takes to boot for the --tls-server wait_for_lab_nodes comparison")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the mock's latency and failures")
+    parser.add_argument("--output", default="bench_output.txt", help="file for the results table")
+    parser.add_argument("--json", default="", help="also write the raw results as JSON to this file")
+    parser.add_argument("--show-errors", action="store_true", help="print failing tool results")
+    parser.add_argument("--verbose", action="store_true", help="keep the tools' logging, at the level set by CML_LOG_LEVEL")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main_async(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -14,10 +14,28 @@ import os
 import sys
 import httpx
 import json
+import base64
+import hashlib
+import ipaddress
+import math
+import random
+import re
 import warnings
 import asyncio
-import traceback
-from typing import Dict, List, Optional, Any, Union, Tuple
+import heapq
+import time
+import atexit
+import bisect
+import collections
+import contextlib
+import contextvars
+import copy
+import email.utils
+import functools
+import logging
+import logging.handlers
+from queue import SimpleQueue
+from typing import Dict, List, Optional, Any, Union, Tuple, Callable, Awaitable, AsyncIterator
 from fastmcp import FastMCP, Context, Image
 
 # Create the MCP server
@@ -29,316 +47,2715 @@ mcp = FastMCP(
 # Global state for CML client
 cml_auth = None
 
+# Interface allocation indexes, keyed by lab ID
+_interface_indexes = {}
 
-class CMLAuth:
-    """Authentication and request handling for Cisco Modeling Labs"""
+# SHA-256 of each node's configuration as last seen on the server, keyed by lab ID then node ID;
+# dropped by tools that change the lab's state
+_config_hashes = {}
+
+# When each lab's configuration hashes were last read in full, keyed by lab ID
+_config_hashes_loaded_at = {}
+
+# Seconds known configuration hashes are trusted, since configurations can be edited outside these tools
+_CONFIG_HASH_TTL = 300.0
+
+# Node states that count as up and running
+_NODE_READY_STATES = ("STARTED", "BOOTED")
+
+# Seconds between confirmation polls while following the event stream
+_EVENT_SAFETY_POLL_INTERVAL = 30.0
+
+# Compiled configuration templates, keyed by template text
+_compiled_templates = {}
+
+# Lab graphs built by get_lab_topology, keyed by lab ID; dropped by tools that change the lab
+_lab_graphs = {}
+
+# Seconds a cached lab graph is trusted, since node states change on their own while a lab boots
+_LAB_GRAPH_TTL = 15.0
+
+
+# Logging
+
+# Fields every LogRecord has; anything else passed with extra= is emitted as structured data
+_LOG_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class SamplingFilter(logging.Filter):
+    """Let through a fraction of the records below WARNING, counted per call site"""
     
-    def __init__(self, base_url: str, username: str, password: str, verify_ssl: bool = True):
+    def __init__(self, rate: float):
         """
-        Initialize the CML authentication client
+        Initialize the filter
         
         Args:
-            base_url: Base URL of the CML server
-            username: Username for CML authentication
-            password: Password for CML authentication
-            verify_ssl: Whether to verify SSL certificates
+            rate: Fraction of DEBUG and INFO records to keep, between 0 and 1
         """
-        self.base_url = base_url
-        self.username = username
-        self.password = password
-        self.token = None
-        self.verify_ssl = verify_ssl
-        self.client = httpx.AsyncClient(base_url=base_url, verify=verify_ssl)
-        
-        # Suppress SSL warnings if verify_ssl is False
-        if not verify_ssl:
-            try:
-                import urllib3
-                urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
-            except ImportError:
-                print("urllib3 not available, SSL warning suppression disabled", file=sys.stderr)
+        super().__init__()
+        self.every = max(1, round(1 / rate)) if rate > 0 else 0
+        self._seen = {}
     
-    async def authenticate(self) -> str:
-        """
-        Authenticate with CML and get a token
-        
-        Returns:
-            Authentication token
-        
-        Raises:
-            httpx.HTTPStatusError: If authentication fails
-        """
-        print(f"Authenticating with CML at {self.base_url}", file=sys.stderr)
-        response = await self.client.post(
-            "/api/v0/authenticate",
-            json={"username": self.username, "password": self.password}
-        )
-        response.raise_for_status()
-        self.token = response.text.strip('"')  # Remove any quotes from the token
-        self.client.headers.update({"Authorization": f"Bearer {self.token}"})
-        
-        # Verify the token works
-        try:
-            auth_check = await self.client.get("/api/v0/authok")
-            auth_check.raise_for_status()
-            print(f"Authentication successful, token verified", file=sys.stderr)
-        except Exception as e:
-            print(f"Warning: Token verification failed: {str(e)}", file=sys.stderr)
-            
-        return self.token
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.every == 1:
+            return True
+        if not self.every:
+            return False
+        # Keyed by the unformatted message, so a chatty call site can't crowd out the rest
+        count = self._seen.get(record.msg, 0)
+        self._seen[record.msg] = count + 1
+        return count % self.every == 0
+
+
+class JSONFormatter(logging.Formatter):
+    """Format records as one JSON object per line, including fields passed with extra="""
+    
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _LOG_RECORD_FIELDS})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that leaves exception formatting to the listener thread"""
     
-    async def request(self, method: str, endpoint: str, **kwargs) -> httpx.Response:
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
         """
-        Make an authenticated request to CML API
+        Copy a record for the queue with its message merged but its exception info kept
+        
+        The stock QueueHandler formats the whole record here, on the caller's
+        thread, and drops exc_info; keeping it lets tracebacks be formatted
+        by the listener, and lets the JSON formatter put them in their own field.
         
         Args:
-            method: HTTP method (GET, POST, PUT, DELETE)
-            endpoint: API endpoint to call
-            **kwargs: Additional arguments to pass to httpx
+            record: Record being logged
         
         Returns:
-            HTTP response
-            
-        Raises:
-            httpx.HTTPStatusError: If the request fails
+            Copy of the record, safe to hand to another thread
         """
-        if not self.token:
-            await self.authenticate()
-        
-        # Print debug info to help troubleshoot
-        print(f"Making {method} request to {endpoint}", file=sys.stderr)
-        
-        # Ensure headers contain the token
-        if "headers" not in kwargs:
-            kwargs["headers"] = {}
-        
-        # Ensure the Authorization header is set with the current token
-        kwargs["headers"]["Authorization"] = f"Bearer {self.token}"
-        
-        # Make the request
-        try:
-            response = await self.client.request(method, endpoint, **kwargs)
-            
-            # If unauthorized, try to re-authenticate once
-            if response.status_code == 401:
-                print(f"Got 401 response, re-authenticating...", file=sys.stderr)
-                await self.authenticate()
-                kwargs["headers"]["Authorization"] = f"Bearer {self.token}"
-                response = await self.client.request(method, endpoint, **kwargs)
-            
-            response.raise_for_status()
-            return response
-        except Exception as e:
-            print(f"Request error: {str(e)}", file=sys.stderr)
-            raise
+        record = copy.copy(record)
+        # Arguments may be mutated after this returns, so merge them now
+        record.msg = record.getMessage()
+        record.args = None
+        return record
 
 
-# Authentication Tools
-
-@mcp.tool()
-async def initialize_client(base_url: str, username: str, password: str, verify_ssl: bool = True) -> str:
+def _configure_logging() -> Tuple[logging.Logger, logging.handlers.QueueListener]:
     """
-    Initialize the CML client with authentication credentials
+    Set up the module logger from the environment
     
-    Args:
-        base_url: Base URL of the CML server (e.g., https://cml-server)
-        username: Username for CML authentication
-        password: Password for CML authentication
-        verify_ssl: Whether to verify SSL certificates (set to False for self-signed certificates)
+    Records go through a queue to a listener thread that writes them to
+    stderr, so logging never blocks the event loop. CML_LOG_LEVEL sets the
+    level (default: INFO; DEBUG adds every request and full payloads),
+    CML_LOG_SAMPLE_RATE keeps only that fraction of DEBUG and INFO records,
+    and CML_LOG_FORMAT=json switches to one JSON object per line.
     
     Returns:
-        A success message if authentication is successful
+        The logger and its started queue listener
     """
-    global cml_auth
-    
-    # Fix URL if it doesn't have a scheme
-    if not base_url.startswith(('http://', 'https://')):
-        base_url = f"https://{base_url}"
+    level_name = os.environ.get("CML_LOG_LEVEL", "INFO").upper()
+    level = logging.getLevelName(level_name)
+    if not isinstance(level, int):
+        level = logging.INFO
     
-    print(f"Initializing CML client with base_url: {base_url}", file=sys.stderr)
-    cml_auth = CMLAuth(base_url, username, password, verify_ssl)
+    stream_handler = logging.StreamHandler(sys.stderr)
+    if os.environ.get("CML_LOG_FORMAT", "").lower() == "json":
+        stream_handler.setFormatter(JSONFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
     
     try:
-        token = await cml_auth.authenticate()
-        print(f"Token received: {token[:10]}...", file=sys.stderr)  # Only print first 10 chars for security
-        ssl_status = "enabled" if verify_ssl else "disabled (accepting self-signed certificates)"
-        return f"Successfully authenticated with CML at {base_url} (SSL verification: {ssl_status})"
-    except httpx.HTTPStatusError as e:
-        return f"Authentication failed: {str(e)}"
-    except Exception as e:
-        print(f"Error connecting to CML: {str(e)}", file=sys.stderr)
-        traceback.print_exc(file=sys.stderr)
-        return f"Error connecting to CML: {str(e)}"
+        sample_rate = float(os.environ.get("CML_LOG_SAMPLE_RATE", "1"))
+    except ValueError:
+        sample_rate = 1.0
+    
+    queue_handler = DeferredQueueHandler(SimpleQueue())
+    if sample_rate < 1:
+        queue_handler.addFilter(SamplingFilter(sample_rate))
+    
+    module_logger = logging.getLogger("claude_modeling_labs")
+    module_logger.setLevel(level)
+    module_logger.handlers[:] = [queue_handler]
+    module_logger.propagate = False
+    
+    # httpx logs every request at INFO, which floods the host's log pipe just like our own used to
+    if level > logging.DEBUG:
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+    
+    listener = logging.handlers.QueueListener(queue_handler.queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return module_logger, listener
 
 
-# Helper Functions
+logger, _log_listener = _configure_logging()
 
-def _check_auth() -> Union[None, Dict[str, str]]:
+
+def _cache_dir() -> str:
     """
-    Check if the client is authenticated
+    Get the directory used for on-disk caches
     
     Returns:
-        None if authenticated, error dictionary if not
+        Path from the CML_CACHE_DIR environment variable, or ~/.cache/claude-modeling-labs
     """
-    if not cml_auth:
-        return {"error": "You must initialize the client first with initialize_client()"}
-    return None
+    return os.environ.get("CML_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "claude-modeling-labs")
 
 
-def _handle_api_error(operation: str, error: Exception) -> Dict[str, Any]:
+def _token_cache_key(base_url: str, username: str) -> str:
+    """Key identifying a controller and user in the token cache"""
+    return hashlib.sha256(f"{base_url}|{username}".encode("utf-8")).hexdigest()
+
+
+def _read_token_cache() -> Dict[str, Any]:
     """
-    Handle API errors consistently
+    Read the on-disk token cache
+    
+    Returns:
+        Dictionary of cache entries, empty if the cache is missing or unreadable
+    """
+    try:
+        with open(os.path.join(_cache_dir(), "tokens.json"), "r", encoding="utf-8") as cache_file:
+            entries = json.load(cache_file)
+        return entries if isinstance(entries, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_cache_file(filename: str, data: Any) -> None:
+    """
+    Atomically write a JSON file to the cache directory, readable by the current user only
     
     Args:
-        operation: Description of the operation that failed
-        error: Exception that was raised
+        filename: Name of the file in the cache directory
+        data: JSON-serializable data
+    """
+    directory = _cache_dir()
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    path = os.path.join(directory, filename)
+    temp_path = f"{path}.{os.getpid()}.tmp"
     
-    Returns:
-        Error dictionary with consistent format
+    # Create the file with restricted permissions before anything is written
+    fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w", encoding="utf-8") as cache_file:
+        json.dump(data, cache_file)
+    os.replace(temp_path, path)
+
+
+def _write_token_cache(entries: Dict[str, Any]) -> None:
     """
-    print(f"Error during {operation}: {str(error)}", file=sys.stderr)
-    traceback.print_exc(file=sys.stderr)
-    return {"error": f"Error during {operation}: {str(error)}"}
+    Write the on-disk token cache
+    
+    Args:
+        entries: Dictionary of cache entries
+    """
+    _write_cache_file("tokens.json", entries)
 
 
-# Lab Management Tools
+def _catalog_snapshot_filename(kind: str, base_url: str, version: str) -> str:
+    """Name of the catalog snapshot for a catalog kind, controller and software version"""
+    return f"{kind}-{hashlib.sha256(f'{base_url}|{version}'.encode('utf-8')).hexdigest()[:16]}.json"
 
-@mcp.tool()
-async def list_labs() -> str:
+
+def _read_catalog_snapshot(kind: str, base_url: str, version: str) -> Optional[Dict[str, Any]]:
     """
-    List all labs in CML
+    Read a catalog snapshot from disk
+    
+    Args:
+        kind: Catalog kind ("node_definitions" or "image_definitions")
+        base_url: Base URL of the controller
+        version: Controller software version
     
     Returns:
-        A formatted list of all available labs
+        Snapshot contents, or None if there is no usable snapshot
     """
-    auth_check = _check_auth()
-    if auth_check:
-        return auth_check["error"]
-    
     try:
-        print("Attempting to list labs...", file=sys.stderr)
-        response = await cml_auth.request("GET", "/api/v0/labs")
-        labs = response.json()
+        with open(os.path.join(_cache_dir(), _catalog_snapshot_filename(kind, base_url, version)), "r", encoding="utf-8") as snapshot_file:
+            snapshot = json.load(snapshot_file)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(snapshot, dict) or snapshot.get("base_url") != base_url or snapshot.get("version") != version:
+        return None
+    return snapshot
+
+
+class TTLCache:
+    """In-memory cache whose entries expire after a time-to-live"""
+    
+    def __init__(self, ttl: float):
+        """
+        Initialize an empty cache
+        
+        Args:
+            ttl: Default seconds an entry stays valid
+        """
+        self.ttl = ttl
+        self._entries = {}
+    
+    def get(self, key: str) -> Any:
+        """
+        Get an entry if it hasn't expired
         
-        print(f"Found {len(labs)} labs", file=sys.stderr)
+        Args:
+            key: Cache key
         
-        if not labs:
-            return "No labs found in CML."
+        Returns:
+            Cached value, or None if missing or expired
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() >= entry[0]:
+            del self._entries[key]
+            return None
+        return entry[1]
+    
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Store an entry
         
-        # Format the response nicely
-        result = "Available Labs:\n\n"
-        for lab_id, lab_info in labs.items():
-            result += f"- {lab_info.get('title', 'Untitled')} (ID: {lab_id})\n"
-            if lab_info.get('description'):
-                result += f"  Description: {lab_info['description']}\n"
-            result += f"  State: {lab_info.get('state', 'unknown')}\n"
+        Args:
+            key: Cache key
+            value: Value to cache
+            ttl: Seconds the entry stays valid (default: the cache's TTL)
+        """
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+    
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """
+        Drop one entry, or every entry
         
-        return result
-    except Exception as e:
-        return f"Error listing labs: {str(e)}"
+        Args:
+            key: Cache key to drop (default: all entries)
+        """
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
 
 
-@mcp.tool()
-async def create_lab(title: str, description: str = "") -> Dict[str, str]:
+def _decode_token_expiry(token: str) -> Optional[float]:
     """
-    Create a new lab in CML
+    Read the expiry time from a CML token
+    
+    CML issues JWTs; the payload's "exp" claim holds the expiry as a Unix
+    timestamp. Tokens that can't be decoded return None.
     
     Args:
-        title: Title of the new lab
-        description: Optional description for the lab
+        token: Authentication token
     
     Returns:
-        Dictionary containing lab ID and confirmation message
+        Expiry as a Unix timestamp, or None if unknown
     """
-    auth_check = _check_auth()
-    if auth_check:
-        return auth_check
-    
     try:
-        print(f"Creating lab with title: {title}", file=sys.stderr)
-        
-        response = await cml_auth.request(
-            "POST", 
-            "/api/v0/labs",
-            json={"title": title, "description": description}
-        )
-        
-        lab_data = response.json()
-        print(f"Lab creation response: {lab_data}", file=sys.stderr)
-        
-        lab_id = lab_data.get("id")
-        
-        if not lab_id:
-            return {"error": "Failed to create lab, no lab ID returned"}
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload))
+        return float(claims["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+# Tracing
+
+class Span:
+    """One timed operation in a trace, exported when it ends"""
+    
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "attributes", "start_ns", "status")
+    
+    def __init__(self, name: str, kind: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        """
+        Start a span
         
+        Args:
+            name: Operation name
+            kind: "tool", "internal" or "client" (an HTTP request to CML)
+            parent: Enclosing span, or None to start a new trace
+            attributes: Key/value details of the operation
+        """
+        self.trace_id = parent.trace_id if parent else f"{random.getrandbits(128):032x}"
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent.span_id if parent else None
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.status = "ok"
+    
+    def to_dict(self, end_ns: int) -> Dict[str, Any]:
+        """Span as an OTLP-style JSON object"""
         return {
-            "lab_id": lab_id,
-            "message": f"Created lab '{title}' with ID: {lab_id}",
-            "status": "success"
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": end_ns,
+            "duration_ms": round((end_ns - self.start_ns) / 1e6, 3),
+            "status": self.status,
+            "attributes": self.attributes
         }
-    except Exception as e:
-        return _handle_api_error("create_lab", e)
 
 
-@mcp.tool()
-async def get_lab_details(lab_id: str) -> Dict[str, Any]:
+def _configure_tracing() -> Optional[logging.Logger]:
     """
-    Get detailed information about a specific lab
+    Set up span export from the environment
     
-    Args:
-        lab_id: ID of the lab to get details for
+    With CML_TRACE_FILE set, finished spans are appended to that file as
+    JSON lines through the same kind of queue and listener thread as the
+    log, so exporting never blocks a tool.
     
     Returns:
-        Dictionary containing lab details
+        Logger that writes spans, or None if tracing is off
     """
-    auth_check = _check_auth()
-    if auth_check:
-        return auth_check
+    path = os.environ.get("CML_TRACE_FILE")
+    if not path:
+        return None
     
     try:
-        response = await cml_auth.request("GET", f"/api/v0/labs/{lab_id}")
-        lab_details = response.json()
-        return lab_details
-    except Exception as e:
-        return _handle_api_error("get_lab_details", e)
+        file_handler = logging.FileHandler(path, encoding="utf-8")
+    except OSError as e:
+        logger.warning("Tracing disabled, cannot open %s: %s", path, e)
+        return None
+    file_handler.setFormatter(logging.Formatter("%(message)s"))
+    
+    queue_handler = logging.handlers.QueueHandler(SimpleQueue())
+    trace_logger = logging.getLogger("claude_modeling_labs.trace")
+    trace_logger.setLevel(logging.INFO)
+    trace_logger.handlers[:] = [queue_handler]
+    trace_logger.propagate = False
+    
+    listener = logging.handlers.QueueListener(queue_handler.queue, file_handler)
+    listener.start()
+    atexit.register(listener.stop)
+    return trace_logger
 
 
-@mcp.tool()
-async def delete_lab(lab_id: str) -> str:
+# Writes finished spans, None while tracing is off
+_trace_logger = _configure_tracing()
+
+# Innermost span of the running task
+_current_span = contextvars.ContextVar("cml_current_span", default=None)
+
+# UUID path segments, replaced so request spans to the same endpoint share a name
+_ID_SEGMENT_PATTERN = re.compile(r"/[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}(?=/|$)")
+
+
+def _span_endpoint(endpoint: str) -> str:
+    """Endpoint without IDs or query string, e.g. /api/v0/labs/{id}/nodes"""
+    return _ID_SEGMENT_PATTERN.sub("/{id}", endpoint.split("?", 1)[0])
+
+
+@contextlib.contextmanager
+def _span(name: str, kind: str = "internal", **attributes: Any):
     """
-    Delete a lab from CML
+    Time a block as a span nested in the current one; does nothing while tracing is off
     
     Args:
-        lab_id: ID of the lab to delete
+        name: Operation name
+        kind: "tool", "internal" or "client"
+        **attributes: Key/value details of the operation
     
-    Returns:
-        Confirmation message
+    Yields:
+        The span, so attributes can be added while it runs, or None while tracing is off
     """
-    auth_check = _check_auth()
-    if auth_check:
-        return auth_check["error"]
+    if _trace_logger is None:
+        yield None
+        return
     
+    span = Span(name, kind, _current_span.get(), attributes)
+    context_token = _current_span.set(span)
     try:
-        # First check if the lab is running
-        lab_details = await get_lab_details(lab_id)
-        if isinstance(lab_details, dict) and lab_details.get("state") == "STARTED":
-            # Stop the lab first
-            await stop_lab(lab_id)
-            # Wait for the lab to fully stop
-            await asyncio.sleep(2)
-        
-        response = await cml_auth.request("DELETE", f"/api/v0/labs/{lab_id}")
-        return f"Lab {lab_id} deleted successfully"
-    except Exception as e:
-        return f"Error deleting lab: {str(e)}"
+        yield span
+    except BaseException as e:
+        span.status = "error"
+        span.attributes["exception"] = f"{type(e).__name__}: {str(e)}"
+        raise
+    finally:
+        _current_span.reset(context_token)
+        _trace_logger.info(json.dumps(span.to_dict(time.time_ns()), default=str))
 
 
-# Node Definition Management Tools
-
-@mcp.tool()
-async def list_node_definitions() -> Union[Dict[str, Any], str]:
+def _traced(function: Callable) -> Callable:
     """
-    List all available node definitions in CML
+    Record every call to a function, sync or async, as an internal span
+    
+    Args:
+        function: Function to trace
+    
+    Returns:
+        Wrapped function with the same signature
+    """
+    if asyncio.iscoroutinefunction(function):
+        @functools.wraps(function)
+        async def async_wrapper(*args, **kwargs):
+            if _trace_logger is None:
+                return await function(*args, **kwargs)
+            with _span(function.__qualname__):
+                return await function(*args, **kwargs)
+        
+        return async_wrapper
+    
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if _trace_logger is None:
+            return function(*args, **kwargs)
+        with _span(function.__qualname__):
+            return function(*args, **kwargs)
+    
+    return wrapper
+
+
+# Tool Metrics
+
+# Histogram bucket upper bounds: tool latency in seconds, upstream requests and bytes per tool call
+_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+_REQUEST_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 10000)
+_BYTE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+# Seconds between rewrites of the Prometheus file named by CML_METRICS_FILE
+_METRICS_EXPORT_INTERVAL = 5.0
+
+
+class Histogram:
+    """Histogram with fixed buckets, in the Prometheus style"""
+    
+    def __init__(self, buckets: Tuple[float, ...]):
+        """
+        Initialize an empty histogram
+        
+        Args:
+            buckets: Sorted bucket upper bounds; larger values land in an overflow bucket
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+    
+    def observe(self, value: float) -> None:
+        """Record one value"""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimate a quantile by interpolating within its bucket, like Prometheus' histogram_quantile
+        
+        Args:
+            q: Quantile between 0 and 1
+        
+        Returns:
+            Estimated value, or None if nothing has been recorded
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            if bucket_count and seen + bucket_count >= rank:
+                # The overflow bucket has no upper bound, so report its lower one
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+    
+    def summary(self) -> Dict[str, Any]:
+        """Count, sum, mean and estimated p50/p99"""
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6) if self.count else None,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99)
+        }
+    
+    def prometheus_lines(self, name: str, labels: str) -> List[str]:
+        """
+        Render the histogram in the Prometheus text exposition format
+        
+        Args:
+            name: Metric name
+            labels: Label pairs without braces, e.g. tool="list_labs"
+        
+        Returns:
+            Bucket, sum and count sample lines
+        """
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(list(self.buckets) + ["+Inf"], self.counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {self.sum}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+class ToolCallStats:
+    """Upstream traffic of one tool call, collected by CMLAuth through _current_tool_call"""
+    
+    __slots__ = ("requests", "bytes_sent", "bytes_received", "upstream_errors")
+    
+    def __init__(self):
+        self.requests = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.upstream_errors = 0
+    
+    def add(self, other: "ToolCallStats") -> None:
+        """Fold a nested call's traffic into this one"""
+        self.requests += other.requests
+        self.bytes_sent += other.bytes_sent
+        self.bytes_received += other.bytes_received
+        self.upstream_errors += other.upstream_errors
+
+
+class ToolMetrics:
+    """Per-tool call counts and histograms of latency, upstream requests and bytes"""
+    
+    def __init__(self):
+        """Initialize with nothing recorded"""
+        self.started_at = time.time()
+        self.tools = {}
+    
+    def record(self, tool: str, elapsed: float, stats: ToolCallStats, failed: bool) -> None:
+        """
+        Record one tool call
+        
+        Args:
+            tool: Tool name
+            elapsed: Wall time in seconds
+            stats: Upstream traffic of the call, including nested tool calls
+            failed: Whether the call raised or returned an error
+        """
+        entry = self.tools.get(tool)
+        if entry is None:
+            entry = self.tools[tool] = {
+                "calls": 0,
+                "errors": 0,
+                "upstream_errors": 0,
+                "bytes_sent": 0,
+                "bytes_received": 0,
+                "latency_seconds": Histogram(_LATENCY_BUCKETS),
+                "upstream_requests": Histogram(_REQUEST_BUCKETS),
+                "upstream_bytes": Histogram(_BYTE_BUCKETS)
+            }
+        entry["calls"] += 1
+        entry["errors"] += failed
+        entry["upstream_errors"] += stats.upstream_errors
+        entry["bytes_sent"] += stats.bytes_sent
+        entry["bytes_received"] += stats.bytes_received
+        entry["latency_seconds"].observe(elapsed)
+        entry["upstream_requests"].observe(stats.requests)
+        entry["upstream_bytes"].observe(stats.bytes_sent + stats.bytes_received)
+    
+    def reset(self) -> None:
+        """Forget everything recorded so far"""
+        self.started_at = time.time()
+        self.tools.clear()
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Summarize the metrics of every tool called so far
+        
+        Returns:
+            Dictionary with the collection start time and, per tool, counters and histogram summaries
+        """
+        return {
+            "since": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.started_at)),
+            "tools": {
+                tool: {
+                    name: value.summary() if isinstance(value, Histogram) else value
+                    for name, value in entry.items()
+                }
+                for tool, entry in sorted(self.tools.items())
+            }
+        }
+    
+    def render_prometheus(self) -> str:
+        """
+        Render every metric in the Prometheus text exposition format
+        
+        Returns:
+            Exposition text
+        """
+        families = [
+            ("calls", "cml_tool_calls_total", "counter", "Tool calls"),
+            ("errors", "cml_tool_errors_total", "counter", "Tool calls that raised or returned an error"),
+            ("upstream_errors", "cml_tool_upstream_errors_total", "counter", "Failed CML API requests made by tool calls"),
+            ("bytes_sent", "cml_tool_upstream_bytes_sent_total", "counter", "Request bytes sent to CML by tool calls"),
+            ("bytes_received", "cml_tool_upstream_bytes_received_total", "counter", "Response bytes received from CML by tool calls"),
+            ("latency_seconds", "cml_tool_duration_seconds", "histogram", "Tool call wall time in seconds"),
+            ("upstream_requests", "cml_tool_upstream_requests", "histogram", "CML API requests per tool call"),
+            ("upstream_bytes", "cml_tool_upstream_bytes", "histogram", "CML API bytes transferred per tool call")
+        ]
+        lines = []
+        for key, name, metric_type, help_text in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for tool, entry in sorted(self.tools.items()):
+                labels = f'tool="{tool}"'
+                if metric_type == "histogram":
+                    lines.extend(entry[key].prometheus_lines(name, labels))
+                else:
+                    lines.append(f"{name}{{{labels}}} {entry[key]}")
+        return "\n".join(lines) + "\n"
+
+
+# Metrics of every tool call since the server started
+_tool_metrics = ToolMetrics()
+
+# Traffic counters of the tool call running in the current task, if any
+_current_tool_call = contextvars.ContextVar("cml_current_tool_call", default=None)
+
+# time.monotonic() of the last Prometheus file export
+_metrics_exported_at = 0.0
+
+
+def _record_upstream_request(response: Optional[httpx.Response]) -> None:
+    """
+    Count a CML API request against the tool call that made it
+    
+    Args:
+        response: Response received, or None if the request failed without one
+    """
+    stats = _current_tool_call.get()
+    if stats is None:
+        return
+    stats.requests += 1
+    if response is None:
+        stats.upstream_errors += 1
+        return
+    stats.bytes_sent += len(response.request.content)
+    stats.bytes_received += len(response.content)
+    if response.status_code >= 400:
+        stats.upstream_errors += 1
+
+
+def _is_error_result(result: Any) -> bool:
+    """Whether a tool result reports an error, as an error dictionary or an "Error ..." string"""
+    if isinstance(result, dict):
+        return "error" in result
+    return isinstance(result, str) and result.startswith("Error")
+
+
+def _export_metrics(force: bool = False) -> None:
+    """
+    Write the Prometheus exposition file named by CML_METRICS_FILE, at most every few seconds
+    
+    Args:
+        force: Write even if the last export was recent
+    """
+    global _metrics_exported_at
+    path = os.environ.get("CML_METRICS_FILE")
+    if not path or (not force and time.monotonic() - _metrics_exported_at < _METRICS_EXPORT_INTERVAL):
+        return
+    _metrics_exported_at = time.monotonic()
+    
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "w", encoding="utf-8") as metrics_file:
+            metrics_file.write(_tool_metrics.render_prometheus())
+        os.replace(temp_path, path)
+    except OSError as e:
+        logger.warning("Could not write metrics to %s: %s", path, e)
+
+
+atexit.register(_export_metrics, True)
+
+
+def _instrumented(tool: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    """
+    Record wall time, upstream traffic and errors of every call to a tool
+    
+    Tools called from other tools are recorded under their own name too, and
+    their traffic also counts towards the calling tool.
+    
+    Args:
+        tool: Async tool function
+    
+    Returns:
+        Wrapped tool function with the same signature
+    """
+    @functools.wraps(tool)
+    async def wrapper(*args, **kwargs):
+        parent = _current_tool_call.get()
+        stats = ToolCallStats()
+        context_token = _current_tool_call.set(stats)
+        failed = True
+        start_time = time.perf_counter()
+        try:
+            with _span(tool.__name__, "tool") as span:
+                result = await tool(*args, **kwargs)
+                failed = _is_error_result(result)
+                if span is not None:
+                    span.attributes["requests"] = stats.requests
+                    if failed:
+                        span.status = "error"
+                return result
+        finally:
+            elapsed = time.perf_counter() - start_time
+            _current_tool_call.reset(context_token)
+            if parent is not None:
+                parent.add(stats)
+            _tool_metrics.record(tool.__name__, elapsed, stats, failed)
+            if parent is None:
+                _export_metrics()
+    
+    return wrapper
+
+
+# Retries
+
+# Methods that can be repeated without changing the result beyond the first success
+_IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+# Failures raised before the request reached the controller, safe to retry for any method
+_UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class RetryBudget:
+    """
+    Caps retries at a fraction of recent requests, plus a small steady allowance
+    
+    When the controller is overloaded almost every request fails; without a
+    budget each one would be retried several times, multiplying the load
+    just when it hurts most. With the budget, retries stay within `ratio`
+    of the requests made in the last `window` seconds.
+    """
+    
+    def __init__(self, ratio: float = 0.2, min_retries_per_second: float = 1.0, window: float = 10.0):
+        """
+        Initialize an empty budget
+        
+        Args:
+            ratio: Retries allowed per request made in the window
+            min_retries_per_second: Retries always allowed, so a quiet client can still retry
+            window: Seconds of history the budget looks at
+        """
+        self.ratio = ratio
+        self.min_retries_per_second = min_retries_per_second
+        self.window = window
+        self._requests = collections.deque()
+        self._retries = collections.deque()
+    
+    def _prune(self, now: float) -> None:
+        for timestamps in (self._requests, self._retries):
+            while timestamps and timestamps[0] <= now - self.window:
+                timestamps.popleft()
+    
+    def record_request(self) -> None:
+        """Deposit for a new (not retried) request"""
+        self._requests.append(time.monotonic())
+    
+    def try_spend(self) -> bool:
+        """
+        Withdraw one retry if the budget allows it
+        
+        Returns:
+            True if the retry may go ahead
+        """
+        now = time.monotonic()
+        self._prune(now)
+        allowed = self.ratio * len(self._requests) + self.min_retries_per_second * self.window
+        if len(self._retries) >= allowed:
+            return False
+        self._retries.append(now)
+        return True
+
+
+class RetryPolicy:
+    """Decides whether and when a failed CML request is retried"""
+    
+    def __init__(
+        self,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        retry_statuses: Tuple[int, ...] = (429, 502, 503, 504),
+        rejected_statuses: Tuple[int, ...] = (429, 503),
+        budget: Optional[RetryBudget] = None
+    ):
+        """
+        Initialize the policy
+        
+        Args:
+            max_retries: Retries after the first attempt (0 disables retries)
+            base_delay: Backoff ceiling for the first retry in seconds, doubled for each later one
+            max_delay: Longest wait before a retry; a longer Retry-After gives up instead
+            retry_statuses: Response statuses worth retrying
+            rejected_statuses: Retried statuses meaning the controller turned the request away
+                without acting on it, so even non-idempotent requests are retried
+            budget: Retry budget shared by every request (default: a new RetryBudget)
+        """
+        self.max_retries = max(0, max_retries)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_statuses = retry_statuses
+        self.rejected_statuses = rejected_statuses
+        self.budget = budget if budget is not None else RetryBudget()
+    
+    def backoff(self, attempt: int) -> float:
+        """
+        Exponential backoff with full jitter
+        
+        Args:
+            attempt: Number of retries already made
+        
+        Returns:
+            Seconds to wait, uniformly drawn below the exponential ceiling
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+    
+    def retry_delay(
+        self,
+        method: str,
+        attempt: int,
+        response: Optional[httpx.Response] = None,
+        error: Optional[Exception] = None,
+        idempotent: Optional[bool] = None
+    ) -> Optional[float]:
+        """
+        Seconds to wait before retrying a failed attempt, or None to give up
+        
+        Non-idempotent requests (POST) are only retried when the controller
+        cannot have acted on them: a connection that never opened, or a
+        rejected status such as 429 or 503. A Retry-After header sets the
+        delay when present.
+        
+        Args:
+            method: HTTP method
+            attempt: Number of retries already made
+            response: Response received, if any
+            error: Exception raised instead of a response, if any
+            idempotent: Whether repeating the request is safe (default: judged from the method)
+        
+        Returns:
+            Delay in seconds, or None if the request should not be retried
+        """
+        if attempt >= self.max_retries:
+            return None
+        if idempotent is None:
+            idempotent = method.upper() in _IDEMPOTENT_METHODS
+        
+        if error is not None:
+            if not isinstance(error, httpx.TransportError):
+                return None
+            if not idempotent and not isinstance(error, _UNSENT_ERRORS):
+                return None
+            delay = self.backoff(attempt)
+        elif response is not None and response.status_code in self.retry_statuses:
+            if not idempotent and response.status_code not in self.rejected_statuses:
+                return None
+            retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after is not None and retry_after > self.max_delay:
+                return None
+            delay = retry_after if retry_after is not None else self.backoff(attempt)
+        else:
+            return None
+        
+        if not self.budget.try_spend():
+            logger.warning("Retry budget exhausted, not retrying %s", method)
+            return None
+        return delay
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header
+    
+    Args:
+        value: Header value, either delay seconds or an HTTP date
+    
+    Returns:
+        Seconds to wait, or None if the header is missing or malformed
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+class CMLAuth:
+    """Authentication and request handling for Cisco Modeling Labs"""
+    
+    def __init__(
+        self,
+        base_url: str,
+        username: str,
+        password: str,
+        verify_ssl: bool = True,
+        max_concurrency: int = 8,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 30.0,
+        connect_timeout: float = 10.0,
+        read_timeout: float = 30.0,
+        http2: bool = False,
+        token_lifetime: float = 8 * 3600,
+        refresh_margin: float = 300.0,
+        token_cache: bool = False,
+        event_stream_path: str = "/ws/client",
+        catalog_ttl: float = 3600.0,
+        catalog_snapshot: bool = False,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        retry_policy: Optional[RetryPolicy] = None
+    ):
+        """
+        Initialize the CML authentication client
+        
+        Args:
+            base_url: Base URL of the CML server
+            username: Username for CML authentication
+            password: Password for CML authentication
+            verify_ssl: Whether to verify SSL certificates
+            max_concurrency: Maximum number of requests in flight against this controller
+            max_connections: Maximum number of pooled connections
+            max_keepalive_connections: Maximum number of idle connections kept open
+            keepalive_expiry: Seconds an idle connection is kept before closing
+            connect_timeout: Seconds allowed to establish a connection
+            read_timeout: Seconds allowed to wait for response data
+            http2: Whether to multiplex requests over HTTP/2 (requires the h2 package)
+            token_lifetime: Assumed token lifetime in seconds when the token carries no expiry
+            refresh_margin: Seconds before expiry at which the token is refreshed proactively
+            token_cache: Whether to persist tokens on disk so restarts can skip authentication
+            event_stream_path: Path of the controller's event websocket
+            catalog_ttl: Seconds the node definition catalog is cached in memory
+            catalog_snapshot: Whether to keep a snapshot of the catalog on disk, per controller version
+            transport: Custom httpx transport, e.g. httpx.ASGITransport for the mock controller in mock_cml.py
+            retry_policy: When to retry failed requests (default: RetryPolicy())
+        """
+        self.base_url = base_url
+        self.username = username
+        self.password = password
+        self.token = None
+        self.token_expires_at = None
+        self.token_lifetime = token_lifetime
+        self.refresh_margin = refresh_margin
+        self.token_cache = token_cache
+        self.verify_ssl = verify_ssl
+        
+        # Only one authentication may be in flight; everyone else reuses its token
+        self._auth_lock = asyncio.Lock()
+        
+        # HTTP/2 needs the optional h2 package (pip install "httpx[http2]")
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("h2 not available, falling back to HTTP/1.1")
+                http2 = False
+        self.http2 = http2
+        
+        # Requests queue on the semaphore below, so never time out waiting for a pooled connection
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout, pool=None)
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            verify=verify_ssl,
+            limits=self.limits,
+            timeout=self.timeout,
+            http2=http2,
+            transport=transport
+        )
+        
+        # Retries share one budget, so a struggling controller doesn't see a retry storm
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        
+        # Shared limit for every request sent to this controller
+        self.max_concurrency = max(1, max_concurrency)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        # Event websocket, opened lazily by get_event_stream()
+        self.event_stream_path = event_stream_path
+        self._event_stream = None
+        self._event_stream_lock = asyncio.Lock()
+        self._event_stream_retry_at = 0.0
+        
+        # Definition catalogs and controller version, see _get_catalog()
+        self.catalog_cache = TTLCache(catalog_ttl)
+        self.catalog_snapshot = catalog_snapshot
+        self.catalog_lock = asyncio.Lock()
+        
+        # Suppress SSL warnings if verify_ssl is False
+        if not verify_ssl:
+            try:
+                import urllib3
+                urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+            except ImportError:
+                logger.warning("urllib3 not available, SSL warning suppression disabled")
+    
+    async def authenticate(self, verify: bool = True) -> str:
+        """
+        Authenticate with CML and get a token
+        
+        Args:
+            verify: Whether to confirm the new token with an extra /authok request
+        
+        Returns:
+            Authentication token
+        
+        Raises:
+            httpx.HTTPStatusError: If authentication fails
+        """
+        logger.info("Authenticating with CML at %s", self.base_url)
+        response = await self._send(
+            "POST",
+            "/api/v0/authenticate",
+            json={"username": self.username, "password": self.password}
+        )
+        response.raise_for_status()
+        self.token = response.text.strip('"')  # Remove any quotes from the token
+        self.token_expires_at = _decode_token_expiry(self.token) or (time.time() + self.token_lifetime)
+        self.client.headers.update({"Authorization": f"Bearer {self.token}"})
+        
+        if self.token_cache:
+            self._store_cached_token()
+        
+        if not verify:
+            return self.token
+        
+        # Verify the token works
+        try:
+            auth_check = await self._send("GET", "/api/v0/authok")
+            auth_check.raise_for_status()
+            logger.info("Authentication successful, token verified")
+        except Exception as e:
+            logger.warning("Token verification failed: %s", e)
+            
+        return self.token
+    
+    def load_cached_token(self) -> bool:
+        """
+        Load an unexpired token for this controller and user from the on-disk cache
+        
+        The token is not checked against the server here; if it has been
+        revoked, the first request gets a 401 and re-authenticates.
+        
+        Returns:
+            True if a cached token was loaded
+        """
+        entry = _read_token_cache().get(_token_cache_key(self.base_url, self.username))
+        if not isinstance(entry, dict) or not entry.get("token"):
+            return False
+        
+        expires_at = entry.get("expires_at")
+        if not isinstance(expires_at, (int, float)) or time.time() >= expires_at - self.refresh_margin:
+            return False
+        
+        self.token = entry["token"]
+        self.token_expires_at = float(expires_at)
+        self.client.headers.update({"Authorization": f"Bearer {self.token}"})
+        return True
+    
+    def _store_cached_token(self) -> None:
+        """Save the current token to the on-disk cache"""
+        try:
+            entries = _read_token_cache()
+            now = time.time()
+            
+            # Drop expired entries while we're here
+            entries = {
+                key: entry for key, entry in entries.items()
+                if isinstance(entry, dict) and entry.get("expires_at", 0) > now
+            }
+            entries[_token_cache_key(self.base_url, self.username)] = {
+                "token": self.token,
+                "expires_at": self.token_expires_at
+            }
+            _write_token_cache(entries)
+        except OSError as e:
+            logger.warning("Could not write token cache: %s", e)
+    
+    def token_needs_refresh(self) -> bool:
+        """
+        Check whether the token is missing or close enough to expiry to refresh
+        
+        Returns:
+            True if a new token should be fetched before the next request
+        """
+        if not self.token:
+            return True
+        if self.token_expires_at is None:
+            return False
+        return time.time() >= self.token_expires_at - self.refresh_margin
+    
+    async def ensure_token(self, stale_token: Optional[str] = None) -> str:
+        """
+        Get a usable token, re-authenticating at most once across concurrent callers
+        
+        Callers that queue behind an in-flight authentication reuse its result
+        instead of authenticating again.
+        
+        Args:
+            stale_token: Token the caller knows to be rejected or expiring
+        
+        Returns:
+            Authentication token
+        """
+        async with self._auth_lock:
+            if self.token and self.token != stale_token and not self.token_needs_refresh():
+                return self.token
+            
+            logger.info("Refreshing CML token")
+            return await self.authenticate(verify=False)
+    
+    async def _send(self, method: str, endpoint: str, queued_since: Optional[float] = None, **kwargs) -> httpx.Response:
+        """
+        Send one request, counting it against the tool call that made it and tracing it
+        
+        Args:
+            method: HTTP method
+            endpoint: API endpoint to call
+            queued_since: time.perf_counter() when the request started waiting for a slot, for the trace
+            **kwargs: Additional arguments to pass to httpx
+        
+        Returns:
+            HTTP response, whatever its status
+        """
+        with _span(f"{method} {_span_endpoint(endpoint)}", "client", method=method, endpoint=endpoint) as span:
+            if span is not None and queued_since is not None:
+                span.attributes["queue_wait_ms"] = round((time.perf_counter() - queued_since) * 1000, 3)
+            try:
+                response = await self.client.request(method, endpoint, **kwargs)
+            except httpx.HTTPError:
+                _record_upstream_request(None)
+                raise
+            _record_upstream_request(response)
+            if span is not None:
+                span.attributes["status_code"] = response.status_code
+                span.attributes["response_bytes"] = len(response.content)
+                if response.status_code >= 400:
+                    span.status = "error"
+            return response
+    
+    async def request(self, method: str, endpoint: str, idempotent: Optional[bool] = None, **kwargs) -> httpx.Response:
+        """
+        Make an authenticated request to CML API
+        
+        Transient failures (connection errors, 429 and 5xx gateway errors)
+        are retried according to retry_policy, and a 401 re-authenticates once.
+        
+        Args:
+            method: HTTP method (GET, POST, PUT, DELETE)
+            endpoint: API endpoint to call
+            idempotent: Whether the request is safe to repeat (default: judged from the method)
+            **kwargs: Additional arguments to pass to httpx
+        
+        Returns:
+            HTTP response
+            
+        Raises:
+            httpx.HTTPStatusError: If the request fails
+        """
+        # Refresh ahead of expiry so hot paths don't pay for a 401 and retry
+        if self.token_needs_refresh():
+            await self.ensure_token(self.token)
+        
+        logger.debug("Making %s request to %s", method, endpoint)
+        
+        # Ensure headers contain the token
+        if "headers" not in kwargs:
+            kwargs["headers"] = {}
+        
+        # Ensure the Authorization header is set with the current token
+        kwargs["headers"]["Authorization"] = f"Bearer {self.token}"
+        
+        self.retry_policy.budget.record_request()
+        attempt = 0
+        reauthenticated = False
+        
+        # Make the request
+        try:
+            while True:
+                try:
+                    queued_since = time.perf_counter()
+                    async with self._semaphore:
+                        response = await self._send(method, endpoint, queued_since, **kwargs)
+                except httpx.TransportError as e:
+                    delay = self.retry_policy.retry_delay(method, attempt, error=e, idempotent=idempotent)
+                    if delay is None:
+                        raise
+                    logger.info("%s %s failed (%s), retrying in %.2fs", method, endpoint, type(e).__name__, delay)
+                else:
+                    # If unauthorized, try to re-authenticate once
+                    if response.status_code == 401 and not reauthenticated:
+                        logger.info("Got 401 response, re-authenticating")
+                        reauthenticated = True
+                        rejected_token = kwargs["headers"]["Authorization"][len("Bearer "):]
+                        await self.ensure_token(rejected_token)
+                        kwargs["headers"]["Authorization"] = f"Bearer {self.token}"
+                        continue
+                    
+                    delay = self.retry_policy.retry_delay(method, attempt, response=response, idempotent=idempotent)
+                    if delay is None:
+                        response.raise_for_status()
+                        return response
+                    logger.info("%s %s returned %d, retrying in %.2fs", method, endpoint, response.status_code, delay)
+                
+                attempt += 1
+                await asyncio.sleep(delay)
+        except Exception as e:
+            logger.debug("Request error: %s %s: %s", method, endpoint, e)
+            raise
+    
+    async def request_many(
+        self,
+        calls: List[Tuple[Any, ...]],
+        return_exceptions: bool = True,
+        stats: Optional[Dict[str, Any]] = None
+    ) -> List[Union[httpx.Response, Exception]]:
+        """
+        Make a batch of independent requests concurrently
+        
+        Every request still goes through request(), so the batch is bounded by
+        the client's concurrency limit.
+        
+        Args:
+            calls: Tuples of (method, endpoint) or (method, endpoint, kwargs)
+            return_exceptions: Return failed requests as exceptions instead of raising the first one
+            stats: Dictionary to fill with this batch's request count, errors and elapsed time (optional);
+                per call, so batches running at the same time never overwrite each other's figures
+        
+        Returns:
+            Responses (or exceptions) in the same order as calls
+        """
+        start_time = time.perf_counter()
+        results = await asyncio.gather(
+            *[self.request(call[0], call[1], **(call[2] if len(call) > 2 else {})) for call in calls],
+            return_exceptions=return_exceptions
+        )
+        elapsed = time.perf_counter() - start_time
+        
+        if stats is not None:
+            stats.update({
+                "requests": len(calls),
+                "errors": sum(1 for result in results if isinstance(result, Exception)),
+                "elapsed_seconds": round(elapsed, 4),
+                "max_concurrency": self.max_concurrency
+            })
+        logger.debug("Batch of %d requests finished in %.3fs", len(calls), elapsed)
+        return results
+    
+    @_traced
+    async def wait_for_state(
+        self,
+        endpoint: str,
+        states: Tuple[str, ...],
+        timeout: float = 120.0,
+        deadline: Optional[float] = None,
+        field: str = "state",
+        failure_states: Tuple[str, ...] = (),
+        initial_delay: float = 0.25,
+        max_delay: float = 5.0
+    ) -> str:
+        """
+        Poll a resource until its state reaches one of the given states
+        
+        Polls back off exponentially with jitter, so many concurrent waiters
+        don't hit the controller in lockstep. Cancelling the calling task
+        stops the wait.
+        
+        Args:
+            endpoint: API endpoint returning the resource (e.g. /api/v0/labs/{lab_id})
+            states: States to wait for
+            timeout: Maximum time to wait in seconds
+            deadline: Absolute time.monotonic() deadline, shared across several waits; overrides timeout
+            field: Response field holding the state
+            failure_states: States that end the wait with an error
+            initial_delay: Delay before the second poll in seconds
+            max_delay: Longest delay between polls in seconds
+        
+        Returns:
+            The state reached
+        
+        Raises:
+            TimeoutError: If none of the states is reached before the deadline
+            RuntimeError: If the resource enters one of the failure states
+        """
+        if deadline is None:
+            deadline = time.monotonic() + timeout
+        delay = initial_delay
+        
+        while True:
+            response = await self.request("GET", endpoint)
+            state = response.json().get(field)
+            if state in states:
+                return state
+            if state in failure_states:
+                raise RuntimeError(f"{endpoint} entered {state} while waiting for {'/'.join(states)}")
+            
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"{endpoint} still {state}, expected {'/'.join(states)}")
+            
+            await asyncio.sleep(min(random.uniform(delay / 2, delay), remaining))
+            delay = min(delay * 2, max_delay)
+    
+    async def get_event_stream(self) -> Optional["CMLEventStream"]:
+        """
+        Get the controller's event stream, connecting on first use
+        
+        A failed connection is not retried for a minute, so callers fall back
+        to polling without paying for a connection attempt every time.
+        
+        Returns:
+            Connected event stream, or None if it is unavailable
+        """
+        async with self._event_stream_lock:
+            if self._event_stream and self._event_stream.connected:
+                return self._event_stream
+            if time.time() < self._event_stream_retry_at:
+                return None
+            
+            if self.token_needs_refresh():
+                await self.ensure_token(self.token)
+            
+            stream = CMLEventStream(self)
+            if await stream.connect():
+                self._event_stream = stream
+                return stream
+            
+            self._event_stream_retry_at = time.time() + 60
+            return None
+
+
+class CMLEventStream:
+    """Subscription to the CML event websocket that forwards node state changes to waiters"""
+    
+    def __init__(self, auth: CMLAuth):
+        """
+        Initialize the event stream
+        
+        Args:
+            auth: Authenticated CML client
+        """
+        self.auth = auth
+        self.connected = False
+        self._websocket = None
+        self._reader_task = None
+        self._watchers = {}
+    
+    async def connect(self) -> bool:
+        """
+        Open the websocket and start reading events
+        
+        Returns:
+            True if connected, False if the stream is unavailable
+        """
+        try:
+            import websockets
+        except ImportError:
+            logger.info("websockets not available, event stream disabled")
+            return False
+        
+        url = self.auth.base_url.replace("https://", "wss://", 1).replace("http://", "ws://", 1)
+        url = url.rstrip("/") + self.auth.event_stream_path
+        headers = {"Authorization": f"Bearer {self.auth.token}"}
+        
+        connect_kwargs = {}
+        if url.startswith("wss://") and not self.auth.verify_ssl:
+            import ssl
+            ssl_context = ssl.create_default_context()
+            ssl_context.check_hostname = False
+            ssl_context.verify_mode = ssl.CERT_NONE
+            connect_kwargs["ssl"] = ssl_context
+        
+        try:
+            try:
+                self._websocket = await websockets.connect(url, additional_headers=headers, **connect_kwargs)
+            except TypeError:
+                # websockets < 14 names the argument extra_headers
+                self._websocket = await websockets.connect(url, extra_headers=headers, **connect_kwargs)
+        except Exception as e:
+            logger.warning("Event stream unavailable at %s: %s", url, e)
+            return False
+        
+        logger.info("Subscribed to CML events at %s", url)
+        self.connected = True
+        self._reader_task = asyncio.ensure_future(self._read_events())
+        return True
+    
+    def watch(self, lab_id: str) -> asyncio.Queue:
+        """
+        Start receiving node state changes for a lab
+        
+        The queue yields {"node_id", "state"} dictionaries, and None once the
+        stream has closed.
+        
+        Args:
+            lab_id: ID of the lab
+        
+        Returns:
+            Queue of node state changes
+        """
+        queue = asyncio.Queue()
+        self._watchers.setdefault(lab_id, []).append(queue)
+        return queue
+    
+    def unwatch(self, lab_id: str, queue: asyncio.Queue) -> None:
+        """
+        Stop receiving node state changes for a lab
+        
+        Args:
+            lab_id: ID of the lab
+            queue: Queue returned by watch()
+        """
+        queues = self._watchers.get(lab_id, [])
+        if queue in queues:
+            queues.remove(queue)
+        if not queues:
+            self._watchers.pop(lab_id, None)
+    
+    async def close(self) -> None:
+        """Close the websocket and release all waiters"""
+        if self._reader_task:
+            self._reader_task.cancel()
+        if self._websocket is not None:
+            await self._websocket.close()
+        self._mark_closed()
+    
+    async def _read_events(self) -> None:
+        """Read messages until the websocket closes, dispatching node state changes"""
+        try:
+            async for message in self._websocket:
+                try:
+                    event = json.loads(message)
+                except (TypeError, ValueError):
+                    continue
+                
+                state_change = _parse_node_state_event(event)
+                if state_change:
+                    lab_id, node_id, state = state_change
+                    for queue in self._watchers.get(lab_id, []):
+                        queue.put_nowait({"node_id": node_id, "state": state})
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Event stream closed: %s", e)
+        finally:
+            self._mark_closed()
+    
+    def _mark_closed(self) -> None:
+        """Flag the stream as closed and wake every waiter so it can fall back to polling"""
+        if not self.connected:
+            return
+        self.connected = False
+        for queues in self._watchers.values():
+            for queue in queues:
+                queue.put_nowait(None)
+
+
+def _parse_node_state_event(event: Any) -> Optional[Tuple[str, str, str]]:
+    """
+    Extract a node state change from a CML event message
+    
+    Accepts both bare events and events wrapped in a {"type": ..., "data": {...}}
+    envelope.
+    
+    Args:
+        event: Decoded event message
+    
+    Returns:
+        Tuple of (lab ID, node ID, new state), or None for any other event
+    """
+    if not isinstance(event, dict):
+        return None
+    if "element_type" not in event and isinstance(event.get("data"), dict):
+        event = event["data"]
+    
+    if event.get("element_type") != "node":
+        return None
+    
+    data = event.get("data") if isinstance(event.get("data"), dict) else {}
+    state = data.get("state") or event.get("state")
+    lab_id = event.get("lab_id")
+    node_id = event.get("element_id") or data.get("id")
+    if not (state and lab_id and node_id):
+        return None
+    return lab_id, node_id, state
+
+
+# Authentication Tools
+
+@mcp.tool()
+@_instrumented
+async def initialize_client(
+    base_url: str,
+    username: str,
+    password: str,
+    verify_ssl: bool = True,
+    max_concurrency: int = 8,
+    max_connections: int = 20,
+    max_keepalive_connections: int = 10,
+    keepalive_expiry: float = 30.0,
+    connect_timeout: float = 10.0,
+    read_timeout: float = 30.0,
+    http2: bool = False,
+    use_token_cache: bool = False,
+    catalog_ttl: float = 3600.0,
+    use_catalog_snapshot: bool = False,
+    max_retries: int = 3
+) -> str:
+    """
+    Initialize the CML client with authentication credentials
+    
+    Args:
+        base_url: Base URL of the CML server (e.g., https://cml-server)
+        username: Username for CML authentication
+        password: Password for CML authentication
+        verify_ssl: Whether to verify SSL certificates (set to False for self-signed certificates)
+        max_concurrency: Maximum number of concurrent requests sent to the controller (default: 8)
+        max_connections: Maximum number of pooled HTTP connections (default: 20)
+        max_keepalive_connections: Maximum number of idle connections kept open (default: 10)
+        keepalive_expiry: Seconds an idle connection is kept open (default: 30)
+        connect_timeout: Seconds allowed to establish a connection (default: 10)
+        read_timeout: Seconds allowed to wait for response data (default: 30)
+        http2: Whether to use HTTP/2 multiplexing, requires httpx[http2] (default: False)
+        use_token_cache: Reuse a token cached on disk by a previous session instead of authenticating (default: False)
+        catalog_ttl: Seconds the node definition catalog is cached in memory (default: 3600)
+        use_catalog_snapshot: Keep the node definition catalog on disk so restarts can skip fetching it (default: False)
+        max_retries: Retries for requests failing with connection errors, 429 or 502-504, with backoff (default: 3)
+    
+    Returns:
+        A success message if authentication is successful
+    """
+    global cml_auth
+    
+    # Fix URL if it doesn't have a scheme
+    if not base_url.startswith(('http://', 'https://')):
+        base_url = f"https://{base_url}"
+    
+    logger.info("Initializing CML client with base_url: %s", base_url)
+    _interface_indexes.clear()
+    _config_hashes.clear()
+    _config_hashes_loaded_at.clear()
+    _lab_graphs.clear()
+    cml_auth = CMLAuth(
+        base_url,
+        username,
+        password,
+        verify_ssl,
+        max_concurrency=max_concurrency,
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections,
+        keepalive_expiry=keepalive_expiry,
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        http2=http2,
+        token_cache=use_token_cache,
+        catalog_ttl=catalog_ttl,
+        catalog_snapshot=use_catalog_snapshot,
+        retry_policy=RetryPolicy(max_retries=max_retries)
+    )
+    
+    ssl_status = "enabled" if verify_ssl else "disabled (accepting self-signed certificates)"
+    protocol = "HTTP/2" if cml_auth.http2 else "HTTP/1.1"
+    
+    # A cached token skips both authentication round trips; it is validated on first use
+    if use_token_cache and cml_auth.load_cached_token():
+        logger.info("Using cached token for %s at %s", username, base_url)
+        return f"Using cached credentials for CML at {base_url} (SSL verification: {ssl_status}, protocol: {protocol})"
+    
+    try:
+        token = await cml_auth.authenticate()
+        logger.debug("Token received: %s...", token[:10])  # Only log the first 10 chars for security
+        return f"Successfully authenticated with CML at {base_url} (SSL verification: {ssl_status}, protocol: {protocol})"
+    except httpx.HTTPStatusError as e:
+        return f"Authentication failed: {str(e)}"
+    except Exception as e:
+        logger.error("Error connecting to CML: %s", e, exc_info=True)
+        return f"Error connecting to CML: {str(e)}"
+
+
+# Helper Functions
+
+def _check_auth() -> Union[None, Dict[str, str]]:
+    """
+    Check if the client is authenticated
+    
+    Returns:
+        None if authenticated, error dictionary if not
+    """
+    if not cml_auth:
+        return {"error": "You must initialize the client first with initialize_client()"}
+    return None
+
+
+def _handle_api_error(operation: str, error: Exception) -> Dict[str, Any]:
+    """
+    Handle API errors consistently
+    
+    Args:
+        operation: Description of the operation that failed
+        error: Exception that was raised
+    
+    Returns:
+        Error dictionary with consistent format
+    """
+    logger.error("Error during %s: %s", operation, error, exc_info=True)
+    return {"error": f"Error during {operation}: {str(error)}"}
+
+
+def _is_physical_interface(interface_data: Dict[str, Any]) -> bool:
+    """
+    Check whether interface details describe a physical interface
+    
+    Args:
+        interface_data: Interface details as returned by CML
+    
+    Returns:
+        True if the interface is physical
+    """
+    if "type" in interface_data:
+        return interface_data.get("type") == "physical"
+    
+    # If type is not present, most physical interfaces have a slot number
+    return "slot" in interface_data
+
+
+def _split_interface_listing(interfaces: Any) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Split an interface listing into the details already present and the IDs still to fetch
+    
+    CML answers interface listings with full objects when ``data=true`` is
+    honoured, and with bare IDs (a list, a dict keyed by ID or a string of
+    concatenated UUIDs) on older controllers.
+    
+    Args:
+        interfaces: Decoded JSON body of an interface listing
+    
+    Returns:
+        Tuple of (interface details, interface IDs without details)
+    """
+    if isinstance(interfaces, str):
+        if len(interfaces) % 36 == 0:
+            interfaces = [interfaces[i:i+36] for i in range(0, len(interfaces), 36)]
+        else:
+            interfaces = interfaces.split()
+    elif isinstance(interfaces, dict):
+        interfaces = [
+            dict(value, id=value.get("id", key)) if isinstance(value, dict) else key
+            for key, value in interfaces.items()
+        ]
+    
+    details = []
+    missing_ids = []
+    for item in interfaces or []:
+        if isinstance(item, dict):
+            details.append(item)
+        else:
+            missing_ids.append(str(item))
+    return details, missing_ids
+
+
+async def _fetch_interface_details(lab_id: str, interface_ids: List[str], operational: bool = False) -> List[Dict[str, Any]]:
+    """
+    Fetch details for several interfaces concurrently
+    
+    Args:
+        lab_id: ID of the lab
+        interface_ids: IDs of the interfaces to fetch
+        operational: Whether to include operational data
+    
+    Returns:
+        Interface details in the same order as interface_ids
+    """
+    query = "?operational=true" if operational else ""
+    responses = await cml_auth.request_many(
+        [("GET", f"/api/v0/labs/{lab_id}/interfaces/{interface_id}{query}") for interface_id in interface_ids],
+        return_exceptions=False
+    )
+    return [response.json() for response in responses]
+
+
+@_traced
+async def _get_interface_details(lab_id: str, endpoint: str, operational: bool = False) -> List[Dict[str, Any]]:
+    """
+    Get full interface details from an interface listing endpoint
+    
+    Args:
+        lab_id: ID of the lab
+        endpoint: Listing endpoint (node or lab interfaces)
+        operational: Whether to include operational data
+    
+    Returns:
+        List of interface details
+    """
+    query = "?data=true&operational=true" if operational else "?data=true"
+    response = await cml_auth.request("GET", f"{endpoint}{query}")
+    details, missing_ids = _split_interface_listing(response.json())
+    
+    # Controllers that ignore data=true only hand back IDs
+    if missing_ids:
+        logger.debug("Fetching details for %d interfaces individually", len(missing_ids))
+        details.extend(await _fetch_interface_details(lab_id, missing_ids, operational))
+    
+    return details
+
+
+async def _get_node_interface_details(lab_id: str, node_id: str, operational: bool = False) -> List[Dict[str, Any]]:
+    """
+    Get details for every interface on a node, in a single request where the API allows it
+    
+    Args:
+        lab_id: ID of the lab
+        node_id: ID of the node
+        operational: Whether to include operational data
+    
+    Returns:
+        List of interface details
+    """
+    return await _get_interface_details(lab_id, f"/api/v0/labs/{lab_id}/nodes/{node_id}/interfaces", operational)
+
+
+async def _get_lab_interface_details(lab_id: str, operational: bool = False) -> List[Dict[str, Any]]:
+    """
+    Get details for every interface in a lab, in a single request where the API allows it
+    
+    Args:
+        lab_id: ID of the lab
+        operational: Whether to include operational data
+    
+    Returns:
+        List of interface details
+    """
+    return await _get_interface_details(lab_id, f"/api/v0/labs/{lab_id}/interfaces", operational)
+
+
+@_traced
+async def _get_lab_node_states(lab_id: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Get every node in a lab with its operational state, in a single request where the API allows it
+    
+    Args:
+        lab_id: ID of the lab
+    
+    Returns:
+        Dictionary mapping node IDs to node details
+    """
+    response = await cml_auth.request("GET", f"/api/v0/labs/{lab_id}/nodes?data=true&operational=true")
+    nodes = response.json()
+    
+    if isinstance(nodes, dict):
+        return {node_id: dict(node, id=node_id) for node_id, node in nodes.items() if isinstance(node, dict)}
+    
+    result = {node["id"]: node for node in nodes if isinstance(node, dict) and node.get("id")}
+    
+    # Controllers that ignore data=true only hand back IDs
+    missing_ids = [node_id for node_id in nodes if isinstance(node_id, str)]
+    if missing_ids:
+        responses = await cml_auth.request_many(
+            [("GET", f"/api/v0/labs/{lab_id}/nodes/{node_id}?operational=true") for node_id in missing_ids],
+            return_exceptions=False
+        )
+        for node_id, node_response in zip(missing_ids, responses):
+            result[node_id] = node_response.json()
+    
+    return result
+
+
+@_traced
+async def _get_lab_links(lab_id: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Get every link in a lab with its details, in a single request where the API allows it
+    
+    Args:
+        lab_id: ID of the lab
+    
+    Returns:
+        Dictionary mapping link IDs to link details
+    """
+    response = await cml_auth.request("GET", f"/api/v0/labs/{lab_id}/links?data=true")
+    links = response.json()
+    
+    if isinstance(links, dict):
+        return {link_id: dict(link, id=link_id) for link_id, link in links.items() if isinstance(link, dict)}
+    
+    result = {link["id"]: link for link in links if isinstance(link, dict) and link.get("id")}
+    
+    # Controllers that ignore data=true only hand back IDs
+    missing_ids = [link_id for link_id in links if isinstance(link_id, str)]
+    if missing_ids:
+        responses = await cml_auth.request_many(
+            [("GET", f"/api/v0/labs/{lab_id}/links/{link_id}") for link_id in missing_ids],
+            return_exceptions=False
+        )
+        for link_id, link_response in zip(missing_ids, responses):
+            result[link_id] = link_response.json()
+    
+    return result
+
+
+def _format_node_readiness(node_states: Dict[str, Dict[str, Any]], ready_times: Dict[str, float]) -> str:
+    """
+    Format per-node readiness timings, slowest first
+    
+    Args:
+        node_states: Dictionary mapping node IDs to node details
+        ready_times: Seconds until each ready node was first seen ready
+    
+    Returns:
+        Formatted readiness report
+    """
+    lines = ["Node readiness (seconds since wait started):"]
+    
+    # Nodes that never became ready first, then the slowest to boot
+    ordered = sorted(node_states.items(), key=lambda item: -ready_times.get(item[0], float("inf")))
+    for node_id, node_data in ordered:
+        label = node_data.get("label", node_id)
+        image = node_data.get("node_definition", "unknown")
+        if node_id in ready_times:
+            lines.append(f"- {label} ({image}): {ready_times[node_id]:.1f}s")
+        else:
+            lines.append(f"- {label} ({image}): not ready (state: {node_data.get('state', 'UNKNOWN')})")
+    
+    return "\n".join(lines)
+
+
+def _config_hash(config: str) -> str:
+    """
+    Hash a configuration for change detection
+    
+    Args:
+        config: Configuration text
+    
+    Returns:
+        Hex SHA-256 digest
+    """
+    return hashlib.sha256(config.encode("utf-8")).hexdigest()
+
+
+def _node_configuration_text(node_data: Dict[str, Any]) -> str:
+    """
+    Get the main configuration from a node's details
+    
+    Newer controllers return a list of named configuration files, where
+    the first entry is the one the config endpoint reads and writes.
+    
+    Args:
+        node_data: Node details as returned with data=true
+    
+    Returns:
+        Configuration text (empty if the node has none)
+    """
+    configuration = node_data.get("configuration")
+    if isinstance(configuration, list):
+        configuration = configuration[0].get("content") if configuration and isinstance(configuration[0], dict) else None
+    return configuration if isinstance(configuration, str) else ""
+
+
+def _remember_config(lab_id: str, node_id: str, config: str) -> None:
+    """
+    Record the configuration a node now has on the server
+    
+    Only labs whose configurations are already tracked are updated, so a
+    partially known lab is never mistaken for a fully loaded one.
+    
+    Args:
+        lab_id: ID of the lab
+        node_id: ID of the node
+        config: Configuration text
+    """
+    if lab_id in _config_hashes:
+        _config_hashes[lab_id][node_id] = _config_hash(config)
+
+
+@_traced
+async def _load_config_hashes(lab_id: str) -> Dict[str, str]:
+    """
+    Load the hash of every node configuration in a lab from the server
+    
+    Args:
+        lab_id: ID of the lab
+    
+    Returns:
+        Dictionary mapping node IDs to configuration hashes
+    """
+    node_states = await _get_lab_node_states(lab_id)
+    _config_hashes[lab_id] = {
+        node_id: _config_hash(_node_configuration_text(node_data)) for node_id, node_data in node_states.items()
+    }
+    _config_hashes_loaded_at[lab_id] = time.monotonic()
+    return _config_hashes[lab_id]
+
+
+def _config_hashes_stale(lab_id: str) -> bool:
+    """Whether a lab's known configuration hashes are missing or older than _CONFIG_HASH_TTL"""
+    if lab_id not in _config_hashes:
+        return True
+    return time.monotonic() - _config_hashes_loaded_at.get(lab_id, 0.0) >= _CONFIG_HASH_TTL
+
+
+# Lab Management Tools
+
+# Smallest listing list_labs produces: the header, the footer and part of one lab
+_MIN_LIST_CHARS = 500
+
+# Appended to a lab entry cut short to fit max_chars
+_TRUNCATED_MARKER = " ... (truncated)"
+
+# Optional fields list_labs can show for each lab, with their display names
+_LAB_FIELDS = {
+    "description": ("Description", lambda lab: lab.get("description")),
+    "state": ("State", lambda lab: lab.get("state", "unknown")),
+    "owner": ("Owner", lambda lab: lab.get("owner_username") or lab.get("owner")),
+    "nodes": ("Nodes", lambda lab: lab.get("node_count")),
+    "links": ("Links", lambda lab: lab.get("link_count")),
+    "created": ("Created", lambda lab: lab.get("created")),
+    "modified": ("Modified", lambda lab: lab.get("modified"))
+}
+
+
+async def _iter_labs(skip: int = 0, chunk_size: int = 50, limit: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Yield the labs on the controller one at a time, fetching details only as they are consumed
+    
+    Controllers that list labs as bare IDs have their details fetched in
+    concurrent chunks, so a caller that stops early never pays for the rest.
+    
+    Args:
+        skip: Number of labs to skip without fetching their details
+        chunk_size: Number of lab details fetched per batch
+        limit: Stop after this many labs, so no details are fetched past them (optional)
+    
+    Yields:
+        Lab details, each with its "id"
+    """
+    response = await cml_auth.request("GET", "/api/v0/labs")
+    labs = response.json()
+    
+    end = None if limit is None else skip + limit
+    if isinstance(labs, dict):
+        for lab_id, lab_info in list(labs.items())[skip:end]:
+            yield dict(lab_info, id=lab_id)
+        return
+    
+    labs = labs[skip:end]
+    for start in range(0, len(labs), chunk_size):
+        chunk = labs[start:start + chunk_size]
+        missing_ids = [lab for lab in chunk if isinstance(lab, str)]
+        details = {}
+        if missing_ids:
+            responses = await cml_auth.request_many([("GET", f"/api/v0/labs/{lab_id}") for lab_id in missing_ids])
+            for lab_id, lab_response in zip(missing_ids, responses):
+                # Labs deleted since the listing was taken are skipped
+                if not isinstance(lab_response, Exception):
+                    details[lab_id] = lab_response.json()
+        
+        for lab in chunk:
+            if isinstance(lab, dict):
+                yield lab
+            elif lab in details:
+                yield dict(details[lab], id=lab)
+
+
+def _lab_matches(lab: Dict[str, Any], state: Optional[str], owner: Optional[str], title_contains: Optional[str]) -> bool:
+    """Whether a lab passes the list_labs filters"""
+    if state and str(lab.get("state", "")).upper() != state.upper():
+        return False
+    if owner and owner not in (lab.get("owner"), lab.get("owner_username")):
+        return False
+    if title_contains and title_contains.lower() not in str(lab.get("title", "")).lower():
+        return False
+    return True
+
+
+def _format_lab_entry(lab: Dict[str, Any], fields: List[str]) -> str:
+    """Format one lab for list_labs"""
+    lines = [f"- {lab.get('title', 'Untitled')} (ID: {lab['id']})"]
+    for field in fields:
+        name, getter = _LAB_FIELDS[field]
+        value = getter(lab)
+        if value is not None and value != "":
+            lines.append(f"  {name}: {value}")
+    return "\n".join(lines)
+
+
+@mcp.tool()
+@_instrumented
+async def list_labs(
+    offset: int = 0,
+    limit: int = 50,
+    state: Optional[str] = None,
+    owner: Optional[str] = None,
+    title_contains: Optional[str] = None,
+    fields: Optional[List[str]] = None,
+    max_chars: int = 20000
+) -> str:
+    """
+    List labs in CML, a page at a time
+    
+    Args:
+        offset: Number of matching labs to skip (default: 0)
+        limit: Maximum number of labs to return (default: 50)
+        state: Only labs in this state, e.g. "STARTED" or "STOPPED" (optional)
+        owner: Only labs owned by this user ID or username (optional)
+        title_contains: Only labs whose title contains this text, case-insensitive (optional)
+        fields: Fields to show besides title and ID, from description, state, owner,
+            nodes, links, created, modified (default: description, state)
+        max_chars: Maximum size of the listing, at least 500; fewer labs are returned if it would be
+            exceeded, and a lab too large to fit on its own is truncated (default: 20000)
+    
+    Returns:
+        A formatted list of labs, with the offset of the next page if there are more
+    """
+    auth_check = _check_auth()
+    if auth_check:
+        return auth_check["error"]
+    
+    fields = fields if fields is not None else ["description", "state"]
+    unknown_fields = [field for field in fields if field not in _LAB_FIELDS]
+    if unknown_fields:
+        return f"Error listing labs: unknown fields {unknown_fields}, expected some of {list(_LAB_FIELDS)}"
+    offset = max(0, offset)
+    limit = max(1, limit)
+    max_chars = max(_MIN_LIST_CHARS, max_chars)
+    
+    try:
+        filtered = bool(state or owner or title_contains)
+        
+        # Without filters the offset is applied before any lab details are fetched
+        header = "Available Labs:\n"
+        entries = []
+        size = len(header) + 100  # room for the footer
+        matched = 0 if filtered else offset
+        has_more = False
+        # One lab past the page tells whether there are more; with filters it is unknown how many labs that takes
+        if filtered:
+            labs = _iter_labs(chunk_size=min(limit + 1, 50))
+        else:
+            labs = _iter_labs(skip=offset, limit=limit + 1)
+        async for lab in labs:
+            if filtered and not _lab_matches(lab, state, owner, title_contains):
+                continue
+            matched += 1
+            if matched <= offset:
+                continue
+            if len(entries) >= limit:
+                has_more = True
+                break
+            entry = _format_lab_entry(lab, fields)
+            if size + len(entry) + 1 > max_chars:
+                if entries:
+                    has_more = True
+                    break
+                # A single oversized lab is cut short rather than breaking the limit
+                entry = entry[:max(0, max_chars - size - 1 - len(_TRUNCATED_MARKER))] + _TRUNCATED_MARKER
+            entries.append(entry)
+            size += len(entry) + 1
+        
+        if not entries:
+            if offset and matched:
+                return f"No labs beyond offset {offset}."
+            return "No labs match the given filters." if filtered else "No labs found in CML."
+        
+        footer = f"Showing labs {offset + 1}-{offset + len(entries)}"
+        if not has_more:
+            footer += f" of {offset + len(entries)}"
+        else:
+            footer += f"; more labs are available, continue with offset={offset + len(entries)}"
+        
+        return "\n".join([header] + entries + ["", footer])
+    except Exception as e:
+        return f"Error listing labs: {str(e)}"
+
+
+@mcp.tool()
+@_instrumented
+async def create_lab(title: str, description: str = "") -> Dict[str, str]:
+    """
+    Create a new lab in CML
+    
+    Args:
+        title: Title of the new lab
+        description: Optional description for the lab
+    
+    Returns:
+        Dictionary containing lab ID and confirmation message
+    """
+    auth_check = _check_auth()
+    if auth_check:
+        return auth_check
+    
+    try:
+        logger.info("Creating lab with title: %s", title)
+        
+        response = await cml_auth.request(
+            "POST", 
+            "/api/v0/labs",
+            json={"title": title, "description": description}
+        )
+        
+        lab_data = response.json()
+        logger.debug("Lab creation response: %s", lab_data)
+        
+        lab_id = lab_data.get("id")
+        
+        if not lab_id:
+            return {"error": "Failed to create lab, no lab ID returned"}
+        
+        # A new lab has no configurations to compare against
+        _config_hashes[lab_id] = {}
+        _config_hashes_loaded_at[lab_id] = time.monotonic()
+        
+        return {
+            "lab_id": lab_id,
+            "message": f"Created lab '{title}' with ID: {lab_id}",
+            "status": "success"
+        }
+    except Exception as e:
+        return _handle_api_error("create_lab", e)
+
+
+@mcp.tool()
+@_instrumented
+async def get_lab_details(lab_id: str) -> Dict[str, Any]:
+    """
+    Get detailed information about a specific lab
+    
+    Args:
+        lab_id: ID of the lab to get details for
+    
+    Returns:
+        Dictionary containing lab details
+    """
+    auth_check = _check_auth()
+    if auth_check:
+        return auth_check
+    
+    try:
+        response = await cml_auth.request("GET", f"/api/v0/labs/{lab_id}")
+        lab_details = response.json()
+        return lab_details
+    except Exception as e:
+        return _handle_api_error("get_lab_details", e)
+
+
+@mcp.tool()
+@_instrumented
+async def delete_lab(lab_id: str) -> str:
+    """
+    Delete a lab from CML
+    
+    Args:
+        lab_id: ID of the lab to delete
+    
+    Returns:
+        Confirmation message
+    """
+    auth_check = _check_auth()
+    if auth_check:
+        return auth_check["error"]
+    
+    try:
+        # First check if the lab is running
+        lab_details = await get_lab_details(lab_id)
+        if isinstance(lab_details, dict) and lab_details.get("state") in _LAB_RUNNING_STATES:
+            # Stop the lab first and wait until it has actually stopped
+            stopped = await stop_lab(lab_id, wait=True)
+            if stopped.startswith("Error"):
+                return f"Error deleting lab: {stopped}"
+        
+        response = await cml_auth.request("DELETE", f"/api/v0/labs/{lab_id}")
+        _forget_lab(lab_id)
+        return f"Lab {lab_id} deleted successfully"
+    except Exception as e:
+        return f"Error deleting lab: {str(e)}"
+
+
+def _forget_lab(lab_id: str) -> None:
+    """Drop everything cached about a deleted lab"""
+    _interface_indexes.pop(lab_id, None)
+    _config_hashes.pop(lab_id, None)
+    _config_hashes_loaded_at.pop(lab_id, None)
+    _lab_graphs.pop(lab_id, None)
+
+
+# Lab states from which a lab has to be stopped before it can be wiped
+_LAB_RUNNING_STATES = ("STARTED", "QUEUED", "BOOTED")
+
+
+@_traced
+async def _teardown_lab(lab: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+    """
+    Stop, wipe and delete one lab, waiting for each transition to finish
+    
+    Args:
+        lab: Lab details with "id"
+        timeout: Maximum time to wait for each transition in seconds
+    
+    Returns:
+        Dictionary with the lab's ID, title, outcome and per-step timing
+    """
+    lab_id = lab["id"]
+    result = {"lab_id": lab_id, "title": lab.get("title", "Untitled"), "initial_state": lab.get("state"), "timing": {}}
+    start_time = time.perf_counter()
+    step = "stop"
+    try:
+        step_start = time.perf_counter()
+        if lab.get("state") in _LAB_RUNNING_STATES:
+            await cml_auth.request("PUT", f"/api/v0/labs/{lab_id}/stop")
+            await cml_auth.wait_for_state(f"/api/v0/labs/{lab_id}", ("STOPPED",), timeout)
+        result["timing"]["stop_seconds"] = round(time.perf_counter() - step_start, 3)
+        
+        step = "wipe"
+        step_start = time.perf_counter()
+        if lab.get("state") != "DEFINED_ON_CORE":
+            await cml_auth.request("PUT", f"/api/v0/labs/{lab_id}/wipe")
+            _config_hashes.pop(lab_id, None)
+            await cml_auth.wait_for_state(f"/api/v0/labs/{lab_id}", ("DEFINED_ON_CORE",), timeout)
+        result["timing"]["wipe_seconds"] = round(time.perf_counter() - step_start, 3)
+        
+        step = "delete"
+        step_start = time.perf_counter()
+        await cml_auth.request("DELETE", f"/api/v0/labs/{lab_id}")
+        _forget_lab(lab_id)
+        result["timing"]["delete_seconds"] = round(time.perf_counter() - step_start, 3)
+        result["status"] = "deleted"
+    except Exception as e:
+        result["status"] = "failed"
+        result["error"] = f"{step} failed: {str(e)}"
+    
+    result["timing"]["total_seconds"] = round(time.perf_counter() - start_time, 3)
+    return result
+
+
+@mcp.tool()
+@_instrumented
+async def teardown_labs(
+    lab_ids: Optional[List[str]] = None,
+    state: Optional[str] = None,
+    owner: Optional[str] = None,
+    title_contains: Optional[str] = None,
+    dry_run: bool = True,
+    max_concurrency: int = 8,
+    timeout: float = 120.0
+) -> Dict[str, Any]:
+    """
+    Stop, wipe and delete many labs at once
+    
+    Labs are selected by ID and/or filters; at least one selector is
+    required. By default nothing is deleted and the matching labs are only
+    listed, so check the selection before running with dry_run=False.
+    
+    Args:
+        lab_ids: Only these labs; IDs that don't exist are skipped (optional)
+        state: Only labs in this state, e.g. "STOPPED" (optional)
+        owner: Only labs owned by this user ID or username (optional)
+        title_contains: Only labs whose title contains this text, case-insensitive (optional)
+        dry_run: List the selected labs without deleting them (default: True)
+        max_concurrency: Maximum number of labs torn down at once (default: 8)
+        timeout: Maximum seconds to wait for each lab to stop or wipe (default: 120)
+    
+    Returns:
+        Dictionary with the selected labs, per-lab outcome and timing, and totals
+    """
+    auth_check = _check_auth()
+    if auth_check:
+        return auth_check
+    
+    if not (lab_ids or state or owner or title_contains):
+        return {"error": "Select labs with lab_ids, state, owner or title_contains; refusing to tear down every lab"}
+    
+    try:
+        start_time = time.perf_counter()
+        if lab_ids:
+            # Only the named labs are fetched, however many the controller holds
+            lab_ids = list(dict.fromkeys(lab_ids))
+            responses = await cml_auth.request_many([("GET", f"/api/v0/labs/{lab_id}") for lab_id in lab_ids])
+            labs = []
+            for lab_id, response in zip(lab_ids, responses):
+                if isinstance(response, httpx.HTTPStatusError) and response.response.status_code == 404:
+                    continue
+                if isinstance(response, Exception):
+                    raise response
+                labs.append(dict(response.json(), id=lab_id))
+        else:
+            labs = [lab async for lab in _iter_labs()]
+        selected = [lab for lab in labs if _lab_matches(lab, state, owner, title_contains)]
+        
+        if dry_run:
+            return {
+                "dry_run": True,
+                "selected": [{"lab_id": lab["id"], "title": lab.get("title", "Untitled"), "state": lab.get("state")} for lab in selected],
+                "count": len(selected),
+                "message": f"{len(selected)} labs would be torn down; run again with dry_run=False to delete them"
+            }
+        
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        
+        async def teardown(lab):
+            async with semaphore:
+                return await _teardown_lab(lab, timeout)
+        
+        results = await asyncio.gather(*[teardown(lab) for lab in selected])
+        deleted = sum(1 for result in results if result["status"] == "deleted")
+        
+        return {
+            "dry_run": False,
+            "labs": results,
+            "deleted": deleted,
+            "failed": len(results) - deleted,
+            "elapsed_seconds": round(time.perf_counter() - start_time, 3),
+            "status": "success" if deleted == len(results) else "partial"
+        }
+    except Exception as e:
+        return _handle_api_error("teardown_labs", e)
+
+
+# Node Definition Management Tools
+
+async def _get_controller_version() -> str:
+    """
+    Get the controller's software version, cached with the node definition catalog
+    
+    Returns:
+        Version string, or "unknown" if the controller doesn't report one
+    """
+    version = cml_auth.catalog_cache.get("version")
+    if version is None:
+        response = await cml_auth.request("GET", "/api/v0/system_information")
+        version = str(response.json().get("version") or "unknown")
+        cml_auth.catalog_cache.set("version", version)
+    return version
+
+
+def _definition_limits(node_def: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Pull the limits used by pre-flight validation out of a node definition
+    
+    Args:
+        node_def: Node definition as returned by CML
+    
+    Returns:
+        Dictionary with max_interfaces (None if unknown), default ram and needs_image
+    """
+    device = node_def.get("device") or {}
+    interfaces = device.get("interfaces") or node_def.get("interfaces") or {}
+    physical = interfaces.get("physical") if isinstance(interfaces, dict) else interfaces
+    linux_native = (node_def.get("sim") or {}).get("linux_native") or {}
+    return {
+        "max_interfaces": len(physical) if isinstance(physical, list) and physical else None,
+        "ram": linux_native.get("ram"),
+        # Unmanaged switches, external connectors and the like run without a disk image
+        "needs_image": linux_native.get("libvirt_domain_driver", "kvm") not in ("none", None)
+    }
+
+
+def _format_node_definitions(node_defs: Any) -> Dict[str, Any]:
+    """
+    Index the node definition catalog by ID and build the list_node_definitions view of it
+    
+    Args:
+        node_defs: Catalog as returned by the node_definitions endpoint
+    
+    Returns:
+        Dictionary with "definitions" (full definitions by ID), "limits" (see
+        _definition_limits) and "listing" (tool output)
+    """
+    # If the response is a list, convert it to a dictionary
+    if isinstance(node_defs, list):
+        definitions = {node_def["id"]: node_def for node_def in node_defs if isinstance(node_def, dict) and node_def.get("id")}
+        listing = definitions
+    else:
+        # Format the result to be more readable
+        definitions = node_defs
+        listing = {}
+        for node_id, node_info in node_defs.items():
+            listing[node_id] = {
+                "description": node_info.get("description", ""),
+                "type": node_info.get("type", ""),
+                "interfaces": node_info.get("interfaces", []),
+            }
+    
+    limits = {node_id: _definition_limits(node_def) for node_id, node_def in definitions.items() if isinstance(node_def, dict)}
+    return {"definitions": definitions, "limits": limits, "listing": listing}
+
+
+def _format_image_definitions(image_defs: Any) -> Dict[str, Any]:
+    """
+    Index the image definition catalog by ID and by node definition
+    
+    Args:
+        image_defs: Catalog as returned by the image_definitions endpoint
+    
+    Returns:
+        Dictionary with "definitions" (images by ID) and "by_node_definition" (image IDs per node definition)
+    """
+    if isinstance(image_defs, dict):
+        image_defs = [dict(image_def, id=image_id) for image_id, image_def in image_defs.items() if isinstance(image_def, dict)]
+    
+    definitions = {}
+    by_node_definition = {}
+    for image_def in image_defs:
+        if isinstance(image_def, dict) and image_def.get("id"):
+            definitions[image_def["id"]] = image_def
+            by_node_definition.setdefault(image_def.get("node_definition_id"), []).append(image_def["id"])
+    return {"definitions": definitions, "by_node_definition": by_node_definition}
+
+
+# Formatter for each cached catalog, keyed by API endpoint name
+_CATALOG_FORMATTERS = {
+    "node_definitions": _format_node_definitions,
+    "image_definitions": _format_image_definitions
+}
+
+
+@_traced
+async def _get_catalog(kind: str, refresh: bool = False) -> Dict[str, Any]:
+    """
+    Get a definition catalog, from memory, the disk snapshot or the controller
+    
+    Catalogs are large and rarely change, so they are kept in memory for
+    the client's catalog TTL. With snapshots enabled they are also written
+    to disk per controller and software version, so a restarted server
+    only has to ask for the version.
+    
+    Args:
+        kind: "node_definitions" or "image_definitions"
+        refresh: Ignore cached copies and fetch the catalog again
+    
+    Returns:
+        Formatted catalog (see _format_node_definitions and _format_image_definitions)
+    """
+    catalog_cache = cml_auth.catalog_cache
+    if refresh:
+        catalog_cache.invalidate(kind)
+    else:
+        catalog = catalog_cache.get(kind)
+        if catalog is not None:
+            return catalog
+    
+    # Concurrent callers (e.g. a batch of add_node calls) share one fetch
+    async with cml_auth.catalog_lock:
+        catalog = catalog_cache.get(kind)
+        if catalog is not None:
+            return catalog
+        
+        formatter = _CATALOG_FORMATTERS[kind]
+        version = await _get_controller_version() if cml_auth.catalog_snapshot else None
+        if version and not refresh:
+            snapshot = _read_catalog_snapshot(kind, cml_auth.base_url, version)
+            if snapshot is not None:
+                catalog = formatter(snapshot["catalog"])
+                catalog_cache.set(kind, catalog)
+                return catalog
+        
+        response = await cml_auth.request("GET", f"/api/v0/{kind}")
+        raw_catalog = response.json()
+        catalog = formatter(raw_catalog)
+        catalog_cache.set(kind, catalog)
+        
+        if version:
+            try:
+                _write_cache_file(
+                    _catalog_snapshot_filename(kind, cml_auth.base_url, version),
+                    {"base_url": cml_auth.base_url, "version": version, "catalog": raw_catalog}
+                )
+            except OSError as e:
+                logger.warning("Could not write %s snapshot: %s", kind, e)
+        
+        return catalog
+
+
+async def _get_node_definitions(refresh: bool = False) -> Dict[str, Any]:
+    """
+    Get the node definition catalog (see _get_catalog)
+    
+    Args:
+        refresh: Ignore cached copies and fetch the catalog again
+    
+    Returns:
+        Dictionary with "definitions", "limits" and "listing"
+    """
+    return await _get_catalog("node_definitions", refresh)
+
+
+async def _get_validation_catalogs() -> Optional[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+    """
+    Get the node and image definition catalogs for pre-flight validation
+    
+    Returns:
+        (node definitions, image definitions) with image definitions None if
+        they can't be read, or None if node definitions can't be read
+    """
+    try:
+        node_catalog = await _get_node_definitions()
+    except Exception as e:
+        logger.warning("Skipping pre-flight validation, node definitions unavailable: %s", e)
+        return None
+    if not node_catalog["definitions"]:
+        return None
+    
+    try:
+        image_catalog = await _get_catalog("image_definitions")
+    except Exception as e:
+        logger.warning("Skipping image checks, image definitions unavailable: %s", e)
+        image_catalog = None
+    return node_catalog, image_catalog
+
+
+def _validate_node_spec(
+    node: Dict[str, Any],
+    node_catalog: Dict[str, Any],
+    image_catalog: Optional[Dict[str, Any]] = None,
+    interface_count: int = 0
+) -> List[str]:
+    """
+    Check a node against the node and image definition catalogs without contacting CML
+    
+    Args:
+        node: Node spec (node_definition and optionally ram, cpu_limit, cpus,
+            image_definition, interfaces, parameters)
+        node_catalog: Node definition catalog from _get_node_definitions
+        image_catalog: Image definition catalog, or None to skip image checks
+        interface_count: Interfaces the node needs for its links
+    
+    Returns:
+        List of problems, empty if the node is valid
+    """
+    node_definition = node.get("node_definition")
+    limits = node_catalog["limits"].get(node_definition)
+    if limits is None:
+        return [f"unknown node definition '{node_definition}'"]
+    
+    errors = []
+    ram = node.get("ram")
+    if ram is not None and (not isinstance(ram, int) or ram < 1):
+        errors.append(f"ram must be a positive number of MB, got {ram!r}")
+    cpu_limit = node.get("cpu_limit")
+    if cpu_limit is not None and (not isinstance(cpu_limit, int) or not 20 <= cpu_limit <= 100):
+        errors.append(f"cpu_limit must be a percentage between 20 and 100, got {cpu_limit!r}")
+    cpus = node.get("cpus")
+    if cpus is not None and (not isinstance(cpus, int) or not 1 <= cpus <= 128):
+        errors.append(f"cpus must be between 1 and 128, got {cpus!r}")
+    
+    # Interfaces come from the spec, a slot1 parameter and the links that need them
+    requested = [("interfaces", node.get("interfaces")), ("slot1", (node.get("parameters") or {}).get("slot1"))]
+    max_interfaces = limits["max_interfaces"]
+    interface_errors = len(errors)
+    for source, count in requested:
+        if count is None:
+            continue
+        try:
+            count = int(count)
+        except (TypeError, ValueError):
+            errors.append(f"{source} must be a number of interfaces, got {count!r}")
+            continue
+        if max_interfaces is not None and count > max_interfaces:
+            errors.append(f"{source} asks for {count} interfaces but {node_definition} has at most {max_interfaces}")
+    if max_interfaces is not None and interface_count > max_interfaces and len(errors) == interface_errors:
+        errors.append(f"links need {interface_count} interfaces but {node_definition} has at most {max_interfaces}")
+    
+    if image_catalog is not None:
+        image_definition = node.get("image_definition")
+        if image_definition is not None:
+            image = image_catalog["definitions"].get(image_definition)
+            if image is None:
+                errors.append(f"unknown image definition '{image_definition}'")
+            elif image.get("node_definition_id") not in (None, node_definition):
+                errors.append(f"image '{image_definition}' belongs to {image.get('node_definition_id')}, not {node_definition}")
+        elif limits["needs_image"] and not image_catalog["by_node_definition"].get(node_definition):
+            errors.append(f"no image is installed for {node_definition}")
+    
+    return errors
+
+
+@_traced
+def _validate_topology_spec(
+    spec: Dict[str, Any],
+    node_catalog: Dict[str, Any],
+    image_catalog: Optional[Dict[str, Any]] = None,
+    ram_budget_mb: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Check a whole topology spec without contacting CML
+    
+    Args:
+        spec: Topology specification (see _render_topology)
+        node_catalog: Node definition catalog from _get_node_definitions
+        image_catalog: Image definition catalog, or None to skip image checks
+        ram_budget_mb: Maximum total RAM for the topology in MB (optional)
+    
+    Returns:
+        Dictionary with "valid", "errors" and "ram_mb" (total RAM, where known)
+    """
+    nodes = spec.get("nodes") or []
+    errors = []
+    
+    # Interfaces each node needs: the highest explicit slot or one per link
+    labels = {}
+    for index, node in enumerate(nodes):
+        label = node.get("label")
+        if not label or not node.get("node_definition"):
+            errors.append(f"node {index}: needs a label and a node_definition")
+        elif label in labels:
+            errors.append(f"{label}: duplicate node label")
+        else:
+            labels[label] = {"links": 0, "max_slot": -1, "slots": set()}
+    
+    for index, link in enumerate(spec.get("links") or []):
+        for side in ("a", "b"):
+            label = link.get(side)
+            usage = labels.get(label)
+            if usage is None:
+                errors.append(f"link {index}: endpoint '{label}' is not a node in the spec")
+                continue
+            usage["links"] += 1
+            slot = link.get(f"{side}_slot")
+            if slot is not None:
+                if slot in usage["slots"]:
+                    errors.append(f"link {index}: slot {slot} on {label} is used by more than one link")
+                usage["slots"].add(slot)
+                usage["max_slot"] = max(usage["max_slot"], slot)
+    
+    ram_total = 0
+    checked = set()
+    for node in nodes:
+        usage = labels.get(node.get("label"))
+        if usage is None or node["label"] in checked:
+            continue
+        checked.add(node["label"])
+        needed = max(usage["links"], usage["max_slot"] + 1)
+        errors.extend(f"{node['label']}: {error}" for error in _validate_node_spec(node, node_catalog, image_catalog, needed))
+        limits = node_catalog["limits"].get(node["node_definition"]) or {}
+        ram = node.get("ram") if isinstance(node.get("ram"), int) else limits.get("ram")
+        ram_total += ram or 0
+    
+    if ram_budget_mb is not None and ram_total > ram_budget_mb:
+        errors.append(f"topology needs {ram_total} MB of RAM, over the budget of {ram_budget_mb} MB")
+    
+    return {"valid": not errors, "errors": errors, "ram_mb": ram_total}
+
+
+@mcp.tool()
+@_instrumented
+async def list_node_definitions(refresh: bool = False) -> Union[Dict[str, Any], str]:
+    """
+    List all available node definitions in CML
+    
+    Args:
+        refresh: Fetch the catalog from CML again instead of using the cached copy (default: False)
     
     Returns:
         Dictionary of available node definitions or error message
@@ -348,1211 +2765,2910 @@ async def list_node_definitions() -> Union[Dict[str, Any], str]:
         return auth_check["error"]
     
     try:
-        response = await cml_auth.request("GET", "/api/v0/node_definitions")
-        node_defs = response.json()
-        
-        # If the response is a list, convert it to a dictionary
-        if isinstance(node_defs, list):
-            print(f"Converting node definitions list to dictionary", file=sys.stderr)
-            result = {}
-            for node_def in node_defs:
-                node_id = node_def.get("id")
-                if node_id:
-                    result[node_id] = node_def
-            return result
+        catalog = await _get_node_definitions(refresh)
+        return catalog["listing"]
+    except Exception as e:
+        return f"Error listing node definitions: {str(e)}"
+
+
+# Node Management Tools
+
+@mcp.tool()
+@_instrumented
+async def get_lab_nodes(lab_id: str) -> Union[Dict[str, Any], str]:
+    """
+    Get all nodes in a specific lab
+    
+    Args:
+        lab_id: ID of the lab
+    
+    Returns:
+        Dictionary of nodes in the lab or error message
+    """
+    auth_check = _check_auth()
+    if auth_check:
+        return auth_check["error"]
+    
+    try:
+        return await _get_lab_node_states(lab_id)
+    except Exception as e:
+        return f"Error getting lab nodes: {str(e)}"
+
+
+@mcp.tool()
+@_instrumented
+async def add_node(
+    lab_id: str, 
+    label: str, 
+    node_definition: str, 
+    x: int = 0, 
+    y: int = 0,
+    populate_interfaces: bool = True,
+    ram: Optional[int] = None,
+    cpu_limit: Optional[int] = None,
+    parameters: Optional[Dict[str, str]] = None
+) -> Dict[str, Any]:
+    """
+    Add a node to the specified lab
+    
+    Args:
+        lab_id: ID of the lab
+        label: Label for the new node
+        node_definition: Type of node (e.g., 'iosv', 'csr1000v')
+        x: X coordinate for node placement
+        y: Y coordinate for node placement
+        populate_interfaces: Whether to automatically create interfaces
+        ram: RAM allocation for the node (optional)
+        cpu_limit: CPU limit for the node (optional)
+        parameters: Node-specific parameters (optional)
+    
+    Returns:
+        Dictionary with node ID and confirmation message
+    """
+    auth_check = _check_auth()
+    if auth_check:
+        return auth_check
+    
+    try:
+        # Check the node against the cached catalogs before anything is written
+        catalogs = await _get_validation_catalogs()
+        if catalogs:
+            node_spec = {"node_definition": node_definition, "ram": ram, "cpu_limit": cpu_limit, "parameters": parameters}
+            errors = _validate_node_spec(node_spec, *catalogs)
+            if errors:
+                result = {"error": f"Invalid node '{label}': {'; '.join(errors)}"}
+                if node_definition not in catalogs[0]["limits"]:
+                    result["available"] = sorted(catalogs[0]["limits"])
+                return result
+        
+        # Construct the node data payload
+        node_data = {
+            "label": label,
+            "node_definition": node_definition,
+            "x": x,
+            "y": y,
+            "parameters": parameters or {},
+            "tags": [],
+            "hide_links": False
+        }
+        
+        # Add optional parameters if provided
+        if ram is not None:
+            node_data["ram"] = ram
+        
+        if cpu_limit is not None:
+            node_data["cpu_limit"] = cpu_limit
+        
+        # Add populate_interfaces as a query parameter if needed
+        endpoint = f"/api/v0/labs/{lab_id}/nodes"
+        if populate_interfaces:
+            endpoint += "?populate_interfaces=true"
+        
+        # Make the API request with explicit Content-Type header
+        headers = {"Content-Type": "application/json"}
+        response = await cml_auth.request(
+            "POST",
+            endpoint,
+            json=node_data,
+            headers=headers
+        )
+        _lab_graphs.pop(lab_id, None)
+        
+        # Process the response
+        result = response.json()
+        node_id = result.get("id")
+        
+        if not node_id:
+            return {"error": "Failed to create node, no node ID returned", "response": result}
+        
+        return {
+            "node_id": node_id,
+            "message": f"Added node '{label}' with ID: {node_id}",
+            "status": "success",
+            "details": result
+        }
+    except Exception as e:
+        return _handle_api_error("add_node", e)
+
+
+@mcp.tool()
+@_instrumented
+async def create_router(
+    lab_id: str,
+    label: str,
+    x: int = 0,
+    y: int = 0
+) -> Dict[str, Any]:
+    """
+    Create a router with the 'iosv' node definition
+    
+    Args:
+        lab_id: ID of the lab
+        label: Label for the new router
+        x: X coordinate for node placement
+        y: Y coordinate for node placement
+    
+    Returns:
+        Dictionary with node ID and confirmation message
+    """
+    auth_check = _check_auth()
+    if auth_check:
+        return auth_check
+    
+    # Use add_node with the router node definition
+    return await add_node(lab_id, label, "iosv", x, y, True)
+
+
+@mcp.tool()
+@_instrumented
+async def create_switch(
+    lab_id: str,
+    label: str,
+    num_interfaces: int = 8,
+    x: int = 0,
+    y: int = 0
+) -> Dict[str, Any]:
+    """
+    Create a switch with a specified number of interfaces
+    
+    Args:
+        lab_id: ID of the lab
+        label: Label for the new switch
+        num_interfaces: Number of interfaces to create (default: 8)
+        x: X coordinate for node placement
+        y: Y coordinate for node placement
+    
+    Returns:
+        Dictionary with node ID and confirmation message
+    """
+    auth_check = _check_auth()
+    if auth_check:
+        return auth_check
+    
+    try:
+        # Use add_node with the switch node definition and parameters for interfaces
+        return await add_node(
+            lab_id,
+            label,
+            "iosvl2",
+            x,
+            y,
+            True,
+            ram=None,
+            cpu_limit=None,
+            parameters={"slot1": str(num_interfaces)}  # Configure the number of interfaces
+        )
+    except Exception as e:
+        return _handle_api_error("create_switch", e)
+
+
+# Interface Management Tools
+
+@mcp.tool()
+@_instrumented
+async def get_node_interfaces(lab_id: str, node_id: str) -> Union[Dict[str, Any], str, List[str]]:
+    """
+    Get interfaces for a specific node
+    
+    Args:
+        lab_id: ID of the lab
+        node_id: ID of the node
+    
+    Returns:
+        Dictionary of node interfaces or error message or list of interface IDs
+    """
+    auth_check = _check_auth()
+    if auth_check:
+        return auth_check["error"]
+    
+    try:
+        response = await cml_auth.request("GET", f"/api/v0/labs/{lab_id}/nodes/{node_id}/interfaces")
+        interfaces = response.json()
+        
+        # Check if the response is a list of interface IDs
+        if isinstance(interfaces, list):
+            logger.debug("Got list of interface IDs: %s", interfaces)
+            return interfaces
+        elif isinstance(interfaces, str):
+            # If it's a string, it might be a concatenated list of UUIDs
+            logger.debug("Got string of interface IDs: %s", interfaces)
+            # Parse as UUIDs (36 characters per UUID)
+            if len(interfaces) % 36 == 0:
+                return [interfaces[i:i+36] for i in range(0, len(interfaces), 36)]
+            else:
+                return interfaces
+        else:
+            # If it's a dictionary, return it as is
+            return interfaces
+    except Exception as e:
+        logger.error("Error getting node interfaces: %s", e, exc_info=True)
+        return f"Error getting node interfaces: {str(e)}"
+
+
+@mcp.tool()
+@_instrumented
+async def get_physical_interfaces(lab_id: str, node_id: str) -> Union[Dict[str, Any], List[Dict[str, Any]], str]:
+    """
+    Get all physical interfaces for a specific node
+    
+    Args:
+        lab_id: ID of the lab
+        node_id: ID of the node
+    
+    Returns:
+        List of physical interfaces or error message
+    """
+    auth_check = _check_auth()
+    if auth_check:
+        return auth_check["error"]
+    
+    try:
+        # Pull every interface with its details in one request where possible
+        interfaces = await _get_node_interface_details(lab_id, node_id)
+        physical_interfaces = [iface for iface in interfaces if _is_physical_interface(iface)]
+        
+        if not physical_interfaces:
+            return f"No physical interfaces found for node {node_id}"
+        
+        return physical_interfaces
+    except Exception as e:
+        return _handle_api_error("get_physical_interfaces", e)
+
+
+@mcp.tool()
+@_instrumented
+async def get_lab_interfaces(lab_id: str, physical_only: bool = True) -> Union[Dict[str, Any], str]:
+    """
+    Get interface details for every node in a lab with a single lab-wide request
+    
+    Args:
+        lab_id: ID of the lab
+        physical_only: Only include physical interfaces (default: True)
+    
+    Returns:
+        Dictionary mapping node IDs to their interface details or error message
+    """
+    auth_check = _check_auth()
+    if auth_check:
+        return auth_check["error"]
+    
+    try:
+        interfaces = await _get_lab_interface_details(lab_id, operational=True)
+        
+        result = {}
+        for interface_data in interfaces:
+            if physical_only and not _is_physical_interface(interface_data):
+                continue
+            result.setdefault(interface_data.get("node", "unknown"), []).append(interface_data)
+        
+        return result
+    except Exception as e:
+        return _handle_api_error("get_lab_interfaces", e)
+
+
+@mcp.tool()
+@_instrumented
+async def create_interface(lab_id: str, node_id: str, slot: int = 4) -> Dict[str, Any]:
+    """
+    Create an interface on a node
+    
+    Args:
+        lab_id: ID of the lab
+        node_id: ID of the node
+        slot: Slot number for the interface (default: 4)
+    
+    Returns:
+        Dictionary with interface ID and confirmation message
+    """
+    auth_check = _check_auth()
+    if auth_check:
+        return auth_check
+    
+    try:
+        # Check if the lab is running
+        lab_details = await get_lab_details(lab_id)
+        if isinstance(lab_details, dict) and lab_details.get("state") == "STARTED":
+            return {"error": "Cannot create interfaces while the lab is running. Please stop the lab first."}
+        
+        logger.debug("Creating interface on node %s, slot %s", node_id, slot)
+        
+        # Construct the proper payload format
+        interface_data = {
+            "node": node_id,
+            "slot": slot
+        }
+        
+        logger.debug("Interface creation payload: %s", interface_data)
+        
+        # Make the API request
+        response = await cml_auth.request(
+            "POST", 
+            f"/api/v0/labs/{lab_id}/interfaces",
+            json=interface_data
+        )
+        
+        # Process the response
+        result = response.json()
+        logger.debug("Interface creation response: %s", result)
+        
+        # Make new interfaces available to link allocation on nodes the index already tracks
+        index = _interface_indexes.get(lab_id)
+        if index and node_id in index.free:
+            for created in (result if isinstance(result, list) else [result]):
+                if isinstance(created, dict):
+                    index.add_interface(dict(created, node=created.get("node", node_id)))
+        
+        # Handle different response formats
+        if isinstance(result, list) and len(result) > 0:
+            # Sometimes the API returns a list of created interfaces
+            interface_id = result[0].get("id")
+            interface_label = result[0].get("label")
+            return {
+                "interface_id": interface_id,
+                "message": f"Created interface {interface_label} on node {node_id}, slot {slot}",
+                "status": "success",
+                "details": result
+            }
+        elif isinstance(result, dict):
+            # Sometimes it returns a single object
+            interface_id = result.get("id")
+            interface_label = result.get("label")
+            if interface_id:
+                return {
+                    "interface_id": interface_id,
+                    "message": f"Created interface {interface_label} on node {node_id}, slot {slot}",
+                    "status": "success",
+                    "details": result
+                }
+        
+        return {"error": "Failed to create interface, unexpected response format", "response": result}
+    except Exception as e:
+        return _handle_api_error("create_interface", e)
+
+
+# Link Management Tools
+
+class LabInterfaceIndex:
+    """Free and used physical interfaces per node in a lab, kept in step with link changes"""
+    
+    def __init__(self, lab_id: str):
+        """
+        Initialize an empty index; it is seeded on first use
+        
+        Args:
+            lab_id: ID of the lab
+        """
+        self.lab_id = lab_id
+        self.free = {}
+        self.used = {}
+        self.links = {}
+        self.interface_nodes = {}
+        self.interface_slots = {}
+        self._seeded = False
+        self._lock = asyncio.Lock()
+    
+    def add_interface(self, interface_data: Dict[str, Any]) -> None:
+        """
+        Track an interface from its CML details
+        
+        Args:
+            interface_data: Interface details as returned by CML
+        """
+        interface_id = interface_data.get("id")
+        node_id = interface_data.get("node")
+        if not interface_id or not node_id or interface_id in self.interface_nodes:
+            return
+        
+        self.free.setdefault(node_id, [])
+        self.used.setdefault(node_id, set())
+        if not _is_physical_interface(interface_data):
+            return
+        
+        slot = interface_data.get("slot")
+        self.interface_nodes[interface_id] = node_id
+        self.interface_slots[interface_id] = slot if isinstance(slot, int) else 0
+        if interface_data.get("is_connected"):
+            self.used[node_id].add(interface_id)
+        else:
+            heapq.heappush(self.free[node_id], (self.interface_slots[interface_id], interface_id))
+    
+    @_traced
+    async def allocate(self, node_id: str, slot: Optional[int] = None) -> Optional[str]:
+        """
+        Reserve a free physical interface on a node
+        
+        The first call seeds the index with one lab-wide request; nodes added
+        afterwards are loaded with one request each the first time they're seen.
+        
+        Args:
+            node_id: ID of the node
+            slot: Specific slot to reserve, created on the node if it doesn't exist yet
+                (default: the lowest free slot)
+        
+        Returns:
+            Interface ID, or None if no suitable interface is free
+        """
+        async with self._lock:
+            if not self._seeded:
+                for interface_data in await _get_lab_interface_details(self.lab_id, operational=True):
+                    self.add_interface(interface_data)
+                self._seeded = True
+            
+            if node_id not in self.free:
+                for interface_data in await _get_node_interface_details(self.lab_id, node_id, operational=True):
+                    self.add_interface(interface_data)
+                self.free.setdefault(node_id, [])
+                self.used.setdefault(node_id, set())
+            
+            if slot is None:
+                if not self.free[node_id]:
+                    return None
+                slot, interface_id = heapq.heappop(self.free[node_id])
+                self.used[node_id].add(interface_id)
+                return interface_id
+            
+            interface_id = self._free_interface_at(node_id, slot)
+            if interface_id is None:
+                if any(self.interface_slots.get(used_id) == slot for used_id in self.used[node_id]):
+                    return None
+                
+                # CML creates the missing interfaces up to the slot and returns them
+                response = await cml_auth.request(
+                    "POST",
+                    f"/api/v0/labs/{self.lab_id}/interfaces",
+                    json={"node": node_id, "slot": slot}
+                )
+                created = response.json()
+                for interface_data in (created if isinstance(created, list) else [created]):
+                    if isinstance(interface_data, dict):
+                        self.add_interface(dict(interface_data, node=interface_data.get("node", node_id)))
+                
+                interface_id = self._free_interface_at(node_id, slot)
+                if interface_id is None:
+                    return None
+            
+            self.mark_used(interface_id)
+            return interface_id
+    
+    def _free_interface_at(self, node_id: str, slot: int) -> Optional[str]:
+        """
+        Find the free interface in a given slot
+        
+        Args:
+            node_id: ID of the node
+            slot: Slot number
+        
+        Returns:
+            Interface ID, or None if the slot has no free interface
+        """
+        for free_slot, interface_id in self.free[node_id]:
+            if free_slot == slot:
+                return interface_id
+        return None
+    
+    def mark_used(self, interface_id: str) -> None:
+        """
+        Record that an interface is now connected
+        
+        Args:
+            interface_id: ID of the interface
+        """
+        node_id = self.interface_nodes.get(interface_id)
+        if node_id is None or interface_id in self.used[node_id]:
+            return
+        self.free[node_id] = [entry for entry in self.free[node_id] if entry[1] != interface_id]
+        heapq.heapify(self.free[node_id])
+        self.used[node_id].add(interface_id)
+    
+    def release(self, interface_id: str) -> None:
+        """
+        Return an interface to the free pool
+        
+        Args:
+            interface_id: ID of the interface
+        """
+        node_id = self.interface_nodes.get(interface_id)
+        if node_id is None or interface_id not in self.used[node_id]:
+            return
+        self.used[node_id].discard(interface_id)
+        heapq.heappush(self.free[node_id], (self.interface_slots[interface_id], interface_id))
+    
+    def record_link(self, link_id: str, interface_id_a: str, interface_id_b: str) -> None:
+        """
+        Record a newly created link and mark both interfaces used
+        
+        Args:
+            link_id: ID of the link
+            interface_id_a: ID of the first interface
+            interface_id_b: ID of the second interface
+        """
+        self.mark_used(interface_id_a)
+        self.mark_used(interface_id_b)
+        self.links[link_id] = (interface_id_a, interface_id_b)
+    
+    def forget_link(self, link_id: str) -> bool:
+        """
+        Release the interfaces of a deleted link
+        
+        Args:
+            link_id: ID of the link
+        
+        Returns:
+            True if the link was known to the index
+        """
+        interfaces = self.links.pop(link_id, None)
+        if interfaces is None:
+            return False
+        for interface_id in interfaces:
+            self.release(interface_id)
+        return True
+
+
+def _get_interface_index(lab_id: str) -> LabInterfaceIndex:
+    """
+    Get the interface index for a lab, creating it if needed
+    
+    Args:
+        lab_id: ID of the lab
+    
+    Returns:
+        Interface index for the lab
+    """
+    if lab_id not in _interface_indexes:
+        _interface_indexes[lab_id] = LabInterfaceIndex(lab_id)
+    return _interface_indexes[lab_id]
+
+
+@_traced
+async def find_available_interface(lab_id: str, node_id: str) -> Union[str, Dict[str, str]]:
+    """
+    Find an available physical interface on a node and reserve it
+    
+    Reservations come from the lab's interface index, so repeated calls cost
+    no requests once the index is seeded. Call release on the lab's index if
+    the interface ends up unused.
+    
+    Args:
+        lab_id: ID of the lab
+        node_id: ID of the node
+        
+    Returns:
+        Interface ID or error dictionary
+    """
+    auth_check = _check_auth()
+    if auth_check:
+        return auth_check
+    
+    try:
+        interface_id = await _get_interface_index(lab_id).allocate(node_id)
+        if interface_id is None:
+            return {"error": f"No available physical interface found for node {node_id}"}
+        return interface_id
+    except Exception as e:
+        return _handle_api_error("find_available_interface", e)
+
+
+@mcp.tool()
+@_instrumented
+async def create_link_v3(lab_id: str, interface_id_a: str, interface_id_b: str) -> Dict[str, Any]:
+    """
+    Create a link between two interfaces in a lab
+    
+    Args:
+        lab_id: ID of the lab
+        interface_id_a: ID of the first interface
+        interface_id_b: ID of the second interface
+    
+    Returns:
+        Dictionary with link ID and confirmation message
+    """
+    auth_check = _check_auth()
+    if auth_check:
+        return auth_check
+    
+    try:
+        logger.debug("Creating link between interfaces %s and %s", interface_id_a, interface_id_b)
+        
+        # Try the standard format with src_int and dst_int
+        link_data = {
+            "src_int": interface_id_a,
+            "dst_int": interface_id_b
+        }
+        
+        headers = {"Content-Type": "application/json"}
+        response = await cml_auth.request(
+            "POST", 
+            f"/api/v0/labs/{lab_id}/links",
+            json=link_data,
+            headers=headers
+        )
+        
+        result = response.json()
+        logger.debug("Link creation response: %s", result)
+        
+        # Extract the link ID from the response
+        link_id = result.get("id")
+        if not link_id:
+            return {"error": "Failed to create link, no link ID returned", "response": result}
+        
+        if lab_id in _interface_indexes:
+            _interface_indexes[lab_id].record_link(link_id, interface_id_a, interface_id_b)
+        _lab_graphs.pop(lab_id, None)
+        
+        return {
+            "link_id": link_id,
+            "message": f"Created link between interfaces {interface_id_a} and {interface_id_b}",
+            "status": "success",
+            "details": result
+        }
+    except Exception as e:
+        # If the first format failed, try an alternative format
+        try:
+            logger.info("First link format failed, trying alternative format")
+            link_data_alt = {
+                "i1": interface_id_a,
+                "i2": interface_id_b
+            }
+            
+            response_alt = await cml_auth.request(
+                "POST", 
+                f"/api/v0/labs/{lab_id}/links",
+                json=link_data_alt,
+                headers=headers
+            )
+            
+            result_alt = response_alt.json()
+            logger.debug("Link creation response (alt format): %s", result_alt)
+            
+            link_id_alt = result_alt.get("id")
+            if link_id_alt:
+                if lab_id in _interface_indexes:
+                    _interface_indexes[lab_id].record_link(link_id_alt, interface_id_a, interface_id_b)
+                _lab_graphs.pop(lab_id, None)
+                return {
+                    "link_id": link_id_alt,
+                    "message": f"Created link between interfaces {interface_id_a} and {interface_id_b} using alternative format",
+                    "status": "success",
+                    "details": result_alt
+                }
+            
+            return {"error": "Failed to create link with both formats"}
+        except Exception as alt_err:
+            logger.warning("Alternative link format also failed: %s", alt_err)
+            return _handle_api_error("create_link", e)
+    
+
+@mcp.tool()
+@_instrumented
+async def link_nodes(lab_id: str, node_id_a: str, node_id_b: str) -> Dict[str, Any]:
+    """
+    Create a link between two nodes by automatically selecting appropriate interfaces
+    
+    Args:
+        lab_id: ID of the lab
+        node_id_a: ID of the first node
+        node_id_b: ID of the second node
+    
+    Returns:
+        Dictionary with link ID and confirmation message
+    """
+    auth_check = _check_auth()
+    if auth_check:
+        return auth_check
+    
+    try:
+        return await _link_nodes(lab_id, node_id_a, node_id_b)
+    except Exception as e:
+        return _handle_api_error("link_nodes", e)
+
+
+@_traced
+async def _link_nodes(
+    lab_id: str,
+    node_id_a: str,
+    node_id_b: str,
+    slot_a: Optional[int] = None,
+    slot_b: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Link two nodes through interfaces reserved from the lab's interface index
+    
+    Args:
+        lab_id: ID of the lab
+        node_id_a: ID of the first node
+        node_id_b: ID of the second node
+        slot_a: Interface slot to use on the first node (default: lowest free)
+        slot_b: Interface slot to use on the second node (default: lowest free)
+    
+    Returns:
+        Dictionary with link ID and confirmation message
+    """
+    index = _get_interface_index(lab_id)
+    
+    # Reserve available interfaces on both nodes
+    interface_a = await index.allocate(node_id_a, slot_a)
+    if interface_a is None:
+        return {"error": f"No available physical interface found for node {node_id_a}"}
+    
+    interface_b = await index.allocate(node_id_b, slot_b)
+    if interface_b is None:
+        index.release(interface_a)
+        return {"error": f"No available physical interface found for node {node_id_b}"}
+    
+    # Create the link using these interfaces
+    result = await create_link_v3(lab_id, interface_a, interface_b)
+    if "error" in result:
+        # The index may be out of date (e.g. links made outside this tool); rebuild it next time
+        _interface_indexes.pop(lab_id, None)
+    return result
+
+
+@mcp.tool()
+@_instrumented
+async def get_lab_links(lab_id: str) -> Union[Dict[str, Any], str]:
+    """
+    Get all links in a specific lab
+    
+    Args:
+        lab_id: ID of the lab
+    
+    Returns:
+        Dictionary of links in the lab or error message
+    """
+    auth_check = _check_auth()
+    if auth_check:
+        return auth_check["error"]
+    
+    try:
+        return await _get_lab_links(lab_id)
+    except Exception as e:
+        return f"Error getting lab links: {str(e)}"
+
+
+@mcp.tool()
+@_instrumented
+async def delete_link(lab_id: str, link_id: str) -> str:
+    """
+    Delete a link from a lab
+    
+    Args:
+        lab_id: ID of the lab
+        link_id: ID of the link to delete
+    
+    Returns:
+        Confirmation message
+    """
+    auth_check = _check_auth()
+    if auth_check:
+        return auth_check["error"]
+    
+    try:
+        response = await cml_auth.request("DELETE", f"/api/v0/labs/{lab_id}/links/{link_id}")
+        
+        # Free the link's interfaces, or rebuild the index if it didn't know the link
+        index = _interface_indexes.get(lab_id)
+        if index and not index.forget_link(link_id):
+            _interface_indexes.pop(lab_id, None)
+        _lab_graphs.pop(lab_id, None)
+        
+        return f"Link {link_id} deleted successfully"
+    except Exception as e:
+        return f"Error deleting link: {str(e)}"
+
+
+# Configuration Management Tools
+
+@mcp.tool()
+@_instrumented
+async def configure_node(lab_id: str, node_id: str, config: str) -> str:
+    """
+    Configure a node with the specified configuration
+    
+    Args:
+        lab_id: ID of the lab
+        node_id: ID of the node to configure
+        config: Configuration text to apply
+    
+    Returns:
+        Confirmation message
+    """
+    auth_check = _check_auth()
+    if auth_check:
+        return auth_check["error"]
+    
+    try:
+        response = await cml_auth.request(
+            "PUT",
+            f"/api/v0/labs/{lab_id}/nodes/{node_id}/config",
+            content=config
+        )
+        _remember_config(lab_id, node_id, config)
+        
+        return f"Configuration applied to node {node_id}"
+    except Exception as e:
+        return f"Error configuring node: {str(e)}"
+
+
+@mcp.tool()
+@_instrumented
+async def get_node_config(lab_id: str, node_id: str) -> str:
+    """
+    Get the current configuration of a node
+    
+    Args:
+        lab_id: ID of the lab
+        node_id: ID of the node
+    
+    Returns:
+        Node configuration text or error message
+    """
+    auth_check = _check_auth()
+    if auth_check:
+        return auth_check["error"]
+    
+    try:
+        response = await cml_auth.request("GET", f"/api/v0/labs/{lab_id}/nodes/{node_id}/config")
+        config = response.text
+        _remember_config(lab_id, node_id, config)
+        return config
+    except Exception as e:
+        return f"Error getting node configuration: {str(e)}"
+
+
+@mcp.tool()
+@_instrumented
+async def configure_nodes(lab_id: str, configs: Dict[str, str], force: bool = False, refresh: bool = False) -> Dict[str, Any]:
+    """
+    Configure several nodes at once, skipping nodes whose configuration is already current
+    
+    Configurations are compared by hash against the last known copy of the
+    server's, which is fetched for the whole lab in one request and then kept
+    up to date as configurations are pushed. That copy is dropped when the
+    lab is started, stopped or wiped and re-read after five minutes, so
+    "unchanged" means the configuration matches what these tools last saw;
+    pass refresh=True after editing configurations by other means.
+    
+    Args:
+        lab_id: ID of the lab
+        configs: Dictionary mapping node IDs to configuration text
+        force: Upload every configuration even if it is unchanged (default: False)
+        refresh: Re-read the server's configurations before comparing (default: False)
+    
+    Returns:
+        Dictionary with configured, unchanged and failed node IDs and request timing
+    """
+    auth_check = _check_auth()
+    if auth_check:
+        return auth_check
+    
+    try:
+        start_time = time.perf_counter()
+        # Counted as sent, so per-node fetches on controllers that ignore data=true and retries are included
+        call_stats = _current_tool_call.get()
+        
+        if not force and (refresh or _config_hashes_stale(lab_id)):
+            await _load_config_hashes(lab_id)
+        
+        known = _config_hashes.get(lab_id, {})
+        pending = {
+            node_id: config for node_id, config in configs.items()
+            if force or known.get(node_id) != _config_hash(config)
+        }
+        unchanged = [node_id for node_id in configs if node_id not in pending]
+        
+        configured = []
+        failed = {}
+        if pending:
+            responses = await cml_auth.request_many(
+                [("PUT", f"/api/v0/labs/{lab_id}/nodes/{node_id}/config", {"content": config}) for node_id, config in pending.items()]
+            )
+            for (node_id, config), response in zip(pending.items(), responses):
+                if isinstance(response, Exception):
+                    failed[node_id] = str(response)
+                else:
+                    _remember_config(lab_id, node_id, config)
+                    configured.append(node_id)
+        
+        return {
+            "lab_id": lab_id,
+            "configured": configured,
+            "unchanged": unchanged,
+            "failed": failed,
+            "requests": call_stats.requests if call_stats is not None else None,
+            "elapsed_seconds": round(time.perf_counter() - start_time, 4),
+            "status": "success" if not failed else "partial"
+        }
+    except Exception as e:
+        return _handle_api_error("configure_nodes", e)
+
+
+# Lab Control Tools
+
+@mcp.tool()
+@_instrumented
+async def start_lab(lab_id: str, wait: bool = False, timeout: float = 120.0) -> str:
+    """
+    Start the specified lab
+    
+    Args:
+        lab_id: ID of the lab to start
+        wait: Return only once the lab reports STARTED (default: False)
+        timeout: Maximum time to wait in seconds (default: 120)
+    
+    Returns:
+        Confirmation message
+    """
+    auth_check = _check_auth()
+    if auth_check:
+        return auth_check["error"]
+    
+    try:
+        response = await cml_auth.request("PUT", f"/api/v0/labs/{lab_id}/start")
+        _lab_graphs.pop(lab_id, None)
+        _config_hashes.pop(lab_id, None)
+        if wait:
+            start_time = time.perf_counter()
+            await cml_auth.wait_for_state(f"/api/v0/labs/{lab_id}", ("STARTED",), timeout)
+            return f"Lab {lab_id} started successfully (reached STARTED after {time.perf_counter() - start_time:.1f}s)"
+        return f"Lab {lab_id} started successfully"
+    except Exception as e:
+        return f"Error starting lab: {str(e)}"
+
+
+@mcp.tool()
+@_instrumented
+async def wait_for_lab_nodes(
+    lab_id: str,
+    timeout: int = 60,
+    poll_interval: float = 1.0,
+    max_poll_interval: float = 5.0,
+    use_events: bool = True
+) -> str:
+    """
+    Wait for all nodes in a lab to reach the STARTED (or BOOTED) state
+    
+    Args:
+        lab_id: ID of the lab
+        timeout: Maximum time to wait in seconds (default: 60)
+        poll_interval: Initial delay between polls in seconds (default: 1)
+        max_poll_interval: Longest delay between polls while nothing changes (default: 5)
+        use_events: Follow the controller's event stream, polling only if it is unavailable (default: True)
+    
+    Returns:
+        Status message with per-node readiness timings
+    """
+    auth_check = _check_auth()
+    if auth_check:
+        return auth_check["error"]
+    
+    stream = None
+    events = None
+    try:
+        # Check if the lab is running
+        lab_details = await get_lab_details(lab_id)
+        if not isinstance(lab_details, dict) or lab_details.get("state") != "STARTED":
+            return "Lab is not in STARTED state. Start the lab first."
+        
+        logger.info("Waiting for nodes in lab %s to initialize", lab_id)
+        
+        # Subscribe before the first poll so no transition is missed in between
+        if use_events:
+            stream = await cml_auth.get_event_stream()
+            if stream:
+                events = stream.watch(lab_id)
+        
+        start_time = time.perf_counter()
+        ready_times = {}
+        interval = poll_interval
+        
+        # One lab-wide request per poll, however many nodes there are
+        node_states = await _get_lab_node_states(lab_id)
+        
+        while True:
+            elapsed = time.perf_counter() - start_time
+            newly_ready = 0
+            for node_id, node_data in node_states.items():
+                if node_id not in ready_times and node_data.get("state") in _NODE_READY_STATES:
+                    ready_times[node_id] = elapsed
+                    newly_ready += 1
+            
+            if len(ready_times) == len(node_states) or elapsed >= timeout:
+                break
+            
+            if events is not None:
+                try:
+                    event = await asyncio.wait_for(events.get(), timeout=min(_EVENT_SAFETY_POLL_INTERVAL, timeout - elapsed))
+                except asyncio.TimeoutError:
+                    # Safety net for missed events
+                    node_states = await _get_lab_node_states(lab_id)
+                    continue
+                
+                if event is not None and event["node_id"] in node_states:
+                    node_states[event["node_id"]]["state"] = event["state"]
+                    continue
+                
+                if event is None:
+                    logger.warning("Event stream closed, falling back to polling")
+                    stream.unwatch(lab_id, events)
+                    events = None
+                
+                # Stream closed or an unknown node appeared; resync with a poll
+                node_states = await _get_lab_node_states(lab_id)
+                continue
+            
+            # Poll quickly while nodes are coming up, back off while nothing changes
+            interval = poll_interval if newly_ready else min(interval * 1.5, max_poll_interval)
+            await asyncio.sleep(min(interval, timeout - elapsed))
+            node_states = await _get_lab_node_states(lab_id)
+        
+        all_ready = len(ready_times) == len(node_states)
+        if all_ready:
+            message = "All nodes in the lab are initialized and ready"
+        else:
+            message = f"Timeout reached ({timeout} seconds). Some nodes may not be fully initialized."
+        
+        return message + "\n\n" + _format_node_readiness(node_states, ready_times)
+    except Exception as e:
+        logger.error("Error waiting for nodes: %s", e, exc_info=True)
+        return f"Error waiting for nodes: {str(e)}"
+    finally:
+        if stream and events is not None:
+            stream.unwatch(lab_id, events)
+
+
+@mcp.tool()
+@_instrumented
+async def stop_lab(lab_id: str, wait: bool = False, timeout: float = 120.0) -> str:
+    """
+    Stop the specified lab
+    
+    Args:
+        lab_id: ID of the lab to stop
+        wait: Return only once the lab reports STOPPED (default: False)
+        timeout: Maximum time to wait in seconds (default: 120)
+    
+    Returns:
+        Confirmation message
+    """
+    auth_check = _check_auth()
+    if auth_check:
+        return auth_check["error"]
+    
+    try:
+        response = await cml_auth.request("PUT", f"/api/v0/labs/{lab_id}/stop")
+        _lab_graphs.pop(lab_id, None)
+        _config_hashes.pop(lab_id, None)
+        if wait:
+            start_time = time.perf_counter()
+            await cml_auth.wait_for_state(f"/api/v0/labs/{lab_id}", ("STOPPED",), timeout)
+            return f"Lab {lab_id} stopped successfully (reached STOPPED after {time.perf_counter() - start_time:.1f}s)"
+        return f"Lab {lab_id} stopped successfully"
+    except Exception as e:
+        return f"Error stopping lab: {str(e)}"
+
+
+class LabGraph:
+    """Nodes and links of a lab, as fetched at one point in time"""
+    
+    def __init__(self, lab: Dict[str, Any], nodes: Dict[str, Dict[str, Any]], links: Dict[str, Dict[str, Any]]):
+        """
+        Build the graph
         
-        # Format the result to be more readable
-        result = {}
-        for node_id, node_info in node_defs.items():
-            result[node_id] = {
-                "description": node_info.get("description", ""),
-                "type": node_info.get("type", ""),
-                "interfaces": node_info.get("interfaces", []),
-            }
+        Args:
+            lab: Lab details
+            nodes: Dictionary mapping node IDs to node details
+            links: Dictionary mapping link IDs to link details
+        """
+        self.lab = lab
+        self.nodes = nodes
+        self.links = links
+        self.fetched_at = time.monotonic()
+    
+    def is_fresh(self) -> bool:
+        """Whether the graph is recent enough to answer from"""
+        return time.monotonic() - self.fetched_at < _LAB_GRAPH_TTL
+    
+    def render(self) -> str:
+        """
+        Format the graph as a topology summary
         
-        return result
-    except Exception as e:
-        return f"Error listing node definitions: {str(e)}"
+        Returns:
+            Formatted summary of the lab topology
+        """
+        lab = self.lab
+        nodes = self.nodes
+        lines = [
+            f"Lab Topology: {lab.get('title', 'Untitled')}",
+            f"State: {lab.get('state', 'unknown')}",
+            f"Description: {lab.get('description', 'None')}",
+            "",
+            "Nodes:"
+        ]
+        
+        for node_id, node in nodes.items():
+            lines.append(
+                f"- {node.get('label', 'Unnamed')} (ID: {node_id})\n"
+                f"  Type: {node.get('node_definition', 'unknown')}\n"
+                f"  State: {node.get('state', 'unknown')}"
+            )
+        
+        lines.append("\nLinks:")
+        for link_id, link in self.links.items():
+            src_node_id = link.get('src_node')
+            dst_node_id = link.get('dst_node')
+            
+            if src_node_id in nodes and dst_node_id in nodes:
+                src_node = nodes[src_node_id].get('label', src_node_id)
+                dst_node = nodes[dst_node_id].get('label', dst_node_id)
+                lines.append(f"- Link {link_id}: {src_node} ({link.get('src_int', 'unknown')}) → "
+                             f"{dst_node} ({link.get('dst_int', 'unknown')})")
+            else:
+                lines.append(f"- Link {link_id}: {src_node_id}:{link.get('src_int')} → {dst_node_id}:{link.get('dst_int')}")
+        
+        lines.append("")
+        return "\n".join(lines)
 
 
-# Node Management Tools
+@_traced
+async def _get_lab_graph(lab_id: str, refresh: bool = False) -> LabGraph:
+    """
+    Get a lab's graph, fetching lab details, nodes and links concurrently unless a fresh copy is cached
+    
+    Args:
+        lab_id: ID of the lab
+        refresh: Fetch the lab again even if a cached graph is fresh
+    
+    Returns:
+        Graph of the lab
+    """
+    graph = _lab_graphs.get(lab_id)
+    if graph is not None and not refresh and graph.is_fresh():
+        return graph
+    
+    lab_response, nodes, links = await asyncio.gather(
+        cml_auth.request("GET", f"/api/v0/labs/{lab_id}"),
+        _get_lab_node_states(lab_id),
+        _get_lab_links(lab_id)
+    )
+    graph = LabGraph(lab_response.json(), nodes, links)
+    _lab_graphs[lab_id] = graph
+    return graph
+
 
 @mcp.tool()
-async def get_lab_nodes(lab_id: str) -> Union[Dict[str, Any], str]:
+@_instrumented
+async def get_lab_topology(lab_id: str, refresh: bool = False) -> str:
     """
-    Get all nodes in a specific lab
+    Get a detailed summary of the lab topology
+    
+    The lab is cached for a few seconds and whenever it is changed through
+    these tools; pass refresh to read it from CML again.
     
     Args:
         lab_id: ID of the lab
+        refresh: Ignore the cached copy of the lab (default: False)
     
     Returns:
-        Dictionary of nodes in the lab or error message
+        Formatted summary of the lab topology
     """
     auth_check = _check_auth()
     if auth_check:
         return auth_check["error"]
     
     try:
-        response = await cml_auth.request("GET", f"/api/v0/labs/{lab_id}/nodes")
-        nodes = response.json()
-        
-        # If the response is a list, convert it to a dictionary
-        if isinstance(nodes, list):
-            print(f"Converting nodes list to dictionary", file=sys.stderr)
-            result = {}
-            for node in nodes:
-                node_id = node.get("id")
-                if node_id:
-                    result[node_id] = node
-            return result
-        
-        return nodes
+        graph = await _get_lab_graph(lab_id, refresh)
+        return graph.render()
     except Exception as e:
-        return f"Error getting lab nodes: {str(e)}"
+        return f"Error getting lab topology: {str(e)}"
+
+
+# Topology Import Tools
+
+# Interface naming by node definition, indexed by slot
+_INTERFACE_LABEL_FORMATS = {
+    "iosv": lambda slot: f"GigabitEthernet0/{slot}",
+    "iosvl2": lambda slot: f"GigabitEthernet{slot // 4}/{slot % 4}",
+    "csr1000v": lambda slot: f"GigabitEthernet{slot + 1}",
+    "cat8000v": lambda slot: f"GigabitEthernet{slot + 1}",
+    "iosxrv9000": lambda slot: f"GigabitEthernet0/0/0/{slot}",
+    "nxosv9000": lambda slot: f"Ethernet1/{slot + 1}",
+}
+
+
+def _interface_label(node_definition: str, slot: int) -> str:
+    """
+    Get the interface name CML uses for a slot on a node definition
+    
+    Args:
+        node_definition: Node definition ID
+        slot: Interface slot number
+    
+    Returns:
+        Interface label
+    """
+    label_format = _INTERFACE_LABEL_FORMATS.get(node_definition)
+    return label_format(slot) if label_format else f"eth{slot}"
+
+
+@_traced
+def _render_topology(spec: Dict[str, Any]) -> str:
+    """
+    Render a topology spec in CML's lab import format
+    
+    The spec has a title and description, a list of nodes (label,
+    node_definition, x, y and optionally config, interfaces, ram, cpu_limit,
+    parameters) and a list of links ({"a": label, "b": label}, optionally
+    with a_slot/b_slot). Links without explicit slots take the lowest free
+    slot on each node.
+    
+    Args:
+        spec: Topology specification
+    
+    Returns:
+        Topology document ready for POST /api/v0/import
+    
+    Raises:
+        ValueError: If the spec is inconsistent
+    """
+    nodes = spec.get("nodes") or []
+    links = spec.get("links") or []
+    
+    node_keys = {}
+    for index, node in enumerate(nodes):
+        label = node.get("label")
+        if not label or not node.get("node_definition"):
+            raise ValueError(f"Node {index} needs a label and a node_definition")
+        if label in node_keys:
+            raise ValueError(f"Duplicate node label: {label}")
+        node_keys[label] = f"n{index}"
+    
+    # Assign a slot to both ends of every link
+    used_slots = {label: set() for label in node_keys}
+    link_slots = []
+    for link in links:
+        ends = []
+        for side in ("a", "b"):
+            label = link.get(side)
+            if label not in node_keys:
+                raise ValueError(f"Link endpoint '{label}' is not a node in the spec")
+            slot = link.get(f"{side}_slot")
+            if slot is None:
+                slot = 0
+                while slot in used_slots[label]:
+                    slot += 1
+            elif slot in used_slots[label]:
+                raise ValueError(f"Slot {slot} on {label} is used by more than one link")
+            used_slots[label].add(slot)
+            ends.append((label, slot))
+        link_slots.append(ends)
+    
+    # Interfaces get topology-wide IDs so links can refer to them unambiguously
+    interface_keys = {}
+    topology_nodes = []
+    for node in nodes:
+        label = node["label"]
+        slot_count = max([int(node.get("interfaces") or 0)] + [slot + 1 for slot in used_slots[label]])
+        interfaces = []
+        for slot in range(slot_count):
+            interface_key = f"i{len(interface_keys)}"
+            interface_keys[(label, slot)] = interface_key
+            interfaces.append({
+                "id": interface_key,
+                "label": _interface_label(node["node_definition"], slot),
+                "slot": slot,
+                "type": "physical"
+            })
+        
+        topology_node = {
+            "id": node_keys[label],
+            "label": label,
+            "node_definition": node["node_definition"],
+            "x": node.get("x", 0),
+            "y": node.get("y", 0),
+            "configuration": node.get("config", ""),
+            "tags": node.get("tags", []),
+            "interfaces": interfaces
+        }
+        for optional_field in ("ram", "cpu_limit", "image_definition", "parameters"):
+            if node.get(optional_field) is not None:
+                topology_node[optional_field] = node[optional_field]
+        topology_nodes.append(topology_node)
+    
+    topology_links = []
+    for index, ((label_a, slot_a), (label_b, slot_b)) in enumerate(link_slots):
+        topology_links.append({
+            "id": f"l{index}",
+            "n1": node_keys[label_a],
+            "i1": interface_keys[(label_a, slot_a)],
+            "n2": node_keys[label_b],
+            "i2": interface_keys[(label_b, slot_b)]
+        })
+    
+    topology = {
+        "lab": {
+            "title": spec.get("title", "Imported Lab"),
+            "description": spec.get("description", ""),
+            "notes": spec.get("notes", ""),
+            "version": "0.2.0"
+        },
+        "nodes": topology_nodes,
+        "links": topology_links
+    }
+    
+    # JSON is valid YAML, so PyYAML is only needed for a friendlier document
+    try:
+        import yaml
+    except ImportError:
+        return json.dumps(topology, indent=1)
+    
+    # The libyaml-backed dumper is much faster on large fabrics
+    class TopologyDumper(getattr(yaml, "CSafeDumper", yaml.SafeDumper)):
+        """Dumper that writes multi-line configurations as literal blocks"""
+    
+    def represent_str(dumper, value):
+        return dumper.represent_scalar("tag:yaml.org,2002:str", value, style="|" if "\n" in value else None)
+    
+    TopologyDumper.add_representer(str, represent_str)
+    return yaml.dump(topology, Dumper=TopologyDumper, sort_keys=False)
+
+
+@_traced
+async def _import_topology(spec: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Create a whole lab from a topology spec with a single import request
+    
+    Args:
+        spec: Topology specification (see _render_topology)
+    
+    Returns:
+        Dictionary with the new lab ID and a map of node labels to node IDs
+    """
+    topology = _render_topology(spec)
+    title = spec.get("title", "Imported Lab")
+    
+    response = await cml_auth.request(
+        "POST",
+        "/api/v0/import",
+        params={"title": title},
+        content=topology.encode("utf-8"),
+        headers={"Content-Type": "application/x-yaml"}
+    )
+    result = response.json()
+    lab_id = result.get("id")
+    if not lab_id:
+        return {"error": "Failed to import topology, no lab ID returned", "response": result}
+    
+    # One lab-wide listing maps the labels back to the IDs CML assigned
+    node_states = await _get_lab_node_states(lab_id)
+    node_ids = {node.get("label"): node_id for node_id, node in node_states.items()}
+    
+    configs = {node["label"]: node.get("config") or "" for node in spec.get("nodes") or []}
+    _config_hashes[lab_id] = {
+        node_id: _config_hash(configs.get(label) or "") for label, node_id in node_ids.items()
+    }
+    _config_hashes_loaded_at[lab_id] = time.monotonic()
+    
+    return {
+        "lab_id": lab_id,
+        "title": title,
+        "node_ids": node_ids,
+        "link_count": len(spec.get("links") or []),
+        "warnings": result.get("warnings", []),
+        "status": "success"
+    }
 
 
 @mcp.tool()
-async def add_node(
-    lab_id: str, 
-    label: str, 
-    node_definition: str, 
-    x: int = 0, 
-    y: int = 0,
-    populate_interfaces: bool = True,
-    ram: Optional[int] = None,
-    cpu_limit: Optional[int] = None,
-    parameters: Optional[Dict[str, str]] = None
-) -> Dict[str, Any]:
+@_instrumented
+async def import_topology(spec: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Add a node to the specified lab
+    Build a complete lab from a declarative topology spec in one upload
+    
+    Example spec:
+        {
+            "title": "Two routers",
+            "nodes": [
+                {"label": "R1", "node_definition": "iosv", "x": 0, "y": 0, "config": "hostname R1"},
+                {"label": "R2", "node_definition": "iosv", "x": 200, "y": 0, "config": "hostname R2"}
+            ],
+            "links": [{"a": "R1", "b": "R2"}]
+        }
     
     Args:
-        lab_id: ID of the lab
-        label: Label for the new node
-        node_definition: Type of node (e.g., 'iosv', 'csr1000v')
-        x: X coordinate for node placement
-        y: Y coordinate for node placement
-        populate_interfaces: Whether to automatically create interfaces
-        ram: RAM allocation for the node (optional)
-        cpu_limit: CPU limit for the node (optional)
-        parameters: Node-specific parameters (optional)
+        spec: Topology with title, description, nodes (label, node_definition, x, y,
+            optional config, interfaces, ram, cpu_limit, parameters) and links
+            ({"a": label, "b": label}, optional a_slot/b_slot)
     
     Returns:
-        Dictionary with node ID and confirmation message
+        Dictionary with lab ID and a map of node labels to node IDs
     """
     auth_check = _check_auth()
     if auth_check:
         return auth_check
     
     try:
-        # Construct the node data payload
-        node_data = {
-            "label": label,
-            "node_definition": node_definition,
-            "x": x,
-            "y": y,
-            "parameters": parameters or {},
-            "tags": [],
-            "hide_links": False
-        }
-        
-        # Add optional parameters if provided
-        if ram is not None:
-            node_data["ram"] = ram
-        
-        if cpu_limit is not None:
-            node_data["cpu_limit"] = cpu_limit
-        
-        # Add populate_interfaces as a query parameter if needed
-        endpoint = f"/api/v0/labs/{lab_id}/nodes"
-        if populate_interfaces:
-            endpoint += "?populate_interfaces=true"
-        
-        # Make the API request with explicit Content-Type header
-        headers = {"Content-Type": "application/json"}
-        response = await cml_auth.request(
-            "POST",
-            endpoint,
-            json=node_data,
-            headers=headers
-        )
-        
-        # Process the response
-        result = response.json()
-        node_id = result.get("id")
-        
-        if not node_id:
-            return {"error": "Failed to create node, no node ID returned", "response": result}
-        
-        return {
-            "node_id": node_id,
-            "message": f"Added node '{label}' with ID: {node_id}",
-            "status": "success",
-            "details": result
-        }
+        return await _push_topology(spec, "import")
+    except ValueError as e:
+        return {"error": f"Invalid topology spec: {str(e)}"}
     except Exception as e:
-        return _handle_api_error("add_node", e)
+        return _handle_api_error("import_topology", e)
 
 
 @mcp.tool()
-async def create_router(
-    lab_id: str,
-    label: str,
-    x: int = 0,
-    y: int = 0
-) -> Dict[str, Any]:
+@_instrumented
+async def validate_topology(spec: Dict[str, Any], ram_budget_mb: Optional[int] = None) -> Dict[str, Any]:
     """
-    Create a router with the 'iosv' node definition
+    Check a topology spec against the node and image definitions without creating anything
+    
+    Checks node definitions and images exist, ram/cpu_limit/cpus are in
+    range, interface counts (including slot1 and what the links need) fit
+    the node definition, and link endpoints and slots are consistent.
     
     Args:
-        lab_id: ID of the lab
-        label: Label for the new router
-        x: X coordinate for node placement
-        y: Y coordinate for node placement
+        spec: Topology spec in the import_topology format
+        ram_budget_mb: Maximum total RAM for the topology in MB (optional)
     
     Returns:
-        Dictionary with node ID and confirmation message
+        Dictionary with "valid", "errors", total "ram_mb" and check timing
     """
     auth_check = _check_auth()
     if auth_check:
         return auth_check
     
-    # Use add_node with the router node definition
-    return await add_node(lab_id, label, "iosv", x, y, True)
+    try:
+        catalogs = await _get_validation_catalogs()
+        if not catalogs:
+            return {"error": "Node definitions are unavailable, cannot validate"}
+        
+        start_time = time.perf_counter()
+        report = _validate_topology_spec(spec, *catalogs, ram_budget_mb=ram_budget_mb)
+        report["nodes"] = len(spec.get("nodes") or [])
+        report["check_seconds"] = round(time.perf_counter() - start_time, 6)
+        if catalogs[1] is None:
+            report["warnings"] = ["Image definitions unavailable, images were not checked"]
+        return report
+    except Exception as e:
+        return _handle_api_error("validate_topology", e)
 
 
-@mcp.tool()
-async def create_switch(
-    lab_id: str,
-    label: str,
-    num_interfaces: int = 8,
-    x: int = 0,
-    y: int = 0
+# Build Orchestration
+
+@_traced
+async def _run_dag(
+    steps: Dict[str, Tuple[List[str], Callable[[Dict[str, Any]], Awaitable[Any]]]],
+    max_concurrency: int = 8
 ) -> Dict[str, Any]:
     """
-    Create a switch with a specified number of interfaces
+    Run build steps as a dependency graph, starting each step as soon as its dependencies finish
+    
+    A step that raises or returns a dictionary with an "error" key fails, and
+    everything depending on it is skipped.
+    
+    Args:
+        steps: Step names mapped to (dependency names, action); each action is
+            called with the results of the steps completed so far
+        max_concurrency: Maximum number of steps running at once
+    
+    Returns:
+        Dictionary with per-step results, failed and skipped steps, and timing
+        (per-step start and duration, wall time, serial time and critical path)
+    
+    Raises:
+        ValueError: If a dependency is unknown or the steps contain a cycle
+    """
+    order = _topological_order({name: dependencies for name, (dependencies, action) in steps.items()})
+    
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    results = {}
+    failed = {}
+    skipped = []
+    step_timings = {}
+    tasks = {}
+    build_start = time.perf_counter()
+    
+    async def run_step(name):
+        dependencies, action = steps[name]
+        if not all(await asyncio.gather(*[tasks[dependency] for dependency in dependencies])):
+            skipped.append(name)
+            return False
+        
+        async with semaphore:
+            step_start = time.perf_counter()
+            with _span(f"step {name}") as span:
+                try:
+                    result = await action(results)
+                except Exception as e:
+                    result = {"error": f"{type(e).__name__}: {str(e)}"}
+                if span is not None and isinstance(result, dict) and "error" in result:
+                    span.status = "error"
+            step_end = time.perf_counter()
+        
+        results[name] = result
+        step_timings[name] = {
+            "start": round(step_start - build_start, 4),
+            "duration": round(step_end - step_start, 4)
+        }
+        if isinstance(result, dict) and "error" in result:
+            failed[name] = result["error"]
+            return False
+        return True
+    
+    # Every task exists before any of them runs, so dependencies can be awaited by name
+    for name in order:
+        tasks[name] = asyncio.ensure_future(run_step(name))
+    await asyncio.gather(*tasks.values())
+    wall_time = time.perf_counter() - build_start
+    
+    # Longest chain of dependent steps, which bounds the wall time of a build
+    finish_times = {}
+    predecessors = {}
+    for name in order:
+        if name not in step_timings:
+            continue
+        dependencies = [dependency for dependency in steps[name][0] if dependency in finish_times]
+        slowest = max(dependencies, key=lambda dependency: finish_times[dependency], default=None)
+        finish_times[name] = step_timings[name]["duration"] + (finish_times[slowest] if slowest else 0.0)
+        predecessors[name] = slowest
+    
+    critical_path = []
+    step = max(finish_times, key=finish_times.get, default=None)
+    while step:
+        critical_path.append(step)
+        step = predecessors[step]
+    critical_path.reverse()
+    
+    return {
+        "results": results,
+        "failed": failed,
+        "skipped": skipped,
+        "timing": {
+            "wall_time": round(wall_time, 4),
+            "serial_time": round(sum(timing["duration"] for timing in step_timings.values()), 4),
+            "critical_path_time": round(max(finish_times.values(), default=0.0), 4),
+            "critical_path": critical_path,
+            "steps": step_timings
+        }
+    }
+
+
+def _topological_order(dependencies: Dict[str, List[str]]) -> List[str]:
+    """
+    Order steps so every step comes after its dependencies
+    
+    Args:
+        dependencies: Step names mapped to the names they depend on
+    
+    Returns:
+        Step names in dependency order
+    
+    Raises:
+        ValueError: If a dependency is unknown or the steps contain a cycle
+    """
+    remaining = {}
+    dependents = {name: [] for name in dependencies}
+    for name, needs in dependencies.items():
+        for dependency in needs:
+            if dependency not in dependencies:
+                raise ValueError(f"Step '{name}' depends on unknown step '{dependency}'")
+            dependents[dependency].append(name)
+        remaining[name] = len(needs)
+    
+    ready = [name for name, count in remaining.items() if count == 0]
+    order = []
+    while ready:
+        name = ready.pop()
+        order.append(name)
+        for dependent in dependents[name]:
+            remaining[dependent] -= 1
+            if remaining[dependent] == 0:
+                ready.append(dependent)
+    
+    if len(order) != len(dependencies):
+        raise ValueError("Build steps contain a dependency cycle")
+    return order
+
+
+@_traced
+async def _push_topology_via_api(spec: Dict[str, Any], max_concurrency: int = 8) -> Dict[str, Any]:
+    """
+    Build a lab from a topology spec with individual API calls, run as a dependency graph
+    
+    Nodes are created concurrently, each link starts once both of its nodes
+    exist and each configuration upload once its node exists.
     
     Args:
-        lab_id: ID of the lab
-        label: Label for the new switch
-        num_interfaces: Number of interfaces to create (default: 8)
-        x: X coordinate for node placement
-        y: Y coordinate for node placement
+        spec: Topology specification (see _render_topology)
+        max_concurrency: Maximum number of build steps running at once
     
     Returns:
-        Dictionary with node ID and confirmation message
+        Dictionary with lab ID, node and link IDs, failures and build timing
     """
-    auth_check = _check_auth()
-    if auth_check:
-        return auth_check
+    nodes = spec.get("nodes") or []
+    links = spec.get("links") or []
     
-    try:
-        # Use add_node with the switch node definition and parameters for interfaces
-        return await add_node(
-            lab_id,
-            label,
-            "iosvl2",
-            x,
-            y,
-            True,
-            ram=None,
-            cpu_limit=None,
-            parameters={"slot1": str(num_interfaces)}  # Configure the number of interfaces
+    steps = {"lab": ([], lambda results: create_lab(spec.get("title", "Untitled Lab"), spec.get("description", "")))}
+    
+    def add_node_step(node):
+        steps[f"node:{node['label']}"] = (
+            ["lab"],
+            lambda results: add_node(
+                results["lab"]["lab_id"],
+                node["label"],
+                node["node_definition"],
+                node.get("x", 0),
+                node.get("y", 0),
+                True,
+                ram=node.get("ram"),
+                cpu_limit=node.get("cpu_limit"),
+                parameters=node.get("parameters")
+            )
         )
-    except Exception as e:
-        return _handle_api_error("create_switch", e)
-
+    
+    def add_config_step(node):
+        async def configure(results):
+            message = await configure_node(
+                results["lab"]["lab_id"],
+                results[f"node:{node['label']}"]["node_id"],
+                node["config"]
+            )
+            return {"error": message} if message.startswith("Error") else {"message": message}
+        steps[f"config:{node['label']}"] = (["lab", f"node:{node['label']}"], configure)
+    
+    def add_link_step(index, link):
+        steps[f"link:{index}"] = (
+            ["lab", f"node:{link['a']}", f"node:{link['b']}"],
+            lambda results: _link_nodes(
+                results["lab"]["lab_id"],
+                results[f"node:{link['a']}"]["node_id"],
+                results[f"node:{link['b']}"]["node_id"],
+                link.get("a_slot"),
+                link.get("b_slot")
+            )
+        )
+    
+    for node in nodes:
+        add_node_step(node)
+        if node.get("config"):
+            add_config_step(node)
+    for index, link in enumerate(links):
+        add_link_step(index, link)
+    
+    build = await _run_dag(steps, max_concurrency)
+    results = build["results"]
+    if "lab" in build["failed"]:
+        return results["lab"]
+    
+    return {
+        "lab_id": results["lab"]["lab_id"],
+        "title": spec.get("title", "Untitled Lab"),
+        "node_ids": {
+            node["label"]: results.get(f"node:{node['label']}", {}).get("node_id") for node in nodes
+        },
+        "link_ids": [results.get(f"link:{index}", {}).get("link_id") for index in range(len(links))],
+        "failed": build["failed"],
+        "skipped": build["skipped"],
+        "timing": build["timing"],
+        "status": "success" if not build["failed"] else "partial"
+    }
 
-# Interface Management Tools
 
-@mcp.tool()
-async def get_node_interfaces(lab_id: str, node_id: str) -> Union[Dict[str, Any], str, List[str]]:
+@_traced
+async def _push_topology(spec: Dict[str, Any], push: str = "import", max_concurrency: int = 8) -> Dict[str, Any]:
     """
-    Get interfaces for a specific node
+    Push a topology spec to CML
     
     Args:
-        lab_id: ID of the lab
-        node_id: ID of the node
+        spec: Topology specification (see _render_topology)
+        push: "import" for a single lab import request, "api" for concurrent per-object API calls
+        max_concurrency: Maximum number of build steps running at once for the "api" path
     
     Returns:
-        Dictionary of node interfaces or error message or list of interface IDs
+        Dictionary with lab ID and node IDs, or an error
     """
-    auth_check = _check_auth()
-    if auth_check:
-        return auth_check["error"]
+    # Catch bad node specs before the first write leaves a partial lab behind
+    catalogs = await _get_validation_catalogs()
+    if catalogs:
+        report = _validate_topology_spec(spec, *catalogs)
+        if report["errors"]:
+            return {"error": "Topology failed pre-flight validation", "errors": report["errors"]}
     
-    try:
-        response = await cml_auth.request("GET", f"/api/v0/labs/{lab_id}/nodes/{node_id}/interfaces")
-        interfaces = response.json()
-        
-        # Check if the response is a list of interface IDs
-        if isinstance(interfaces, list):
-            print(f"Got list of interface IDs: {interfaces}", file=sys.stderr)
-            return interfaces
-        elif isinstance(interfaces, str):
-            # If it's a string, it might be a concatenated list of UUIDs
-            print(f"Got string of interface IDs: {interfaces}", file=sys.stderr)
-            # Parse as UUIDs (36 characters per UUID)
-            if len(interfaces) % 36 == 0:
-                return [interfaces[i:i+36] for i in range(0, len(interfaces), 36)]
-            else:
-                return interfaces
-        else:
-            # If it's a dictionary, return it as is
-            return interfaces
-    except Exception as e:
-        print(f"Error getting node interfaces: {str(e)}", file=sys.stderr)
-        traceback.print_exc(file=sys.stderr)
-        return f"Error getting node interfaces: {str(e)}"
+    if push == "import":
+        return await _import_topology(spec)
+    if push == "api":
+        return await _push_topology_via_api(spec, max_concurrency)
+    return {"error": f"Unknown push method '{push}', expected 'import' or 'api'"}
 
 
-@mcp.tool()
-async def get_physical_interfaces(lab_id: str, node_id: str) -> Union[Dict[str, Any], List[Dict[str, Any]], str]:
+# Configuration Template Engine
+
+class ConfigTemplate:
     """
-    Get all physical interfaces for a specific node
+    A configuration template compiled once to Python code and rendered many times
     
-    Args:
-        lab_id: ID of the lab
-        node_id: ID of the node
+    Supported syntax:
+        {{ name }} or {{ name.key }}              insert a value
+        {% for item in items %} ... {% endfor %}  repeat a block
+        {% if cond %} ... {% elif cond %} ... {% else %} ... {% endif %}
     
-    Returns:
-        List of physical interfaces or error message
+    Conditions are a value (truthiness), "not value", or a value compared
+    with == or != to a quoted string or an integer. A block tag on a line
+    of its own removes the whole line, so templates read like the config
+    they produce.
     """
-    auth_check = _check_auth()
-    if auth_check:
-        return auth_check["error"]
     
-    try:
-        # First get all interfaces
-        interfaces_response = await get_node_interfaces(lab_id, node_id)
-        
-        # Handle different return types
-        interface_ids = []
-        if isinstance(interfaces_response, str) and "Error" in interfaces_response:
-            return interfaces_response
-        elif isinstance(interfaces_response, list):
-            interface_ids = interfaces_response
-        elif isinstance(interfaces_response, str):
-            # Parse as UUIDs if needed
-            if len(interfaces_response) % 36 == 0:
-                interface_ids = [interfaces_response[i:i+36] for i in range(0, len(interfaces_response), 36)]
+    _TOKEN = re.compile(
+        r"^[ \t]*\{%((?:(?!%\}).)*)%\}[ \t]*(?:\n|\Z)|\{\{((?:(?!\}\}).)*)\}\}|\{%((?:(?!%\}).)*)%\}",
+        re.MULTILINE
+    )
+    _PATH = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z0-9_]+)*$")
+    _CONDITION = re.compile(r"^(not\s+)?(\S+?)(?:\s*(==|!=)\s*(\"[^\"]*\"|'[^']*'|-?\d+))?$")
+    
+    def __init__(self, source: str):
+        """
+        Compile a template
+        
+        Args:
+            source: Template text
+        
+        Raises:
+            ValueError: If the template has a syntax error
+        """
+        self.source = source
+        self._render = self._compile(source)
+    
+    def render(self, variables: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Render the template with one set of variables
+        
+        Args:
+            variables: Values for the template's variables
+        
+        Returns:
+            Rendered text
+        
+        Raises:
+            ValueError: If a variable the template uses is missing
+        """
+        return self.render_many([variables or {}])[0]
+    
+    def render_many(self, variable_sets: List[Dict[str, Any]]) -> List[str]:
+        """
+        Render the template once for each set of variables
+        
+        Args:
+            variable_sets: One dictionary of variables per rendering
+        
+        Returns:
+            Rendered texts in the same order
+        
+        Raises:
+            ValueError: If a variable the template uses is missing
+        """
+        render = self._render
+        try:
+            return [render(variables) for variables in variable_sets]
+        except KeyError as e:
+            raise ValueError(f"Undefined template variable {e}") from None
+        except TypeError as e:
+            raise ValueError(f"Invalid template variable: {str(e)}") from None
+    
+    def _compile(self, source: str) -> Callable[[Dict[str, Any]], str]:
+        """
+        Translate the template into a Python function
+        
+        Runs of text and values between tags become a single %-format, so
+        rendering does one string operation per run.
+        
+        Args:
+            source: Template text
+        
+        Returns:
+            Function taking the variables and returning the rendered text
+        
+        Raises:
+            ValueError: If the template has a syntax error
+        """
+        lines = ["def render(_vars):", " _out = []", " _emit = _out.append"]
+        scopes = [{}]
+        blocks = []
+        run_format = []
+        run_values = []
+        position = 0
+        
+        def line_number(offset):
+            return source.count("\n", 0, offset) + 1
+        
+        def expression(path, offset):
+            if not self._PATH.match(path):
+                raise ValueError(f"Invalid template expression '{path}' on line {line_number(offset)}")
+            name, *keys = path.split(".")
+            for scope in reversed(scopes):
+                if name in scope:
+                    code = scope[name]
+                    break
             else:
-                return f"Unexpected interface response format: {interfaces_response}"
-        elif isinstance(interfaces_response, dict):
-            interface_ids = list(interfaces_response.keys())
-        else:
-            return f"Unexpected interface response type: {type(interfaces_response)}"
+                code = f"_vars[{name!r}]"
+            return code + "".join(f"[{key!r}]" for key in keys)
+        
+        def condition(text, offset):
+            match = self._CONDITION.match(text)
+            if not match:
+                raise ValueError(f"Invalid template condition '{text}' on line {line_number(offset)}")
+            negate, path, operator, literal = match.groups()
+            code = expression(path, offset)
+            if operator:
+                # Literals are taken verbatim, never spliced into the code, so quotes and backslashes are safe
+                value = literal[1:-1] if literal[0] in "'\"" else int(literal)
+                code = f"{code} {operator} {value!r}"
+            return f"not ({code})" if negate else code
+        
+        def emit(statement):
+            lines.append(" " * (len(blocks) + 1) + statement)
+        
+        def flush():
+            if run_values:
+                emit(f"_emit({''.join(run_format)!r} % ({', '.join(run_values)},))")
+            elif run_format:
+                emit(f"_emit({''.join(run_format).replace('%%', '%')!r})")
+            run_format.clear()
+            run_values.clear()
         
-        # Get details for each interface and filter for physical interfaces
-        physical_interfaces = []
-        for interface_id in interface_ids:
-            interface_details = await cml_auth.request("GET", f"/api/v0/labs/{lab_id}/interfaces/{interface_id}")
-            interface_data = interface_details.json()
+        for match in self._TOKEN.finditer(source):
+            run_format.append(source[position:match.start()].replace("%", "%%"))
+            position = match.end()
             
-            # Check if it's a physical interface
-            is_physical = interface_data.get("type") == "physical"
+            if match.group(2) is not None:
+                run_format.append("%s")
+                run_values.append(expression(match.group(2).strip(), match.start()))
+                continue
             
-            # If type is not present, check other attributes that might indicate a physical interface
-            if "type" not in interface_data:
-                # Most physical interfaces have a slot number
-                if "slot" in interface_data:
-                    is_physical = True
+            flush()
+            tag = (match.group(1) if match.group(1) is not None else match.group(3)).strip()
+            keyword, _, argument = tag.partition(" ")
+            argument = argument.strip()
             
-            if is_physical:
-                physical_interfaces.append(interface_data)
+            if keyword == "for":
+                target, _, iterable = argument.partition(" in ")
+                target = target.strip()
+                if not target.isidentifier() or not iterable.strip():
+                    raise ValueError(f"Invalid for loop '{tag}' on line {line_number(match.start())}")
+                variable = f"_loop{len(blocks)}"
+                emit(f"for {variable} in {expression(iterable.strip(), match.start())}:")
+                blocks.append("for")
+                scopes.append({target: variable})
+                emit("pass")
+            elif keyword == "if":
+                emit(f"if {condition(argument, match.start())}:")
+                blocks.append("if")
+                scopes.append({})
+                emit("pass")
+            elif keyword in ("elif", "else"):
+                if not blocks or blocks[-1] != "if":
+                    raise ValueError(f"Unexpected '{{% {keyword} %}}' on line {line_number(match.start())}")
+                blocks.pop()
+                emit(f"elif {condition(argument, match.start())}:" if keyword == "elif" else "else:")
+                blocks.append("if" if keyword == "elif" else "else")
+                emit("pass")
+            elif keyword in ("endfor", "endif"):
+                expected = ("for",) if keyword == "endfor" else ("if", "else")
+                if not blocks or blocks[-1] not in expected:
+                    raise ValueError(f"Unexpected '{{% {keyword} %}}' on line {line_number(match.start())}")
+                blocks.pop()
+                scopes.pop()
+            else:
+                raise ValueError(f"Unknown template tag '{tag}' on line {line_number(match.start())}")
         
-        if not physical_interfaces:
-            return f"No physical interfaces found for node {node_id}"
+        if blocks:
+            raise ValueError(f"Unclosed '{{% {blocks[-1]} %}}' block at end of template")
+        run_format.append(source[position:].replace("%", "%%"))
+        flush()
+        lines.append(" return ''.join(_out)")
         
-        return physical_interfaces
-    except Exception as e:
-        return _handle_api_error("get_physical_interfaces", e)
+        namespace = {}
+        try:
+            code = compile("\n".join(lines), "<config template>", "exec")
+        except SyntaxError as e:
+            raise ValueError(f"Template could not be compiled: {e.msg}") from e
+        exec(code, namespace)
+        return namespace["render"]
 
 
-@mcp.tool()
-async def create_interface(lab_id: str, node_id: str, slot: int = 4) -> Dict[str, Any]:
+def _get_config_template(source: str) -> ConfigTemplate:
     """
-    Create an interface on a node
+    Get the compiled form of a template, compiling it on first use
     
     Args:
-        lab_id: ID of the lab
-        node_id: ID of the node
-        slot: Slot number for the interface (default: 4)
+        source: Template text
     
     Returns:
-        Dictionary with interface ID and confirmation message
-    """
-    auth_check = _check_auth()
-    if auth_check:
-        return auth_check
+        Compiled template
     
-    try:
-        # Check if the lab is running
-        lab_details = await get_lab_details(lab_id)
-        if isinstance(lab_details, dict) and lab_details.get("state") == "STARTED":
-            return {"error": "Cannot create interfaces while the lab is running. Please stop the lab first."}
-        
-        print(f"Creating interface on node {node_id}, slot {slot}", file=sys.stderr)
-        
-        # Construct the proper payload format
-        interface_data = {
-            "node": node_id,
-            "slot": slot
-        }
-        
-        print(f"Interface creation payload: {interface_data}", file=sys.stderr)
-        
-        # Make the API request
-        response = await cml_auth.request(
-            "POST", 
-            f"/api/v0/labs/{lab_id}/interfaces",
-            json=interface_data
-        )
-        
-        # Process the response
-        result = response.json()
-        print(f"Interface creation response: {result}", file=sys.stderr)
-        
-        # Handle different response formats
-        if isinstance(result, list) and len(result) > 0:
-            # Sometimes the API returns a list of created interfaces
-            interface_id = result[0].get("id")
-            interface_label = result[0].get("label")
-            return {
-                "interface_id": interface_id,
-                "message": f"Created interface {interface_label} on node {node_id}, slot {slot}",
-                "status": "success",
-                "details": result
-            }
-        elif isinstance(result, dict):
-            # Sometimes it returns a single object
-            interface_id = result.get("id")
-            interface_label = result.get("label")
-            if interface_id:
-                return {
-                    "interface_id": interface_id,
-                    "message": f"Created interface {interface_label} on node {node_id}, slot {slot}",
-                    "status": "success",
-                    "details": result
-                }
-        
-        return {"error": "Failed to create interface, unexpected response format", "response": result}
-    except Exception as e:
-        return _handle_api_error("create_interface", e)
+    Raises:
+        ValueError: If the template has a syntax error
+    """
+    template = _compiled_templates.get(source)
+    if template is None:
+        # Ad hoc templates from callers shouldn't grow the cache without bound
+        if len(_compiled_templates) >= 256:
+            _compiled_templates.pop(next(iter(_compiled_templates)))
+        template = _compiled_templates[source] = ConfigTemplate(source)
+    return template
 
 
-# Link Management Tools
+# Built-in configuration templates, keyed by name
+_CONFIG_TEMPLATES = {
+    "basic-router": """
+! Basic Router Configuration Template
+!
+hostname {{hostname}}
+!
+interface GigabitEthernet0/0
+ ip address {{interface_ip}} {{interface_mask}}
+ no shutdown
+!
+""",
+    "basic-switch": """
+! Basic Switch Configuration Template
+!
+hostname {{hostname}}
+!
+vlan {{vlan_id}}
+ name {{vlan_name}}
+!
+""",
+    "ospf-config": """
+! OSPF Configuration Template
+!
+router ospf {{process_id}}
+ network {{network_address}} {{wildcard_mask}} area {{area_id}}
+!
+""",
+    "switch-stp": """! {{ switch_name }} Configuration
+!
+hostname {{ switch_name }}
+!
+! VLANs Configuration
+{% for vlan in vlans %}
+{% if vlan != 1 %}
+vlan {{ vlan }}
+ name VLAN{{ vlan }}
+!
+{% endif %}
+{% endfor %}
+! Spanning-tree Configuration
+spanning-tree mode {{ stp_mode }}
+{% if stp_mode == "mst" %}
+!
+! Configure MST instance to VLAN mapping
+spanning-tree mst configuration
+ name {{ switch_name }}-REGION
+ revision 1
+{% for instance in mst_instances %}
+ instance {{ instance.id }} vlan {{ instance.vlans }}
+{% endfor %}
+!
+{% if role == "root" %}
+! Set as MST root for instance 0 (CST)
+{% elif role == "secondary" %}
+! Set as MST secondary root
+{% else %}
+! Normal switch (not root)
+{% endif %}
+spanning-tree mst 0 priority {{ priority }}
+spanning-tree mst 1 priority {{ priority }}
+spanning-tree mst 2 priority {{ priority }}
+{% else %}
+{% for vlan in vlans %}
+spanning-tree vlan {{ vlan }} priority {{ priority }}
+{% endfor %}
+{% endif %}
+!
+! Common STP features
+spanning-tree extend system-id
+spanning-tree portfast edge default
+spanning-tree portfast bpduguard default
+!
+! Configure interfaces
+!
+interface range {{ trunk_interfaces }}
+ switchport trunk encapsulation dot1q
+ switchport mode trunk
+ switchport trunk allowed vlan all
+ no shutdown
+!
+! Management interface
+interface Vlan1
+ ip address {{ management_ip }} {{ management_mask }}
+ no shutdown
+!
+! End of configuration""",
+    "ospf-router": """! {{ hostname }} OSPF Configuration
+!
+hostname {{ hostname }}
+!
+interface Loopback0
+ ip address {{ loopback }} 255.255.255.255
+!
+{% for interface in interfaces %}
+interface {{ interface.name }}
+ description Link to {{ interface.peer }}
+ ip address {{ interface.address }} {{ interface.mask }}
+ ip ospf network point-to-point
+ no shutdown
+!
+{% endfor %}
+router ospf {{ process_id }}
+ router-id {{ loopback }}
+{% for network in networks %}
+ network {{ network.address }} {{ network.wildcard }} area {{ network.area }}
+{% endfor %}
+!"""
+}
 
-async def find_available_interface(lab_id: str, node_id: str) -> Union[str, Dict[str, str]]:
+
+@mcp.tool()
+@_instrumented
+async def render_config_template(
+    template: str,
+    variables: Optional[Dict[str, Any]] = None,
+    variable_sets: Optional[List[Dict[str, Any]]] = None
+) -> Union[Dict[str, Any], str]:
     """
-    Find an available physical interface on a node
+    Render a configuration template for one device or for many in one call
     
     Args:
-        lab_id: ID of the lab
-        node_id: ID of the node
-        
+        template: Name of a built-in template (basic-router, basic-switch, ospf-config, switch-stp, ospf-router) or template text
+        variables: Values for a single rendering
+        variable_sets: Values for many renderings; takes precedence over variables
+    
     Returns:
-        Interface ID or error dictionary
+        Rendered text for a single rendering, or a dictionary with the list of renderings
     """
-    auth_check = _check_auth()
-    if auth_check:
-        return auth_check
-    
-    try:
-        # Get interfaces for the node with operational=true to get details
-        interfaces_response = await cml_auth.request(
-            "GET", 
-            f"/api/v0/labs/{lab_id}/nodes/{node_id}/interfaces?operational=true"
-        )
-        interfaces = interfaces_response.json()
-        
-        # Ensure we have an array of interfaces
-        if isinstance(interfaces, str):
-            interfaces = interfaces.split()
-        elif isinstance(interfaces, dict):
-            interfaces = list(interfaces.keys())
-        
-        # Make sure we have interfaces to work with
-        if not interfaces:
-            return {"error": f"No interfaces found for node {node_id}"}
-        
-        # Find first available physical interface
-        for interface_id in interfaces:
-            # Get detailed info for this interface
-            interface_detail = await cml_auth.request(
-                "GET", 
-                f"/api/v0/labs/{lab_id}/interfaces/{interface_id}?operational=true"
-            )
-            interface_data = interface_detail.json()
-            
-            # Check if physical and not connected
-            if (interface_data.get("type") == "physical" and 
-                interface_data.get("is_connected") == False):
-                return interface_id
-        
-        return {"error": f"No available physical interface found for node {node_id}"}
-    except Exception as e:
-        return _handle_api_error("find_available_interface", e)
+    try:
+        compiled = _get_config_template(_CONFIG_TEMPLATES.get(template, template))
+        if variable_sets is not None:
+            return {"count": len(variable_sets), "configs": compiled.render_many(variable_sets)}
+        return compiled.render(variables)
+    except ValueError as e:
+        return {"error": f"Template error: {str(e)}"}
+
 
+# Pre-built Lab Templates
 
 @mcp.tool()
-async def create_link_v3(lab_id: str, interface_id_a: str, interface_id_b: str) -> Dict[str, Any]:
+@_instrumented
+async def create_simple_network(
+    title: str = "Simple Network",
+    description: str = "A simple network with a router and switch"
+) -> Dict[str, Any]:
     """
-    Create a link between two interfaces in a lab
+    Create a simple network lab with a router and switch
     
     Args:
-        lab_id: ID of the lab
-        interface_id_a: ID of the first interface
-        interface_id_b: ID of the second interface
+        title: Title for the new lab
+        description: Optional description for the lab
     
     Returns:
-        Dictionary with link ID and confirmation message
+        Dictionary with lab details
     """
     auth_check = _check_auth()
     if auth_check:
         return auth_check
     
     try:
-        print(f"Creating link between interfaces {interface_id_a} and {interface_id_b}", file=sys.stderr)
+        # Create the lab
+        lab_response = await create_lab(title, description)
+        if "error" in lab_response:
+            return lab_response
         
-        # Try the standard format with src_int and dst_int
-        link_data = {
-            "src_int": interface_id_a,
-            "dst_int": interface_id_b
-        }
+        lab_id = lab_response["lab_id"]
         
-        headers = {"Content-Type": "application/json"}
-        response = await cml_auth.request(
-            "POST", 
-            f"/api/v0/labs/{lab_id}/links",
-            json=link_data,
-            headers=headers
-        )
+        # Create router and switch
+        router_result = await create_router(lab_id, "Router1", 50, 50)
+        if "error" in router_result:
+            return {"error": f"Failed to create router: {router_result['error']}"}
         
-        result = response.json()
-        print(f"Link creation response: {result}", file=sys.stderr)
+        switch_result = await create_switch(lab_id, "Switch1", 8, 50, 150)
+        if "error" in switch_result:
+            return {"error": f"Failed to create switch: {switch_result['error']}"}
         
-        # Extract the link ID from the response
-        link_id = result.get("id")
-        if not link_id:
-            return {"error": "Failed to create link, no link ID returned", "response": result}
+        # Connect the devices
+        link_result = await link_nodes(lab_id, router_result["node_id"], switch_result["node_id"])
         
         return {
-            "link_id": link_id,
-            "message": f"Created link between interfaces {interface_id_a} and {interface_id_b}",
-            "status": "success",
-            "details": result
+            "lab_id": lab_id,
+            "title": title,
+            "router_id": router_result["node_id"],
+            "switch_id": switch_result["node_id"],
+            "link_status": "success" if "link_id" in link_result else "failed",
+            "link_details": link_result
         }
     except Exception as e:
-        # If the first format failed, try an alternative format
-        try:
-            print("First format failed, trying alternative format...", file=sys.stderr)
-            link_data_alt = {
-                "i1": interface_id_a,
-                "i2": interface_id_b
-            }
-            
-            response_alt = await cml_auth.request(
-                "POST", 
-                f"/api/v0/labs/{lab_id}/links",
-                json=link_data_alt,
-                headers=headers
-            )
-            
-            result_alt = response_alt.json()
-            print(f"Link creation response (alt format): {result_alt}", file=sys.stderr)
-            
-            link_id_alt = result_alt.get("id")
-            if link_id_alt:
-                return {
-                    "link_id": link_id_alt,
-                    "message": f"Created link between interfaces {interface_id_a} and {interface_id_b} using alternative format",
-                    "status": "success",
-                    "details": result_alt
-                }
-            
-            return {"error": "Failed to create link with both formats"}
-        except Exception as alt_err:
-            print(f"Alternative format also failed: {str(alt_err)}", file=sys.stderr)
-            return _handle_api_error("create_link", e)
-    
+        return _handle_api_error("create_simple_network", e)
+
 
 @mcp.tool()
-async def link_nodes(lab_id: str, node_id_a: str, node_id_b: str) -> Dict[str, Any]:
+@_instrumented
+async def generate_switch_stp_config(
+    switch_name: str,
+    stp_mode: str = "mst",  # Options: "mst", "rapid-pvst", "pvst"
+    role: str = "root",  # Options: "root", "secondary", "normal"
+    vlans: List[int] = [1, 10, 20, 30, 40],
+    mst_instance_mapping: Optional[Dict[int, List[int]]] = None
+) -> str:
     """
-    Create a link between two nodes by automatically selecting appropriate interfaces
+    Generate Spanning Tree Protocol configuration for a switch
     
     Args:
-        lab_id: ID of the lab
-        node_id_a: ID of the first node
-        node_id_b: ID of the second node
-    
+        switch_name: Name of the switch
+        stp_mode: STP mode to configure ("mst", "rapid-pvst", or "pvst")
+        role: Role of the switch ("root", "secondary", or "normal")
+        vlans: List of VLANs to configure
+        mst_instance_mapping: For MST mode, mapping of MST instances to VLANs
+        
     Returns:
-        Dictionary with link ID and confirmation message
+        Configuration text for the switch
     """
-    auth_check = _check_auth()
-    if auth_check:
-        return auth_check
-    
-    try:
-        # Find available interfaces on both nodes
-        interface_a = await find_available_interface(lab_id, node_id_a)
-        if isinstance(interface_a, dict) and "error" in interface_a:
-            return interface_a
-        
-        interface_b = await find_available_interface(lab_id, node_id_b)
-        if isinstance(interface_b, dict) and "error" in interface_b:
-            return interface_b
-        
-        # Create the link using these interfaces
-        return await create_link_v3(lab_id, interface_a, interface_b)
-    except Exception as e:
-        return _handle_api_error("link_nodes", e)
+    return _render_switch_stp_config(switch_name, stp_mode, role, vlans, mst_instance_mapping)
 
 
-@mcp.tool()
-async def get_lab_links(lab_id: str) -> Union[Dict[str, Any], str]:
+def _render_switch_stp_config(
+    switch_name: str,
+    stp_mode: str = "mst",
+    role: str = "root",
+    vlans: Optional[List[int]] = None,
+    mst_instance_mapping: Optional[Dict[int, List[int]]] = None,
+    trunk_interfaces: str = "GigabitEthernet0/0 - 7",
+    management_ip: Optional[str] = None,
+    management_mask: str = "255.255.255.0"
+) -> str:
     """
-    Get all links in a specific lab
+    Render Spanning Tree Protocol configuration for a switch
     
     Args:
-        lab_id: ID of the lab
-    
+        switch_name: Name of the switch
+        stp_mode: STP mode to configure ("mst", "rapid-pvst", or "pvst")
+        role: Role of the switch ("root", "secondary", or "normal")
+        vlans: List of VLANs to configure (default: 1, 10, 20, 30, 40)
+        mst_instance_mapping: For MST mode, mapping of MST instances to VLANs
+        trunk_interfaces: Interface range configured as trunks
+        management_ip: Address for interface Vlan1 (default: 10.0.0.<first VLAN>)
+        management_mask: Netmask for interface Vlan1
+        
     Returns:
-        Dictionary of links in the lab or error message
+        Configuration text for the switch
     """
-    auth_check = _check_auth()
-    if auth_check:
-        return auth_check["error"]
-    
-    try:
-        response = await cml_auth.request("GET", f"/api/v0/labs/{lab_id}/links")
-        links = response.json()
-        
-        # If the response is a list, convert it to a dictionary
-        if isinstance(links, list):
-            print(f"Converting links list to dictionary", file=sys.stderr)
-            result = {}
-            for link in links:
-                link_id = link.get("id")
-                if link_id:
-                    result[link_id] = link
-            return result
-        
-        return links
-    except Exception as e:
-        return f"Error getting lab links: {str(e)}"
+    return _get_config_template(_CONFIG_TEMPLATES["switch-stp"]).render(
+        _switch_stp_variables(switch_name, stp_mode, role, vlans, mst_instance_mapping, trunk_interfaces, management_ip, management_mask)
+    )
 
 
-@mcp.tool()
-async def delete_link(lab_id: str, link_id: str) -> str:
+def _switch_stp_variables(
+    switch_name: str,
+    stp_mode: str = "mst",
+    role: str = "root",
+    vlans: Optional[List[int]] = None,
+    mst_instance_mapping: Optional[Dict[int, List[int]]] = None,
+    trunk_interfaces: str = "GigabitEthernet0/0 - 7",
+    management_ip: Optional[str] = None,
+    management_mask: str = "255.255.255.0"
+) -> Dict[str, Any]:
     """
-    Delete a link from a lab
+    Build the variables for the switch-stp template
     
     Args:
-        lab_id: ID of the lab
-        link_id: ID of the link to delete
+        See _render_switch_stp_config
     
     Returns:
-        Confirmation message
+        Template variables
     """
-    auth_check = _check_auth()
-    if auth_check:
-        return auth_check["error"]
+    if vlans is None:
+        vlans = [1, 10, 20, 30, 40]
     
-    try:
-        response = await cml_auth.request("DELETE", f"/api/v0/labs/{lab_id}/links/{link_id}")
-        return f"Link {link_id} deleted successfully"
-    except Exception as e:
-        return f"Error deleting link: {str(e)}"
-
+    if mst_instance_mapping:
+        mst_instances = [
+            {"id": instance, "vlans": ",".join(map(str, mapped_vlans))}
+            for instance, mapped_vlans in mst_instance_mapping.items()
+        ]
+    else:
+        # Default mapping if none provided
+        mst_instances = [{"id": 1, "vlans": "10, 20"}, {"id": 2, "vlans": "30, 40"}]
+    
+    return {
+        "switch_name": switch_name,
+        "stp_mode": stp_mode if stp_mode in ("mst", "rapid-pvst") else "pvst",
+        "role": role,
+        "priority": {"root": 4096, "secondary": 8192}.get(role, 32768),
+        "vlans": vlans,
+        "mst_instances": mst_instances,
+        "trunk_interfaces": trunk_interfaces,
+        "management_ip": management_ip or f"10.0.0.{vlans[0]}",
+        "management_mask": management_mask
+    }
 
-# Configuration Management Tools
 
-@mcp.tool()
-async def configure_node(lab_id: str, node_id: str, config: str) -> str:
+def _grid_positions(count: int, y: int, spacing: int = 150, per_row: int = 40, row_height: int = 80) -> List[Tuple[int, int]]:
     """
-    Configure a node with the specified configuration
+    Lay out a tier of nodes in centred rows
     
     Args:
-        lab_id: ID of the lab
-        node_id: ID of the node to configure
-        config: Configuration text to apply
+        count: Number of nodes in the tier
+        y: Y coordinate of the first row
+        spacing: Horizontal distance between nodes
+        per_row: Maximum nodes per row before wrapping
+        row_height: Vertical distance between wrapped rows
     
     Returns:
-        Confirmation message
+        List of (x, y) coordinates
     """
-    auth_check = _check_auth()
-    if auth_check:
-        return auth_check["error"]
-    
-    try:
-        response = await cml_auth.request(
-            "PUT",
-            f"/api/v0/labs/{lab_id}/nodes/{node_id}/config",
-            content=config
-        )
-        
-        return f"Configuration applied to node {node_id}"
-    except Exception as e:
-        return f"Error configuring node: {str(e)}"
+    positions = []
+    for index in range(count):
+        row, column = divmod(index, per_row)
+        row_size = min(per_row, count - row * per_row)
+        positions.append((int((column - (row_size - 1) / 2) * spacing), y + row * row_height))
+    return positions
 
 
-@mcp.tool()
-async def get_node_config(lab_id: str, node_id: str) -> str:
+def _iosvl2_interface_range(interface_count: int) -> str:
     """
-    Get the current configuration of a node
+    Build an interface range covering the first interfaces of an iosvl2 switch
     
     Args:
-        lab_id: ID of the lab
-        node_id: ID of the node
+        interface_count: Number of interfaces
     
     Returns:
-        Node configuration text or error message
+        Interface range, e.g. "GigabitEthernet0/0 - 3, GigabitEthernet1/0 - 1"
     """
-    auth_check = _check_auth()
-    if auth_check:
-        return auth_check["error"]
-    
-    try:
-        response = await cml_auth.request("GET", f"/api/v0/labs/{lab_id}/nodes/{node_id}/config")
-        config = response.text
-        return config
-    except Exception as e:
-        return f"Error getting node configuration: {str(e)}"
-
+    groups = []
+    for group in range((interface_count + 3) // 4):
+        last_port = min(3, interface_count - group * 4 - 1)
+        groups.append(f"GigabitEthernet{group}/0 - {last_port}")
+    return ", ".join(groups)
 
-# Lab Control Tools
 
-@mcp.tool()
-async def start_lab(lab_id: str) -> str:
+@_traced
+def _plan_switching_fabric(
+    num_core: int,
+    num_distribution: int,
+    num_access: int,
+    interfaces_per_switch: int = 8,
+    stp_mode: str = "mst",
+    vlans: Optional[List[int]] = None,
+    title: str = "Switching Fabric",
+    description: str = ""
+) -> Dict[str, Any]:
     """
-    Start the specified lab
+    Generate a core/distribution/access switching fabric as a topology spec
+    
+    Cores are linked to each other (a ring from three up). Every distribution
+    switch uplinks to two cores, and distribution switches are paired into
+    blocks linked to each other. Access switches are spread across the
+    blocks, uplink to both distribution switches of their block and are
+    paired with a neighbour in the same block. Without distribution switches,
+    access switches uplink to the cores instead. Each switch gets an STP
+    configuration: the first core is root, the second is secondary.
     
     Args:
-        lab_id: ID of the lab to start
+        num_core: Number of core switches (at least 1)
+        num_distribution: Number of distribution switches
+        num_access: Number of access switches
+        interfaces_per_switch: Minimum number of interfaces per switch; raised where a switch needs more
+        stp_mode: STP mode to configure ("mst", "rapid-pvst", or "pvst")
+        vlans: VLANs to configure (default: 1, 10, 20, 30, 40)
+        title: Title for the lab
+        description: Description for the lab
     
     Returns:
-        Confirmation message
+        Topology spec with "layer" and "role" on every node
+    
+    Raises:
+        ValueError: If the tier sizes are invalid
     """
-    auth_check = _check_auth()
-    if auth_check:
-        return auth_check["error"]
+    if num_core < 1 or num_distribution < 0 or num_access < 0:
+        raise ValueError("A fabric needs at least one core switch and no negative tier sizes")
     
-    try:
-        response = await cml_auth.request("PUT", f"/api/v0/labs/{lab_id}/start")
-        return f"Lab {lab_id} started successfully"
-    except Exception as e:
-        return f"Error starting lab: {str(e)}"
+    tiers = [("Core", num_core, 100), ("Distribution", num_distribution, 250), ("Access", num_access, 400)]
+    names = {}
+    nodes = []
+    number = 1
+    for layer, count, y in tiers:
+        names[layer] = []
+        if layer == "Access":
+            # Access rows start below any wrapped distribution rows
+            y += ((num_distribution - 1) // 40) * 80 if num_distribution else 0
+        for x, row_y in _grid_positions(count, y):
+            name = f"SW{number}-{layer}"
+            names[layer].append(name)
+            nodes.append({"label": name, "node_definition": "iosvl2", "x": x, "y": row_y, "layer": layer.lower()})
+            number += 1
+    
+    links = []
+    cores = names["Core"]
+    distribution = names["Distribution"]
+    access = names["Access"]
+    
+    # Core interconnect
+    if num_core == 2:
+        links.append((cores[0], cores[1]))
+    elif num_core > 2:
+        links.extend((cores[index], cores[(index + 1) % num_core]) for index in range(num_core))
+    
+    # Distribution uplinks to two cores, then blocks of two linked together
+    for index, name in enumerate(distribution):
+        uplinks = {cores[index % num_core], cores[(index + 1) % num_core]}
+        links.extend((core, name) for core in sorted(uplinks, key=cores.index))
+    for index in range(0, num_distribution - 1, 2):
+        links.append((distribution[index], distribution[index + 1]))
+    
+    # Access switches share blocks round-robin and pair up with the next switch in the same block
+    upstream = distribution or cores
+    blocks = [upstream[index:index + 2] for index in range(0, len(upstream), 2)]
+    for index, name in enumerate(access):
+        links.extend((parent, name) for parent in blocks[index % len(blocks)])
+    for index in range(len(access)):
+        partner = index + len(blocks)
+        if (index // len(blocks)) % 2 == 0 and partner < len(access):
+            links.append((access[index], access[partner]))
+    
+    degree = {node["label"]: 0 for node in nodes}
+    for name_a, name_b in links:
+        degree[name_a] += 1
+        degree[name_b] += 1
+    
+    for node in nodes:
+        interface_count = max(interfaces_per_switch, degree[node["label"]])
+        if node["label"] == cores[0]:
+            role = "root"
+        elif num_core > 1 and node["label"] == cores[1]:
+            role = "secondary"
+        else:
+            role = "normal"
+        
+        switch_number = int(node["label"][2:node["label"].index("-")])
+        node.update({
+            "role": role,
+            "interfaces": interface_count,
+            "parameters": {"slot1": str(interface_count)},
+            "config": _render_switch_stp_config(
+                node["label"],
+                stp_mode,
+                role,
+                vlans,
+                trunk_interfaces=_iosvl2_interface_range(interface_count),
+                management_ip=f"10.0.{switch_number // 256}.{switch_number % 256}",
+                management_mask="255.255.0.0"
+            )
+        })
+    
+    return {
+        "title": title,
+        "description": description,
+        "nodes": nodes,
+        "links": [{"a": name_a, "b": name_b} for name_a, name_b in links]
+    }
 
 
-@mcp.tool()
-async def wait_for_lab_nodes(lab_id: str, timeout: int = 60) -> str:
+@_traced
+async def _build_switching_fabric(
+    title: str,
+    description: str,
+    num_core: int,
+    num_distribution: int,
+    num_access: int,
+    interfaces_per_switch: int,
+    stp_mode: str,
+    vlans: Optional[List[int]],
+    push: str,
+    max_concurrency: int
+) -> Dict[str, Any]:
     """
-    Wait for all nodes in a lab to reach the STARTED state
+    Generate a switching fabric and push it to CML, timing both phases
     
     Args:
-        lab_id: ID of the lab
-        timeout: Maximum time to wait in seconds (default: 60)
+        title: Title for the lab
+        description: Description for the lab
+        num_core: Number of core switches
+        num_distribution: Number of distribution switches
+        num_access: Number of access switches
+        interfaces_per_switch: Minimum number of interfaces per switch
+        stp_mode: STP mode to configure
+        vlans: VLANs to configure, or None for the defaults
+        push: "import" or "api" (see _push_topology)
+        max_concurrency: Maximum number of concurrent build steps for the "api" push
     
     Returns:
-        Status message
+        Dictionary with lab ID, switches, links and timing, or an error
     """
-    auth_check = _check_auth()
-    if auth_check:
-        return auth_check["error"]
+    generate_start = time.perf_counter()
+    spec = _plan_switching_fabric(
+        num_core, num_distribution, num_access, interfaces_per_switch, stp_mode, vlans, title, description
+    )
+    generate_seconds = time.perf_counter() - generate_start
     
-    try:
-        # Check if the lab is running
-        lab_details = await get_lab_details(lab_id)
-        if not isinstance(lab_details, dict) or lab_details.get("state") != "STARTED":
-            return "Lab is not in STARTED state. Start the lab first."
-        
-        print(f"Waiting for nodes in lab {lab_id} to initialize...", file=sys.stderr)
-        
-        # Get nodes
-        nodes = await get_lab_nodes(lab_id)
-        if isinstance(nodes, str) and "Error" in nodes:
-            return nodes
-        
-        start_time = asyncio.get_event_loop().time()
-        all_ready = False
-        
-        while not all_ready and (asyncio.get_event_loop().time() - start_time) < timeout:
-            all_ready = True
-            
-            for node_id, node in nodes.items():
-                node_info = await cml_auth.request("GET", f"/api/v0/labs/{lab_id}/nodes/{node_id}")
-                node_data = node_info.json()
-                
-                state = node_data.get("state", "UNKNOWN")
-                print(f"Node {node_data.get('label', 'unknown')} state: {state}", file=sys.stderr)
-                
-                if state != "STARTED":
-                    all_ready = False
-            
-            if not all_ready:
-                await asyncio.sleep(5)  # Wait 5 seconds before checking again
-        
-        if all_ready:
-            return "All nodes in the lab are initialized and ready"
-        else:
-            return f"Timeout reached ({timeout} seconds). Some nodes may not be fully initialized."
-    except Exception as e:
-        print(f"Error waiting for nodes: {str(e)}", file=sys.stderr)
-        traceback.print_exc(file=sys.stderr)
-        return f"Error waiting for nodes: {str(e)}"
+    push_start = time.perf_counter()
+    pushed = await _push_topology(spec, push, max_concurrency)
+    push_seconds = time.perf_counter() - push_start
+    if "error" in pushed:
+        return pushed
+    
+    node_ids = pushed["node_ids"]
+    link_ids = pushed.get("link_ids") or [None] * len(spec["links"])
+    timing = {"generate_seconds": round(generate_seconds, 4), "push_seconds": round(push_seconds, 4)}
+    if "timing" in pushed:
+        timing["build"] = pushed["timing"]
+    
+    result = {
+        "lab_id": pushed["lab_id"],
+        "title": title,
+        "switches": [
+            {"name": node["label"], "id": node_ids.get(node["label"]), "layer": node["layer"], "role": node["role"]}
+            for node in spec["nodes"]
+        ],
+        "links": [
+            {"from": link["a"], "to": link["b"], "id": link_id} for link, link_id in zip(spec["links"], link_ids)
+        ],
+        "status": pushed.get("status", "success"),
+        "timing": timing
+    }
+    if pushed.get("failed"):
+        result["failed"] = pushed["failed"]
+    return result
 
 
 @mcp.tool()
-async def stop_lab(lab_id: str) -> str:
+@_instrumented
+async def create_switching_fabric(
+    title: str = "Switching Fabric",
+    description: str = "Core/distribution/access switching fabric",
+    num_core: int = 2,
+    num_distribution: int = 4,
+    num_access: int = 8,
+    interfaces_per_switch: int = 8,
+    stp_mode: str = "mst",
+    vlans: List[int] = [1, 10, 20, 30, 40],
+    push: str = "import",
+    max_concurrency: int = 8
+) -> Dict[str, Any]:
     """
-    Stop the specified lab
+    Create a core/distribution/access switching fabric of any size with STP configured
     
     Args:
-        lab_id: ID of the lab to stop
+        title: Title for the lab
+        description: Description for the lab
+        num_core: Number of core switches (default: 2)
+        num_distribution: Number of distribution switches, paired into blocks (default: 4)
+        num_access: Number of access switches (default: 8)
+        interfaces_per_switch: Minimum interfaces per switch, raised where needed (default: 8)
+        stp_mode: STP mode to configure ("mst", "rapid-pvst", or "pvst")
+        vlans: VLANs to configure on every switch
+        push: "import" to upload the whole fabric in one request, "api" for concurrent per-object calls
+        max_concurrency: Maximum number of concurrent build steps for the "api" push (default: 8)
     
     Returns:
-        Confirmation message
+        Dictionary with lab ID, switches, links, and generation and push timings
     """
     auth_check = _check_auth()
     if auth_check:
-        return auth_check["error"]
+        return auth_check
     
     try:
-        response = await cml_auth.request("PUT", f"/api/v0/labs/{lab_id}/stop")
-        return f"Lab {lab_id} stopped successfully"
+        return await _build_switching_fabric(
+            title, description, num_core, num_distribution, num_access,
+            interfaces_per_switch, stp_mode, vlans, push, max_concurrency
+        )
+    except ValueError as e:
+        return {"error": f"Invalid fabric: {str(e)}"}
     except Exception as e:
-        return f"Error stopping lab: {str(e)}"
+        return _handle_api_error("create_switching_fabric", e)
 
 
 @mcp.tool()
-async def get_lab_topology(lab_id: str) -> str:
+@_instrumented
+async def create_stp_lab(
+    title: str = "STP Test Lab",
+    description: str = "Spanning Tree Protocol test lab with multiple STP versions",
+    num_switches: int = 6,
+    interfaces_per_switch: int = 8,
+    max_concurrency: int = 8,
+    stp_mode: str = "mst",
+    push: str = "api"
+) -> Dict[str, Any]:
     """
-    Get a detailed summary of the lab topology
+    Create a comprehensive Spanning Tree Protocol test lab
+    
+    Up to six switches give the classic layout (two core, two distribution,
+    two access); larger counts are split roughly 4/16/80 across the core,
+    distribution and access tiers.
     
     Args:
-        lab_id: ID of the lab
+        title: Title for the lab
+        description: Description for the lab
+        num_switches: Number of switches to create (default: 6)
+        interfaces_per_switch: Number of interfaces per switch (default: 8)
+        max_concurrency: Maximum number of build steps running at once (default: 8)
+        stp_mode: STP mode to configure ("mst", "rapid-pvst", or "pvst")
+        push: "api" for concurrent per-object calls, "import" to upload the lab in one request
     
     Returns:
-        Formatted summary of the lab topology
+        Dictionary with lab details, node IDs and build timings
     """
     auth_check = _check_auth()
     if auth_check:
-        return auth_check["error"]
+        return auth_check
     
     try:
-        # Get lab details
-        lab_details = await get_lab_details(lab_id)
-        if isinstance(lab_details, dict) and "error" in lab_details:
-            return lab_details["error"]
-        
-        # Get nodes
-        nodes = await get_lab_nodes(lab_id)
-        if isinstance(nodes, str) and "Error" in nodes:
-            return nodes
-        
-        # Get links
-        links = await get_lab_links(lab_id)
-        if isinstance(links, str) and "Error" in links:
-            return links
-        
-        # Create a topology summary
-        result = f"Lab Topology: {lab_details.get('title', 'Untitled')}\n"
-        result += f"State: {lab_details.get('state', 'unknown')}\n"
-        result += f"Description: {lab_details.get('description', 'None')}\n\n"
-        
-        # Add nodes
-        result += "Nodes:\n"
-        for node_id, node in nodes.items():
-            result += f"- {node.get('label', 'Unnamed')} (ID: {node_id})\n"
-            result += f"  Type: {node.get('node_definition', 'unknown')}\n"
-            result += f"  State: {node.get('state', 'unknown')}\n"
-        
-        # Add links
-        result += "\nLinks:\n"
-        for link_id, link in links.items():
-            src_node_id = link.get('src_node')
-            dst_node_id = link.get('dst_node')
-            
-            if src_node_id in nodes and dst_node_id in nodes:
-                src_node = nodes[src_node_id].get('label', src_node_id)
-                dst_node = nodes[dst_node_id].get('label', dst_node_id)
-                result += (f"- Link {link_id}: {src_node} ({link.get('src_int', 'unknown')}) → "
-                           f"{dst_node} ({link.get('dst_int', 'unknown')})\n")
-            else:
-                result += f"- Link {link_id}: {src_node_id}:{link.get('src_int')} → {dst_node_id}:{link.get('dst_int')}\n"
+        if num_switches <= 6:
+            num_core = 2
+            num_distribution = 2 if num_switches > 2 else 0
+            num_access = 2 if num_switches > 4 else 0
+        else:
+            num_core = max(2, round(num_switches * 0.04))
+            num_distribution = max(2, round(num_switches * 0.16))
+            num_distribution += num_distribution % 2
+            num_access = num_switches - num_core - num_distribution
         
+        result = await _build_switching_fabric(
+            title, description, num_core, num_distribution, num_access,
+            interfaces_per_switch, stp_mode, None, push, max_concurrency
+        )
+        if "error" not in result:
+            result["message"] = (
+                f"Created STP lab with {len(result['switches'])} switches, "
+                f"each having at least {interfaces_per_switch} interfaces"
+            )
         return result
     except Exception as e:
-        return f"Error getting lab topology: {str(e)}"
+        return _handle_api_error("create_stp_lab", e)
 
 
-# Pre-built Lab Templates
+class IPv4Allocator:
+    """Hands out consecutive, non-overlapping subnets of one size from an address pool"""
+    
+    def __init__(self, pool: str, prefix_length: int):
+        """
+        Initialize the allocator
+        
+        Args:
+            pool: Address pool in CIDR notation (e.g. "10.0.0.0/16")
+            prefix_length: Prefix length of every allocated subnet
+        
+        Raises:
+            ValueError: If the pool is invalid or smaller than one subnet
+        """
+        self.pool = ipaddress.IPv4Network(pool)
+        if not self.pool.prefixlen <= prefix_length <= 32:
+            raise ValueError(f"Cannot allocate /{prefix_length} subnets from {self.pool}")
+        self.prefix_length = prefix_length
+        self.netmask = str(ipaddress.IPv4Network(f"0.0.0.0/{prefix_length}").netmask)
+        self.hostmask = str(ipaddress.IPv4Network(f"0.0.0.0/{prefix_length}").hostmask)
+        self._size = 1 << (32 - prefix_length)
+        self._next = int(self.pool.network_address)
+        self._end = int(self.pool.broadcast_address) + 1
+    
+    def allocate(self) -> int:
+        """
+        Allocate the next subnet
+        
+        Returns:
+            Network address of the subnet as an integer
+        
+        Raises:
+            ValueError: If the pool is exhausted
+        """
+        if self._next + self._size > self._end:
+            raise ValueError(f"Address pool {self.pool} exhausted")
+        network = self._next
+        self._next += self._size
+        return network
 
-@mcp.tool()
-async def create_simple_network(
-    title: str = "Simple Network",
-    description: str = "A simple network with a router and switch"
-) -> Dict[str, Any]:
+
+def _ospf_links(num_routers: int, shape: str, num_areas: int) -> List[Tuple[int, int, int]]:
     """
-    Create a simple network lab with a router and switch
+    Work out the router links for an OSPF topology shape
     
     Args:
-        title: Title for the new lab
-        description: Optional description for the lab
+        num_routers: Number of routers
+        shape: "ring", "full-mesh", "hub-and-spoke" or "multi-area"
+        num_areas: Number of areas for "multi-area", including backbone area 0
     
     Returns:
-        Dictionary with lab details
+        List of (router index, router index, area) tuples
+    
+    Raises:
+        ValueError: If the shape is unknown or the sizes don't fit it
     """
-    auth_check = _check_auth()
-    if auth_check:
-        return auth_check
+    def ring(members, area):
+        if len(members) == 2:
+            return [(members[0], members[1], area)]
+        if len(members) > 2:
+            return [(members[index], members[(index + 1) % len(members)], area) for index in range(len(members))]
+        return []
     
-    try:
-        # Create the lab
-        lab_response = await create_lab(title, description)
-        if "error" in lab_response:
-            return lab_response
-        
-        lab_id = lab_response["lab_id"]
-        
-        # Create router and switch
-        router_result = await create_router(lab_id, "Router1", 50, 50)
-        if "error" in router_result:
-            return {"error": f"Failed to create router: {router_result['error']}"}
-        
-        switch_result = await create_switch(lab_id, "Switch1", 8, 50, 150)
-        if "error" in switch_result:
-            return {"error": f"Failed to create switch: {switch_result['error']}"}
-        
-        # Connect the devices
-        link_result = await link_nodes(lab_id, router_result["node_id"], switch_result["node_id"])
-        
-        return {
-            "lab_id": lab_id,
-            "title": title,
-            "router_id": router_result["node_id"],
-            "switch_id": switch_result["node_id"],
-            "link_status": "success" if "link_id" in link_result else "failed",
-            "link_details": link_result
-        }
-    except Exception as e:
-        return _handle_api_error("create_simple_network", e)
+    routers = list(range(num_routers))
+    if shape == "ring":
+        return ring(routers, 0)
+    if shape == "full-mesh":
+        return [(a, b, 0) for a in routers for b in routers[a + 1:]]
+    if shape == "hub-and-spoke":
+        return [(0, spoke, 0) for spoke in routers[1:]]
+    if shape != "multi-area":
+        raise ValueError(f"Unknown shape '{shape}', expected ring, full-mesh, hub-and-spoke or multi-area")
+    
+    if num_areas < 2 or num_routers < num_areas * 2:
+        raise ValueError("multi-area needs at least two areas and two routers per area")
+    
+    # Routers split evenly into areas; area 0 is a ring of backbone routers.
+    # Each other area is a ring whose first router is the ABR, uplinked to the backbone.
+    groups = [routers[index::num_areas] for index in range(num_areas)]
+    backbone = groups[0]
+    links = ring(backbone, 0)
+    for area, members in enumerate(groups[1:], start=1):
+        links.append((backbone[(area - 1) % len(backbone)], members[0], 0))
+        links.extend(ring(members, area))
+    return links
 
 
-@mcp.tool()
-async def generate_switch_stp_config(
-    switch_name: str,
-    stp_mode: str = "mst",  # Options: "mst", "rapid-pvst", "pvst"
-    role: str = "root",  # Options: "root", "secondary", "normal"
-    vlans: List[int] = [1, 10, 20, 30, 40],
-    mst_instance_mapping: Optional[Dict[int, List[int]]] = None
-) -> str:
+@_traced
+def _plan_ospf_network(
+    num_routers: int,
+    shape: str = "ring",
+    num_areas: int = 2,
+    node_definition: str = "iosv",
+    link_pool: str = "10.0.0.0/16",
+    link_prefix_length: int = 30,
+    loopback_pool: str = "10.255.0.0/16",
+    process_id: int = 1,
+    name_prefix: str = "R",
+    title: str = "OSPF Network Lab",
+    description: str = ""
+) -> Dict[str, Any]:
     """
-    Generate Spanning Tree Protocol configuration for a switch
+    Generate an OSPF network as a topology spec with addressing and configs
+    
+    Every link gets its own point-to-point subnet (/30 or /31) and every
+    router a /32 loopback used as its router ID.
     
     Args:
-        switch_name: Name of the switch
-        stp_mode: STP mode to configure ("mst", "rapid-pvst", or "pvst")
-        role: Role of the switch ("root", "secondary", or "normal")
-        vlans: List of VLANs to configure
-        mst_instance_mapping: For MST mode, mapping of MST instances to VLANs
-        
+        num_routers: Number of routers (at least 2)
+        shape: "ring", "full-mesh", "hub-and-spoke" or "multi-area"
+        num_areas: Number of areas for "multi-area", including backbone area 0
+        node_definition: Router node definition
+        link_pool: Address pool for point-to-point links
+        link_prefix_length: 30 or 31
+        loopback_pool: Address pool for loopbacks
+        process_id: OSPF process ID
+        name_prefix: Router label prefix, numbered from 1
+        title: Title for the lab
+        description: Description for the lab
+    
     Returns:
-        Configuration text for the switch
+        Topology spec with "loopback" and "areas" on every node and "subnet" and "area" on every link
+    
+    Raises:
+        ValueError: If the parameters are invalid or a pool is exhausted
     """
+    if num_routers < 2:
+        raise ValueError("An OSPF network needs at least two routers")
+    if link_prefix_length not in (30, 31):
+        raise ValueError("Point-to-point links must be /30 or /31")
     
-    config_lines = [
-        f"! {switch_name} Configuration",
-        "!",
-        f"hostname {switch_name}",
-        "!",
-        "! VLANs Configuration"
-    ]
-    
-    # Create VLANs
-    for vlan_id in vlans:
-        if vlan_id == 1:
-            continue  # Skip default VLAN 1
-        config_lines.extend([
-            f"vlan {vlan_id}",
-            f" name VLAN{vlan_id}",
-            "!"
-        ])
-    
-    # STP Mode Configuration
-    config_lines.append("! Spanning-tree Configuration")
-    
-    if stp_mode == "mst":
-        config_lines.append("spanning-tree mode mst")
-        
-        # Configure MST region and instances
-        config_lines.extend([
-            "!",
-            "! Configure MST instance to VLAN mapping",
-            "spanning-tree mst configuration",
-            f" name {switch_name}-REGION",
-            " revision 1"
-        ])
-        
-        # Add instance to VLAN mappings
-        if mst_instance_mapping:
-            for instance, mapped_vlans in mst_instance_mapping.items():
-                vlan_list = ",".join(map(str, mapped_vlans))
-                config_lines.append(f" instance {instance} vlan {vlan_list}")
-        else:
-            # Default mapping if none provided
-            config_lines.extend([
-                " instance 1 vlan 10, 20",
-                " instance 2 vlan 30, 40"
-            ])
-        
-        # Configure priorities based on role
-        if role == "root":
-            config_lines.extend([
-                "!",
-                "! Set as MST root for instance 0 (CST)",
-                "spanning-tree mst 0 priority 4096",
-                "spanning-tree mst 1 priority 4096",
-                "spanning-tree mst 2 priority 4096"
-            ])
-        elif role == "secondary":
-            config_lines.extend([
-                "!",
-                "! Set as MST secondary root",
-                "spanning-tree mst 0 priority 8192",
-                "spanning-tree mst 1 priority 8192",
-                "spanning-tree mst 2 priority 8192"
-            ])
-        else:
-            # Normal role with higher priority
-            config_lines.extend([
-                "!",
-                "! Normal switch (not root)",
-                "spanning-tree mst 0 priority 32768",
-                "spanning-tree mst 1 priority 32768",
-                "spanning-tree mst 2 priority 32768"
-            ])
-    
-    elif stp_mode == "rapid-pvst":
-        config_lines.append("spanning-tree mode rapid-pvst")
-        
-        # Configure priorities per VLAN based on role
-        if role == "root":
-            for vlan_id in vlans:
-                config_lines.append(f"spanning-tree vlan {vlan_id} priority 4096")
-        elif role == "secondary":
-            for vlan_id in vlans:
-                config_lines.append(f"spanning-tree vlan {vlan_id} priority 8192")
-        else:
-            # Normal role with higher priority for specific VLANs
-            for vlan_id in vlans:
-                config_lines.append(f"spanning-tree vlan {vlan_id} priority 32768")
-    
-    else:  # PVST (default)
-        config_lines.append("spanning-tree mode pvst")
-        
-        # Configure priorities per VLAN based on role
-        if role == "root":
-            for vlan_id in vlans:
-                config_lines.append(f"spanning-tree vlan {vlan_id} priority 4096")
-        elif role == "secondary":
-            for vlan_id in vlans:
-                config_lines.append(f"spanning-tree vlan {vlan_id} priority 8192")
-        else:
-            # Normal role with higher priority
-            for vlan_id in vlans:
-                config_lines.append(f"spanning-tree vlan {vlan_id} priority 32768")
-    
-    # Common STP settings regardless of mode
-    config_lines.extend([
-        "!",
-        "! Common STP features",
-        "spanning-tree extend system-id",
-        "spanning-tree portfast edge default",
-        "spanning-tree portfast bpduguard default"
-    ])
+    router_links = _ospf_links(num_routers, shape, num_areas)
+    links_allocator = IPv4Allocator(link_pool, link_prefix_length)
+    loopback_allocator = IPv4Allocator(loopback_pool, 32)
+    # Skip the pool's network address so loopbacks start at .1
+    loopback_allocator.allocate()
     
-    # Interface configuration
-    config_lines.extend([
-        "!",
-        "! Configure interfaces",
-        "!",
-        "interface range GigabitEthernet0/0 - 7",
-        " switchport trunk encapsulation dot1q",
-        " switchport mode trunk",
-        " switchport trunk allowed vlan all",
-        " no shutdown"
-    ])
+    # Per-router interfaces and networks for the ospf-router template, filled in link by link
+    names = [f"{name_prefix}{index + 1}" for index in range(num_routers)]
+    loopbacks = [str(ipaddress.IPv4Address(loopback_allocator.allocate())) for _ in range(num_routers)]
+    router_areas = [set() for _ in range(num_routers)]
+    next_slot = [0] * num_routers
+    interfaces = [[] for _ in range(num_routers)]
+    networks = [[{"address": loopbacks[index], "wildcard": "0.0.0.0", "area": 0}] for index in range(num_routers)]
+    
+    host_offset = 0 if link_prefix_length == 31 else 1
+    links = []
+    for router_a, router_b, area in router_links:
+        network = links_allocator.allocate()
+        network_address = str(ipaddress.IPv4Address(network))
+        for router, peer, host in ((router_a, router_b, 0), (router_b, router_a, 1)):
+            slot = next_slot[router]
+            next_slot[router] += 1
+            router_areas[router].add(area)
+            interfaces[router].append({
+                "name": _interface_label(node_definition, slot),
+                "peer": names[peer],
+                "address": str(ipaddress.IPv4Address(network + host_offset + host)),
+                "mask": links_allocator.netmask
+            })
+            networks[router].append({"address": network_address, "wildcard": links_allocator.hostmask, "area": area})
+        links.append({
+            "a": names[router_a],
+            "b": names[router_b],
+            "a_slot": next_slot[router_a] - 1,
+            "b_slot": next_slot[router_b] - 1,
+            "subnet": f"{network_address}/{link_prefix_length}",
+            "area": area
+        })
+    
+    # Layout: areas in rows for multi-area, a circle otherwise
+    if shape == "multi-area":
+        positions = [None] * num_routers
+        for area in range(num_areas):
+            members = list(range(area, num_routers, num_areas))
+            for router, position in zip(members, _grid_positions(len(members), 100 + area * 200)):
+                positions[router] = position
+    else:
+        radius = max(150, num_routers * 25)
+        positions = [
+            (int(radius * math.cos(2 * math.pi * index / num_routers)), int(radius * math.sin(2 * math.pi * index / num_routers)))
+            for index in range(num_routers)
+        ]
+        if shape == "hub-and-spoke":
+            positions[0] = (0, 0)
+    
+    # A router's loopback lives in its lowest area, which is area 0 for ABRs
+    for index in range(num_routers):
+        if router_areas[index]:
+            networks[index][0]["area"] = min(router_areas[index])
     
-    # Management VLAN interface 
-    config_lines.extend([
-        "!",
-        "! Management interface",
-        "interface Vlan1",
-        f" ip address 10.0.0.{vlans[0]} 255.255.255.0",
-        " no shutdown",
-        "!",
-        "! End of configuration"
+    configs = _get_config_template(_CONFIG_TEMPLATES["ospf-router"]).render_many([
+        {
+            "hostname": names[index],
+            "loopback": loopbacks[index],
+            "interfaces": interfaces[index],
+            "networks": networks[index],
+            "process_id": process_id
+        }
+        for index in range(num_routers)
     ])
     
-    return "\n".join(config_lines)
+    nodes = []
+    for index, (name, config) in enumerate(zip(names, configs)):
+        nodes.append({
+            "label": name,
+            "node_definition": node_definition,
+            "x": positions[index][0],
+            "y": positions[index][1],
+            "interfaces": next_slot[index],
+            "config": config,
+            "loopback": loopbacks[index],
+            "areas": sorted(router_areas[index])
+        })
+    
+    return {"title": title, "description": description, "nodes": nodes, "links": links}
+
+
+@_traced
+async def _build_ospf_network(spec_args: Dict[str, Any], push: str, max_concurrency: int) -> Dict[str, Any]:
+    """
+    Generate an OSPF network and push it to CML, timing both phases
+    
+    Args:
+        spec_args: Keyword arguments for _plan_ospf_network
+        push: "import" or "api" (see _push_topology)
+        max_concurrency: Maximum number of concurrent build steps for the "api" push
+    
+    Returns:
+        Dictionary with lab ID, routers, links and timing, or an error
+    """
+    generate_start = time.perf_counter()
+    spec = _plan_ospf_network(**spec_args)
+    generate_seconds = time.perf_counter() - generate_start
+    
+    push_start = time.perf_counter()
+    pushed = await _push_topology(spec, push, max_concurrency)
+    push_seconds = time.perf_counter() - push_start
+    if "error" in pushed:
+        return pushed
+    
+    node_ids = pushed["node_ids"]
+    link_ids = pushed.get("link_ids") or [None] * len(spec["links"])
+    timing = {"generate_seconds": round(generate_seconds, 4), "push_seconds": round(push_seconds, 4)}
+    if "timing" in pushed:
+        timing["build"] = pushed["timing"]
+    
+    result = {
+        "lab_id": pushed["lab_id"],
+        "title": spec["title"],
+        "routers": [
+            {"name": node["label"], "id": node_ids.get(node["label"]), "loopback": node["loopback"], "areas": node["areas"]}
+            for node in spec["nodes"]
+        ],
+        "links": [
+            {"from": link["a"], "to": link["b"], "subnet": link["subnet"], "area": link["area"], "id": link_id}
+            for link, link_id in zip(spec["links"], link_ids)
+        ],
+        "status": pushed.get("status", "success"),
+        "timing": timing
+    }
+    if pushed.get("failed"):
+        result["failed"] = pushed["failed"]
+    return result
 
 
 @mcp.tool()
-async def create_stp_lab(
-    title: str = "STP Test Lab",
-    description: str = "Spanning Tree Protocol test lab with multiple STP versions",
-    num_switches: int = 6,
-    interfaces_per_switch: int = 8
+@_instrumented
+async def create_ospf_network(
+    title: str = "OSPF Network Lab",
+    description: str = "Routers connected via OSPF",
+    num_routers: int = 4,
+    shape: str = "ring",
+    num_areas: int = 2,
+    node_definition: str = "iosv",
+    link_prefix_length: int = 30,
+    link_pool: str = "10.0.0.0/16",
+    loopback_pool: str = "10.255.0.0/16",
+    process_id: int = 1,
+    push: str = "import",
+    max_concurrency: int = 8
 ) -> Dict[str, Any]:
     """
-    Create a comprehensive Spanning Tree Protocol test lab
+    Create an OSPF lab with any number of routers, with addressing and configs generated
     
     Args:
         title: Title for the lab
         description: Description for the lab
-        num_switches: Number of switches to create (default: 6)
-        interfaces_per_switch: Number of interfaces per switch (default: 8)
+        num_routers: Number of routers (default: 4)
+        shape: "ring", "full-mesh", "hub-and-spoke" or "multi-area" (default: "ring")
+        num_areas: Number of areas for "multi-area", including backbone area 0 (default: 2)
+        node_definition: Router node definition (default: "iosv")
+        link_prefix_length: Prefix length for point-to-point links, 30 or 31 (default: 30)
+        link_pool: Address pool for point-to-point links (default: "10.0.0.0/16")
+        loopback_pool: Address pool for router loopbacks (default: "10.255.0.0/16")
+        process_id: OSPF process ID (default: 1)
+        push: "import" to upload the lab in one request, "api" for concurrent per-object calls
+        max_concurrency: Maximum number of concurrent build steps for the "api" push (default: 8)
     
     Returns:
-        Dictionary with lab details and node IDs
+        Dictionary with lab ID, routers with loopbacks, links with subnets, and timings
     """
     auth_check = _check_auth()
     if auth_check:
         return auth_check
     
     try:
-        # Create the lab
-        lab_response = await create_lab(title, description)
-        if "error" in lab_response:
-            return lab_response
-        
-        lab_id = lab_response["lab_id"]
-        
-        # Create the switches with enhanced interface count
-        switches = []
-        
-        # Core switches (top row)
-        sw1_result = await create_switch(
-            lab_id, 
-            "SW1-Core", 
-            interfaces_per_switch, 
-            x=100, 
-            y=100
-        )
-        switches.append({"name": "SW1-Core", "id": sw1_result["node_id"], "layer": "core"})
-        
-        sw2_result = await create_switch(
-            lab_id, 
-            "SW2-Core", 
-            interfaces_per_switch, 
-            x=300, 
-            y=100
-        )
-        switches.append({"name": "SW2-Core", "id": sw2_result["node_id"], "layer": "core"})
-        
-        # Distribution switches (middle row) if we have more than 2 switches
-        if num_switches > 2:
-            sw3_result = await create_switch(
-                lab_id, 
-                "SW3-Distribution", 
-                interfaces_per_switch, 
-                x=50, 
-                y=200
-            )
-            switches.append({"name": "SW3-Distribution", "id": sw3_result["node_id"], "layer": "distribution"})
-            
-            sw4_result = await create_switch(
-                lab_id, 
-                "SW4-Distribution", 
-                interfaces_per_switch, 
-                x=350, 
-                y=200
-            )
-            switches.append({"name": "SW4-Distribution", "id": sw4_result["node_id"], "layer": "distribution"})
-        
-        # Access switches (bottom row) if we have more than 4 switches
-        if num_switches > 4:
-            sw5_result = await create_switch(
-                lab_id, 
-                "SW5-Access", 
-                interfaces_per_switch, 
-                x=150, 
-                y=300
-            )
-            switches.append({"name": "SW5-Access", "id": sw5_result["node_id"], "layer": "access"})
-            
-            sw6_result = await create_switch(
-                lab_id, 
-                "SW6-Access", 
-                interfaces_per_switch, 
-                x=250, 
-                y=300
-            )
-            switches.append({"name": "SW6-Access", "id": sw6_result["node_id"], "layer": "access"})
-        
-        # Create links between switches to form a redundant topology
-        links = []
-        
-        # Connect core switches
-        if len(switches) >= 2:
-            link1 = await link_nodes(lab_id, switches[0]["id"], switches[1]["id"])
-            links.append({"from": switches[0]["name"], "to": switches[1]["name"], "id": link1.get("link_id")})
-        
-        # Connect distribution to core (if we have distribution switches)
-        if len(switches) >= 4:
-            # Connect SW1-Core to both distribution switches
-            link2 = await link_nodes(lab_id, switches[0]["id"], switches[2]["id"])
-            links.append({"from": switches[0]["name"], "to": switches[2]["name"], "id": link2.get("link_id")})
-            
-            link3 = await link_nodes(lab_id, switches[0]["id"], switches[3]["id"])
-            links.append({"from": switches[0]["name"], "to": switches[3]["name"], "id": link3.get("link_id")})
-            
-            # Connect SW2-Core to both distribution switches
-            link4 = await link_nodes(lab_id, switches[1]["id"], switches[2]["id"])
-            links.append({"from": switches[1]["name"], "to": switches[2]["name"], "id": link4.get("link_id")})
-            
-            link5 = await link_nodes(lab_id, switches[1]["id"], switches[3]["id"])
-            links.append({"from": switches[1]["name"], "to": switches[3]["name"], "id": link5.get("link_id")})
-            
-            # Connect distribution switches to each other
-            link6 = await link_nodes(lab_id, switches[2]["id"], switches[3]["id"])
-            links.append({"from": switches[2]["name"], "to": switches[3]["name"], "id": link6.get("link_id")})
-        
-        # Connect access switches (if we have them)
-        if len(switches) >= 6:
-            # Connect distribution to access
-            link7 = await link_nodes(lab_id, switches[2]["id"], switches[4]["id"])
-            links.append({"from": switches[2]["name"], "to": switches[4]["name"], "id": link7.get("link_id")})
-            
-            link8 = await link_nodes(lab_id, switches[2]["id"], switches[5]["id"])
-            links.append({"from": switches[2]["name"], "to": switches[5]["name"], "id": link8.get("link_id")})
-            
-            link9 = await link_nodes(lab_id, switches[3]["id"], switches[4]["id"])
-            links.append({"from": switches[3]["name"], "to": switches[4]["name"], "id": link9.get("link_id")})
-            
-            link10 = await link_nodes(lab_id, switches[3]["id"], switches[5]["id"])
-            links.append({"from": switches[3]["name"], "to": switches[5]["name"], "id": link10.get("link_id")})
-            
-            # Connect access switches to each other
-            link11 = await link_nodes(lab_id, switches[4]["id"], switches[5]["id"])
-            links.append({"from": switches[4]["name"], "to": switches[5]["name"], "id": link11.get("link_id")})
-        
-        return {
-            "lab_id": lab_id,
+        spec_args = {
+            "num_routers": num_routers,
+            "shape": shape,
+            "num_areas": num_areas,
+            "node_definition": node_definition,
+            "link_pool": link_pool,
+            "link_prefix_length": link_prefix_length,
+            "loopback_pool": loopback_pool,
+            "process_id": process_id,
             "title": title,
-            "switches": switches,
-            "links": links,
-            "status": "success",
-            "message": f"Created STP lab with {len(switches)} switches, each having {interfaces_per_switch} interfaces"
+            "description": description
         }
+        return await _build_ospf_network(spec_args, push, max_concurrency)
+    except ValueError as e:
+        return {"error": f"Invalid OSPF network: {str(e)}"}
     except Exception as e:
-        return _handle_api_error("create_stp_lab", e)
+        return _handle_api_error("create_ospf_network", e)
 
 
 @mcp.tool()
+@_instrumented
 async def create_ospf_lab(title: str = "OSPF Network Lab", description: str = "Two routers connected via OSPF") -> Dict[str, Any]:
     """
     Create a complete OSPF lab with two routers properly configured
@@ -1569,67 +5685,23 @@ async def create_ospf_lab(title: str = "OSPF Network Lab", description: str = "T
         return auth_check
     
     try:
-        # Create the lab
-        lab_response = await create_lab(title, description)
-        if "error" in lab_response:
-            return lab_response
-        
-        lab_id = lab_response["lab_id"]
-        
-        # Create two routers
-        router1_result = await create_router(lab_id, "Router1", 50, 50)
-        if "error" in router1_result:
-            return {"error": f"Failed to create Router1: {router1_result['error']}"}
-        
-        router2_result = await create_router(lab_id, "Router2", 200, 50)
-        if "error" in router2_result:
-            return {"error": f"Failed to create Router2: {router2_result['error']}"}
-        
-        # Connect the routers
-        link_result = await link_nodes(lab_id, router1_result["node_id"], router2_result["node_id"])
-        if "error" in link_result:
-            return {"error": f"Failed to link routers: {link_result['error']}"}
-        
-        # Configure Router1 with OSPF
-        router1_config = """
-! Basic Router1 Configuration with OSPF
-!
-hostname Router1
-!
-interface GigabitEthernet0/0
- ip address 10.0.0.1 255.255.255.0
- no shutdown
-!
-router ospf 1
- network 10.0.0.0 0.0.0.255 area 0
-!
-"""
-        
-        await configure_node(lab_id, router1_result["node_id"], router1_config)
-        
-        # Configure Router2 with OSPF
-        router2_config = """
-! Basic Router2 Configuration with OSPF
-!
-hostname Router2
-!
-interface GigabitEthernet0/0
- ip address 10.0.0.2 255.255.255.0
- no shutdown
-!
-router ospf 1
- network 10.0.0.0 0.0.0.255 area 0
-!
-"""
-        
-        await configure_node(lab_id, router2_result["node_id"], router2_config)
+        result = await _build_ospf_network(
+            {"num_routers": 2, "name_prefix": "Router", "title": title, "description": description},
+            push="api",
+            max_concurrency=8
+        )
+        if "error" in result:
+            return result
+        if result.get("failed"):
+            return {"error": f"Failed to build OSPF lab: {result['failed']}", "lab_id": result["lab_id"]}
         
+        router1, router2 = result["routers"]
         return {
-            "lab_id": lab_id,
+            "lab_id": result["lab_id"],
             "title": title,
-            "router1_id": router1_result["node_id"],
-            "router2_id": router2_result["node_id"],
-            "link_id": link_result.get("link_id"),
+            "router1_id": router1["id"],
+            "router2_id": router2["id"],
+            "link_id": result["links"][0]["id"],
             "status": "success",
             "instructions": "Lab created with OSPF routing between Router1 (10.0.0.1) and Router2 (10.0.0.2). Start the lab to test connectivity."
         }
@@ -1642,42 +5714,45 @@ router ospf 1
 @mcp.resource("cml://templates/basic-router")
 def basic_router_template() -> str:
     """Basic router configuration template"""
-    return """
-! Basic Router Configuration Template
-!
-hostname {{hostname}}
-!
-interface GigabitEthernet0/0
- ip address {{interface_ip}} {{interface_mask}}
- no shutdown
-!
-"""
+    return _CONFIG_TEMPLATES["basic-router"]
 
 
 @mcp.resource("cml://templates/basic-switch")
 def basic_switch_template() -> str:
     """Basic switch configuration template"""
-    return """
-! Basic Switch Configuration Template
-!
-hostname {{hostname}}
-!
-vlan {{vlan_id}}
- name {{vlan_name}}
-!
-"""
+    return _CONFIG_TEMPLATES["basic-switch"]
 
 
 @mcp.resource("cml://templates/ospf-config")
 def ospf_template() -> str:
     """OSPF configuration template"""
-    return """
-! OSPF Configuration Template
-!
-router ospf {{process_id}}
- network {{network_address}} {{wildcard_mask}} area {{area_id}}
-!
-"""
+    return _CONFIG_TEMPLATES["ospf-config"]
+
+
+@mcp.resource("cml://templates/switch-stp")
+def switch_stp_template() -> str:
+    """Switch spanning tree configuration template"""
+    return _CONFIG_TEMPLATES["switch-stp"]
+
+
+@mcp.resource("cml://templates/ospf-router")
+def ospf_router_template() -> str:
+    """OSPF router configuration template with loopback and point-to-point links"""
+    return _CONFIG_TEMPLATES["ospf-router"]
+
+
+# Metrics
+
+@mcp.resource("cml://metrics")
+def metrics_resource() -> str:
+    """Per-tool call counts, errors, and latency, upstream request and byte histograms as JSON"""
+    return json.dumps(_tool_metrics.snapshot(), indent=2)
+
+
+@mcp.resource("cml://metrics/prometheus")
+def prometheus_metrics_resource() -> str:
+    """Per-tool metrics in the Prometheus text exposition format"""
+    return _tool_metrics.render_prometheus()
 
 
 @mcp.prompt("cml-describe-topology")
@@ -0,0 +1,823 @@
+"""
+Mock CML Controller - In-memory stand-in for the Cisco Modeling Labs REST API
+
+Implements the /api/v0 endpoints used by claude_modeling_labs.py (authentication,
+labs, nodes, interfaces, links, configurations, lab import, start/stop/wipe, node
+and image definitions) plus the node state event websocket, as a plain ASGI app.
+Latency and error rates can be injected to see how the tools behave against a
+slow or flaky controller.
+
+In-process use, with no network involved:
+
+    mock = MockCML(latency=0.01)
+    auth = CMLAuth("http://mock-cml", "admin", "admin", transport=httpx.ASGITransport(app=mock))
+
+As a standalone server (requires uvicorn):
+
+    python mock_cml.py --port 8080 --latency 0.02 --error-rate 0.01
+
+License: MIT
+"""
+
+import sys
+import json
+import uuid
+import base64
+import random
+import asyncio
+import argparse
+import collections
+import re
+import time
+from typing import Dict, List, Optional, Any, Tuple, Callable
+from urllib.parse import parse_qsl
+
+
+def _node_definition(
+    node_id: str,
+    interface_names: List[str],
+    ram: Optional[int],
+    nature: str = "router",
+    default_count: int = 4,
+    driver: str = "kvm"
+) -> Dict[str, Any]:
+    """Build a node definition in the shape the CML node_definitions endpoint returns"""
+    return {
+        "id": node_id,
+        "general": {"nature": nature, "description": node_id},
+        "device": {
+            "interfaces": {
+                "physical": interface_names,
+                "has_loopback_zero": nature == "router",
+                "min_count": 1,
+                "default_count": default_count
+            }
+        },
+        "sim": {"linux_native": {"libvirt_domain_driver": driver, "ram": ram, "cpus": 1, "cpu_limit": 100}},
+        "ui": {"label_prefix": node_id, "visible": True}
+    }
+
+
+# Node definitions served by the mock, modelled on a stock CML installation
+DEFAULT_NODE_DEFINITIONS = [
+    _node_definition("iosv", [f"GigabitEthernet0/{slot}" for slot in range(16)], 512),
+    _node_definition("iosvl2", [f"GigabitEthernet{slot // 4}/{slot % 4}" for slot in range(16)], 768, "switch", 8),
+    _node_definition("csr1000v", [f"GigabitEthernet{slot + 1}" for slot in range(26)], 3072),
+    _node_definition("cat8000v", [f"GigabitEthernet{slot + 1}" for slot in range(26)], 4096),
+    _node_definition("iosxrv9000", [f"GigabitEthernet0/0/0/{slot}" for slot in range(31)], 16384),
+    _node_definition("nxosv9000", [f"Ethernet1/{slot + 1}" for slot in range(64)], 8192, "switch", 8),
+    _node_definition("alpine", [f"eth{slot}" for slot in range(8)], 512, "server", 1),
+    _node_definition("unmanaged_switch", [f"port{slot}" for slot in range(32)], None, "switch", 8, "none"),
+    _node_definition("external_connector", ["port"], None, "cloud", 1, "none")
+]
+
+# One installed image for every node definition that needs one
+DEFAULT_IMAGE_DEFINITIONS = [
+    {"id": f"{node_def['id']}-default", "node_definition_id": node_def["id"], "label": f"{node_def['id']} default image"}
+    for node_def in DEFAULT_NODE_DEFINITIONS
+    if node_def["sim"]["linux_native"]["libvirt_domain_driver"] != "none"
+]
+
+
+class MockError(Exception):
+    """An API error returned to the client with a status code"""
+
+    def __init__(self, status: int, description: str):
+        """
+        Initialize the error
+
+        Args:
+            status: HTTP status code
+            description: Error description sent in the response body
+        """
+        super().__init__(description)
+        self.status = status
+        self.description = description
+
+
+class MockRequest:
+    """A parsed HTTP request handed to route handlers"""
+
+    def __init__(self, method: str, path: str, query: Dict[str, str], headers: Dict[str, str], body: bytes, params: Tuple[str, ...]):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+        self.params = params
+
+    def json(self) -> Any:
+        """Decode the body as JSON"""
+        try:
+            return json.loads(self.body or b"null")
+        except ValueError:
+            raise MockError(400, "Request body is not valid JSON")
+
+    def flag(self, name: str) -> bool:
+        """Whether a boolean query parameter is set"""
+        return self.query.get(name, "").lower() == "true"
+
+
+class MockCML:
+    """In-memory CML controller served as an ASGI application"""
+
+    def __init__(
+        self,
+        username: str = "admin",
+        password: str = "admin",
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        retry_after: Optional[float] = None,
+        boot_time: float = 0.0,
+        transition_time: float = 0.0,
+        token_lifetime: float = 8 * 3600,
+        version: str = "2.7.0",
+        seed: Optional[int] = None,
+        bulk_listings: bool = True
+    ):
+        """
+        Initialize an empty controller
+
+        Args:
+            username: Accepted username
+            password: Accepted password
+            latency: Seconds added to every HTTP response
+            jitter: Extra random delay of up to this many seconds per response
+            error_rate: Fraction of API requests (other than authentication) failed on purpose
+            error_status: Status code for injected failures
+            retry_after: Retry-After header value sent with injected failures (optional)
+            boot_time: Seconds a node takes from QUEUED to BOOTED after the lab starts
+            transition_time: Seconds a lab takes to finish stopping or wiping
+            token_lifetime: Lifetime of issued tokens in seconds
+            version: Software version reported by system_information
+            seed: Seed for the latency and failure randomness (optional)
+            bulk_listings: Honour data=true on listings; when False only IDs are returned, like older controllers
+        """
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.boot_time = boot_time
+        self.transition_time = transition_time
+        self.token_lifetime = token_lifetime
+        self.version = version
+        self.random = random.Random(seed)
+        self.bulk_listings = bulk_listings
+
+        self.node_definitions = list(DEFAULT_NODE_DEFINITIONS)
+        self.image_definitions = list(DEFAULT_IMAGE_DEFINITIONS)
+        self._definitions_by_id = {node_def["id"]: node_def for node_def in self.node_definitions}
+
+        self.tokens = {}
+        self.labs = {}
+        self.nodes = {}
+        self.interfaces = {}
+        self.links = {}
+
+        # Per-lab and per-node membership, so lookups stay cheap in 10k-node labs
+        self.lab_nodes = {}
+        self.lab_links = {}
+        self.lab_interfaces = {}
+        self.node_interfaces = {}
+
+        self.request_counts = collections.Counter()
+        self.injected_errors = 0
+        self._event_queues = set()
+        self._routes = self._build_routes()
+
+    # Bookkeeping
+
+    @property
+    def total_requests(self) -> int:
+        """Number of HTTP requests served since the last reset"""
+        return sum(self.request_counts.values())
+
+    def reset_counts(self) -> None:
+        """Reset request and injected error counters"""
+        self.request_counts.clear()
+        self.injected_errors = 0
+
+    def _new_id(self) -> str:
+        return str(uuid.uuid4())
+
+    def _timestamp(self) -> str:
+        return time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime())
+
+    def _issue_token(self) -> str:
+        """Issue a JWT-shaped token carrying an exp claim"""
+        def encode(data):
+            return base64.urlsafe_b64encode(json.dumps(data).encode("utf-8")).rstrip(b"=").decode("ascii")
+
+        expires_at = time.time() + self.token_lifetime
+        token = ".".join([encode({"alg": "none", "typ": "JWT"}), encode({"sub": self.username, "exp": expires_at, "jti": self._new_id()}), "mock"])
+        self.tokens[token] = expires_at
+        return token
+
+    def _authorized(self, headers: Dict[str, str]) -> bool:
+        authorization = headers.get("authorization", "")
+        if not authorization.startswith("Bearer "):
+            return False
+        expires_at = self.tokens.get(authorization[len("Bearer "):])
+        return expires_at is not None and time.time() < expires_at
+
+    def _emit_event(self, event: Dict[str, Any]) -> None:
+        for queue in self._event_queues:
+            queue.put_nowait(event)
+
+    def _set_node_state(self, node: Dict[str, Any], state: str) -> None:
+        node["state"] = state
+        self._emit_event({
+            "event_type": "state_change",
+            "element_type": "node",
+            "lab_id": node["lab_id"],
+            "element_id": node["id"],
+            "data": {"id": node["id"], "state": state}
+        })
+
+    # Seeding helpers for benchmarks and tests
+
+    def add_lab(self, title: str, description: str = "", owner: str = "admin", state: str = "DEFINED_ON_CORE") -> Dict[str, Any]:
+        """
+        Create a lab directly, without going through the API
+
+        Args:
+            title: Lab title
+            description: Lab description
+            owner: Owner username
+            state: Initial lab state
+
+        Returns:
+            The new lab
+        """
+        lab_id = self._new_id()
+        now = self._timestamp()
+        self.labs[lab_id] = {
+            "id": lab_id,
+            "title": title,
+            "description": description,
+            "notes": "",
+            "state": state,
+            "owner": owner,
+            "owner_username": owner,
+            "created": now,
+            "modified": now,
+            "node_count": 0,
+            "link_count": 0
+        }
+        self.lab_nodes[lab_id] = {}
+        self.lab_links[lab_id] = {}
+        self.lab_interfaces[lab_id] = {}
+        return self.labs[lab_id]
+
+    def add_node(
+        self,
+        lab_id: str,
+        label: str,
+        node_definition: str,
+        x: int = 0,
+        y: int = 0,
+        interface_count: Optional[int] = None,
+        configuration: str = "",
+        **extra: Any
+    ) -> Dict[str, Any]:
+        """
+        Create a node directly, without going through the API
+
+        Args:
+            lab_id: ID of the lab
+            label: Node label
+            node_definition: Node definition ID
+            x: X coordinate
+            y: Y coordinate
+            interface_count: Number of interfaces to create (default: none)
+            configuration: Startup configuration
+            **extra: Other node fields (ram, cpu_limit, parameters, ...)
+
+        Returns:
+            The new node
+        """
+        node_id = self._new_id()
+        node = {
+            "id": node_id,
+            "lab_id": lab_id,
+            "label": label,
+            "node_definition": node_definition,
+            "x": x,
+            "y": y,
+            "state": "DEFINED_ON_CORE",
+            "configuration": configuration,
+            "ram": extra.get("ram"),
+            "cpu_limit": extra.get("cpu_limit"),
+            "image_definition": extra.get("image_definition"),
+            "parameters": extra.get("parameters") or {},
+            "tags": extra.get("tags") or [],
+            "boot_disk_size": None,
+            "hide_links": False
+        }
+        self.nodes[node_id] = node
+        self.node_interfaces[node_id] = {}
+        self.lab_nodes[lab_id][node_id] = None
+        self.labs[lab_id]["node_count"] += 1
+        for slot in range(interface_count or 0):
+            self._add_interface(node, slot)
+        return node
+
+    def set_lab_state(self, lab_id: str, lab_state: str, node_state: Optional[str] = None) -> None:
+        """
+        Move a lab, and optionally all of its nodes, to a state without going through the API
+
+        Args:
+            lab_id: ID of the lab
+            lab_state: New lab state
+            node_state: New state for every node in the lab (optional)
+        """
+        self.labs[lab_id]["state"] = lab_state
+        if node_state is not None:
+            for node_id in self.lab_nodes[lab_id]:
+                self._set_node_state(self.nodes[node_id], node_state)
+
+    def _add_interface(self, node: Dict[str, Any], slot: int, label: Optional[str] = None) -> Dict[str, Any]:
+        physical = self._definitions_by_id.get(node["node_definition"], {}).get("device", {}).get("interfaces", {}).get("physical") or []
+        interface_id = self._new_id()
+        interface = {
+            "id": interface_id,
+            "lab_id": node["lab_id"],
+            "node": node["id"],
+            "slot": slot,
+            "label": label or (physical[slot] if slot < len(physical) else f"eth{slot}"),
+            "type": "physical",
+            "is_connected": False,
+            "state": "DEFINED_ON_CORE",
+            "mac_address": None
+        }
+        self.interfaces[interface_id] = interface
+        self.node_interfaces[node["id"]][interface_id] = None
+        self.lab_interfaces[node["lab_id"]][interface_id] = None
+        return interface
+
+    def add_link(self, lab_id: str, src_int: str, dst_int: str) -> Dict[str, Any]:
+        """
+        Create a link directly, without going through the API
+
+        Args:
+            lab_id: ID of the lab
+            src_int: ID of the first interface
+            dst_int: ID of the second interface
+
+        Returns:
+            The new link
+
+        Raises:
+            MockError: If an interface is missing or already connected
+        """
+        src, dst = self.interfaces.get(src_int), self.interfaces.get(dst_int)
+        if src is None or dst is None or src["lab_id"] != lab_id or dst["lab_id"] != lab_id:
+            raise MockError(404, "Interface not found")
+        if src["is_connected"] or dst["is_connected"]:
+            raise MockError(400, "Interface is already connected")
+
+        link_id = self._new_id()
+        src["is_connected"] = dst["is_connected"] = True
+        self.links[link_id] = {
+            "id": link_id,
+            "lab_id": lab_id,
+            "interface_a": src_int,
+            "interface_b": dst_int,
+            "src_int": src_int,
+            "dst_int": dst_int,
+            "src_node": src["node"],
+            "dst_node": dst["node"],
+            "state": "DEFINED_ON_CORE",
+            "label": f"{self.nodes[src['node']]['label']}-{src['label']}<->{self.nodes[dst['node']]['label']}-{dst['label']}"
+        }
+        self.lab_links[lab_id][link_id] = None
+        self.labs[lab_id]["link_count"] += 1
+        return self.links[link_id]
+
+    # Routing
+
+    def _build_routes(self) -> List[Tuple[str, "re.Pattern", Callable]]:
+        uid = r"([^/]+)"
+        routes = [
+            ("POST", r"/api/v0/authenticate", self._authenticate),
+            ("GET", r"/api/v0/authok", lambda request: True),
+            ("GET", r"/api/v0/system_information", lambda request: {"version": self.version, "ready": True}),
+            ("GET", r"/api/v0/node_definitions", lambda request: self.node_definitions),
+            ("GET", r"/api/v0/image_definitions", lambda request: self.image_definitions),
+            ("POST", r"/api/v0/import", self._import_lab),
+            ("GET", r"/api/v0/labs", lambda request: list(self.labs)),
+            ("POST", r"/api/v0/labs", self._create_lab),
+            ("GET", rf"/api/v0/labs/{uid}", lambda request: self._lab(request.params[0])),
+            ("DELETE", rf"/api/v0/labs/{uid}", self._delete_lab),
+            ("PUT", rf"/api/v0/labs/{uid}/start", self._start_lab),
+            ("PUT", rf"/api/v0/labs/{uid}/stop", self._stop_lab),
+            ("PUT", rf"/api/v0/labs/{uid}/wipe", self._wipe_lab),
+            ("GET", rf"/api/v0/labs/{uid}/nodes", self._list_nodes),
+            ("POST", rf"/api/v0/labs/{uid}/nodes", self._create_node),
+            ("GET", rf"/api/v0/labs/{uid}/nodes/{uid}", lambda request: self._node(*request.params)),
+            ("GET", rf"/api/v0/labs/{uid}/nodes/{uid}/config", self._get_config),
+            ("PUT", rf"/api/v0/labs/{uid}/nodes/{uid}/config", self._put_config),
+            ("GET", rf"/api/v0/labs/{uid}/nodes/{uid}/interfaces", self._list_node_interfaces),
+            ("GET", rf"/api/v0/labs/{uid}/interfaces", self._list_lab_interfaces),
+            ("POST", rf"/api/v0/labs/{uid}/interfaces", self._create_interface),
+            ("GET", rf"/api/v0/labs/{uid}/interfaces/{uid}", lambda request: self._interface(*request.params)),
+            ("GET", rf"/api/v0/labs/{uid}/links", self._list_links),
+            ("POST", rf"/api/v0/labs/{uid}/links", self._create_link),
+            ("GET", rf"/api/v0/labs/{uid}/links/{uid}", lambda request: self._link(*request.params)),
+            ("DELETE", rf"/api/v0/labs/{uid}/links/{uid}", self._delete_link)
+        ]
+        return [(method, re.compile(f"^{pattern}$"), handler) for method, pattern, handler in routes]
+
+    def _route(self, method: str, path: str) -> Tuple[Optional[Callable], Tuple[str, ...], str]:
+        """Find the handler for a request, along with its path parameters and route name"""
+        path_matched = False
+        for route_method, pattern, handler in self._routes:
+            match = pattern.match(path)
+            if match:
+                path_matched = True
+                if route_method == method:
+                    return handler, match.groups(), f"{method} {pattern.pattern[1:-1]}"
+        if path_matched:
+            raise MockError(405, f"Method {method} not allowed on {path}")
+        return None, (), f"{method} (unknown)"
+
+    # Lookups
+
+    def _lab(self, lab_id: str) -> Dict[str, Any]:
+        lab = self.labs.get(lab_id)
+        if lab is None:
+            raise MockError(404, f"Lab not found: {lab_id}")
+        return lab
+
+    def _node(self, lab_id: str, node_id: str) -> Dict[str, Any]:
+        self._lab(lab_id)
+        node = self.nodes.get(node_id)
+        if node is None or node["lab_id"] != lab_id:
+            raise MockError(404, f"Node not found: {node_id}")
+        return node
+
+    def _interface(self, lab_id: str, interface_id: str) -> Dict[str, Any]:
+        self._lab(lab_id)
+        interface = self.interfaces.get(interface_id)
+        if interface is None or interface["lab_id"] != lab_id:
+            raise MockError(404, f"Interface not found: {interface_id}")
+        return interface
+
+    def _link(self, lab_id: str, link_id: str) -> Dict[str, Any]:
+        self._lab(lab_id)
+        link = self.links.get(link_id)
+        if link is None or link["lab_id"] != lab_id:
+            raise MockError(404, f"Link not found: {link_id}")
+        return link
+
+    # Handlers
+
+    def _authenticate(self, request: MockRequest) -> str:
+        credentials = request.json() or {}
+        if credentials.get("username") != self.username or credentials.get("password") != self.password:
+            raise MockError(403, "Authentication failed")
+        return self._issue_token()
+
+    def _create_lab(self, request: MockRequest) -> Dict[str, Any]:
+        data = request.json() or {}
+        return self.add_lab(data.get("title") or "Untitled Lab", data.get("description", ""), self.username)
+
+    def _delete_lab(self, request: MockRequest) -> None:
+        lab = self._lab(request.params[0])
+        if lab["state"] in ("STARTED", "QUEUED", "BOOTED"):
+            raise MockError(400, "Lab is running, stop it before deleting")
+        lab_id = lab["id"]
+        for link_id in self.lab_links.pop(lab_id):
+            del self.links[link_id]
+        for interface_id in self.lab_interfaces.pop(lab_id):
+            del self.interfaces[interface_id]
+        for node_id in self.lab_nodes.pop(lab_id):
+            del self.nodes[node_id]
+            del self.node_interfaces[node_id]
+        del self.labs[lab_id]
+        return None
+
+    def _later(self, delay: float, callback: Callable[[], None]) -> None:
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, callback)
+        else:
+            callback()
+
+    def _start_lab(self, request: MockRequest) -> None:
+        lab = self._lab(request.params[0])
+        lab["state"] = "STARTED"
+        for node_id in self.lab_nodes[lab["id"]]:
+            node = self.nodes[node_id]
+            if node["state"] in ("BOOTED", "STARTED"):
+                continue
+            self._set_node_state(node, "QUEUED")
+            # Spread boot times so readiness arrives over a window, like a real controller
+            delay = self.boot_time * self.random.uniform(0.5, 1.5) if self.boot_time else 0
+            self._later(delay, lambda node=node: node["state"] == "QUEUED" and lab["state"] == "STARTED" and self._set_node_state(node, "BOOTED"))
+        return None
+
+    def _stop_lab(self, request: MockRequest) -> None:
+        lab = self._lab(request.params[0])
+
+        def finish():
+            lab["state"] = "STOPPED"
+            for node_id in self.lab_nodes.get(lab["id"], ()):
+                self._set_node_state(self.nodes[node_id], "STOPPED")
+
+        self._later(self.transition_time, finish)
+        return None
+
+    def _wipe_lab(self, request: MockRequest) -> None:
+        lab = self._lab(request.params[0])
+        if lab["state"] in ("STARTED", "QUEUED", "BOOTED"):
+            raise MockError(400, "Lab is running, stop it before wiping")
+
+        def finish():
+            lab["state"] = "DEFINED_ON_CORE"
+            for node_id in self.lab_nodes.get(lab["id"], ()):
+                self._set_node_state(self.nodes[node_id], "DEFINED_ON_CORE")
+
+        self._later(self.transition_time, finish)
+        return None
+
+    def _wants_data(self, request: MockRequest) -> bool:
+        """Whether a listing should return full objects rather than IDs"""
+        return self.bulk_listings and request.flag("data")
+
+    def _list_nodes(self, request: MockRequest) -> List[Any]:
+        lab_id = self._lab(request.params[0])["id"]
+        if self._wants_data(request):
+            return [self.nodes[node_id] for node_id in self.lab_nodes[lab_id]]
+        return list(self.lab_nodes[lab_id])
+
+    def _create_node(self, request: MockRequest) -> Dict[str, Any]:
+        lab_id = self._lab(request.params[0])["id"]
+        data = request.json() or {}
+        node_definition = self._definitions_by_id.get(data.get("node_definition"))
+        if node_definition is None:
+            raise MockError(400, f"Unknown node definition: {data.get('node_definition')}")
+        if not data.get("label"):
+            raise MockError(400, "Node label is required")
+
+        interface_count = None
+        if request.flag("populate_interfaces"):
+            interfaces = node_definition["device"]["interfaces"]
+            interface_count = int((data.get("parameters") or {}).get("slot1") or interfaces["default_count"])
+            if interface_count > len(interfaces["physical"]):
+                raise MockError(400, f"{node_definition['id']} supports at most {len(interfaces['physical'])} interfaces")
+
+        node = self.add_node(
+            lab_id,
+            data["label"],
+            node_definition["id"],
+            data.get("x", 0),
+            data.get("y", 0),
+            interface_count,
+            ram=data.get("ram"),
+            cpu_limit=data.get("cpu_limit"),
+            image_definition=data.get("image_definition"),
+            parameters=data.get("parameters"),
+            tags=data.get("tags")
+        )
+        return {"id": node["id"]}
+
+    def _get_config(self, request: MockRequest) -> str:
+        return self._node(*request.params)["configuration"] or ""
+
+    def _put_config(self, request: MockRequest) -> str:
+        node = self._node(*request.params)
+        node["configuration"] = request.body.decode("utf-8")
+        return node["id"]
+
+    def _list_node_interfaces(self, request: MockRequest) -> List[Any]:
+        node_id = self._node(*request.params)["id"]
+        if self._wants_data(request):
+            return [self.interfaces[interface_id] for interface_id in self.node_interfaces[node_id]]
+        return list(self.node_interfaces[node_id])
+
+    def _list_lab_interfaces(self, request: MockRequest) -> List[Any]:
+        lab_id = self._lab(request.params[0])["id"]
+        if self._wants_data(request):
+            return [self.interfaces[interface_id] for interface_id in self.lab_interfaces[lab_id]]
+        return list(self.lab_interfaces[lab_id])
+
+    def _create_interface(self, request: MockRequest) -> Any:
+        lab = self._lab(request.params[0])
+        if lab["state"] == "STARTED":
+            raise MockError(400, "Cannot add interfaces to a running lab")
+        data = request.json() or {}
+        node = self._node(lab["id"], data.get("node"))
+        slot = data.get("slot")
+
+        # Like CML, create every missing interface up to the requested slot
+        existing = {self.interfaces[interface_id]["slot"]: self.interfaces[interface_id] for interface_id in self.node_interfaces[node["id"]]}
+        if slot is None:
+            slot = max(existing, default=-1) + 1
+        if slot in existing:
+            raise MockError(400, f"Slot {slot} is already in use")
+        created = [self._add_interface(node, missing_slot) for missing_slot in range(slot + 1) if missing_slot not in existing]
+        return created if len(created) > 1 else created[0]
+
+    def _list_links(self, request: MockRequest) -> List[Any]:
+        lab_id = self._lab(request.params[0])["id"]
+        if self._wants_data(request):
+            return [self.links[link_id] for link_id in self.lab_links[lab_id]]
+        return list(self.lab_links[lab_id])
+
+    def _create_link(self, request: MockRequest) -> Dict[str, Any]:
+        lab_id = self._lab(request.params[0])["id"]
+        data = request.json() or {}
+        src_int = data.get("src_int") or data.get("i1")
+        dst_int = data.get("dst_int") or data.get("i2")
+        return self.add_link(lab_id, src_int, dst_int)
+
+    def _delete_link(self, request: MockRequest) -> None:
+        link = self._link(*request.params)
+        self.interfaces[link["src_int"]]["is_connected"] = False
+        self.interfaces[link["dst_int"]]["is_connected"] = False
+        del self.links[link["id"]]
+        del self.lab_links[link["lab_id"]][link["id"]]
+        self.labs[link["lab_id"]]["link_count"] -= 1
+        return None
+
+    def _import_lab(self, request: MockRequest) -> Dict[str, Any]:
+        text = request.body.decode("utf-8")
+        try:
+            topology = json.loads(text)
+        except ValueError:
+            try:
+                import yaml
+            except ImportError:
+                raise MockError(415, "YAML topologies need PyYAML installed on the mock")
+            topology = yaml.load(text, Loader=getattr(yaml, "CSafeLoader", yaml.SafeLoader))
+        if not isinstance(topology, dict) or "nodes" not in topology:
+            raise MockError(400, "Topology has no nodes")
+
+        lab_info = topology.get("lab") or {}
+        lab = self.add_lab(request.query.get("title") or lab_info.get("title") or "Imported Lab", lab_info.get("description", ""), self.username)
+
+        # Topology-local node and interface IDs map to new controller IDs
+        node_ids = {}
+        interface_ids = {}
+        for topology_node in topology["nodes"]:
+            if topology_node.get("node_definition") not in self._definitions_by_id:
+                self._delete_lab(MockRequest("DELETE", "", {}, {}, b"", (lab["id"],)))
+                raise MockError(400, f"Unknown node definition: {topology_node.get('node_definition')}")
+            node = self.add_node(
+                lab["id"],
+                topology_node["label"],
+                topology_node["node_definition"],
+                topology_node.get("x", 0),
+                topology_node.get("y", 0),
+                configuration=topology_node.get("configuration") or "",
+                ram=topology_node.get("ram"),
+                cpu_limit=topology_node.get("cpu_limit"),
+                image_definition=topology_node.get("image_definition"),
+                parameters=topology_node.get("parameters"),
+                tags=topology_node.get("tags")
+            )
+            node_ids[topology_node["id"]] = node["id"]
+            for topology_interface in topology_node.get("interfaces") or []:
+                interface = self._add_interface(node, topology_interface["slot"], topology_interface.get("label"))
+                interface_ids[topology_interface["id"]] = interface["id"]
+
+        for topology_link in topology.get("links") or []:
+            self.add_link(lab["id"], interface_ids[topology_link["i1"]], interface_ids[topology_link["i2"]])
+
+        return {"id": lab["id"], "warnings": []}
+
+    # ASGI
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        """ASGI entry point"""
+        if scope["type"] == "http":
+            await self._serve_http(scope, receive, send)
+        elif scope["type"] == "websocket":
+            await self._serve_websocket(scope, receive, send)
+        elif scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+
+    async def _serve_http(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                break
+
+        method = scope["method"]
+        path = scope["path"]
+        headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope.get("headers", [])}
+        query = dict(parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+        extra_headers = []
+
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + self.random.uniform(0, self.jitter))
+
+        try:
+            handler, params, route = self._route(method, path)
+            self.request_counts[route] += 1
+            if handler is None:
+                raise MockError(404, f"No such endpoint: {path}")
+            if handler != self._authenticate:
+                if self.error_rate and self.random.random() < self.error_rate:
+                    self.injected_errors += 1
+                    if self.retry_after is not None:
+                        extra_headers.append((b"retry-after", str(self.retry_after).encode("ascii")))
+                    raise MockError(self.error_status, "Injected failure")
+                if not self._authorized(headers):
+                    raise MockError(401, "No valid token")
+
+            result = handler(MockRequest(method, path, query, headers, body, params))
+            status = 200
+        except MockError as e:
+            status, result = e.status, {"code": e.status, "description": e.description}
+
+        if isinstance(result, str) and path.endswith("/config") and status == 200:
+            payload, content_type = result.encode("utf-8"), b"text/plain; charset=utf-8"
+        else:
+            payload, content_type = json.dumps(result).encode("utf-8"), b"application/json"
+
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", content_type), (b"content-length", str(len(payload)).encode("ascii"))] + extra_headers
+        })
+        await send({"type": "http.response.body", "body": payload})
+
+    async def _serve_websocket(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        message = await receive()
+        if message["type"] != "websocket.connect":
+            return
+        headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope.get("headers", [])}
+        if scope["path"] != "/ws/client" or not self._authorized(headers):
+            await send({"type": "websocket.close", "code": 1008})
+            return
+
+        await send({"type": "websocket.accept"})
+        queue = asyncio.Queue()
+        self._event_queues.add(queue)
+
+        async def forward_events():
+            while True:
+                event = await queue.get()
+                await send({"type": "websocket.send", "text": json.dumps(event)})
+
+        forwarder = asyncio.ensure_future(forward_events())
+        try:
+            while (await receive())["type"] != "websocket.disconnect":
+                pass
+        finally:
+            forwarder.cancel()
+            self._event_queues.discard(queue)
+
+
+def main() -> None:
+    """Serve the mock controller over HTTP"""
+    parser = argparse.ArgumentParser(description="Serve an in-memory mock CML controller")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random delay of up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests failed on purpose")
+    parser.add_argument("--retry-after", type=float, default=None, help="Retry-After header sent with injected failures")
+    parser.add_argument("--boot-time", type=float, default=5.0, help="seconds a node takes to boot")
+    parser.add_argument("--transition-time", type=float, default=1.0, help="seconds a lab takes to stop or wipe")
+    parser.add_argument("--ids-only", action="store_true", help="ignore data=true on listings, like older controllers")
+    args = parser.parse_args()
+
+    try:
+        import uvicorn
+    except ImportError:
+        print("uvicorn is required to serve the mock over HTTP (pip install uvicorn)", file=sys.stderr)
+        sys.exit(1)
+
+    app = MockCML(
+        username=args.username,
+        password=args.password,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after,
+        boot_time=args.boot_time,
+        transition_time=args.transition_time,
+        bulk_listings=not args.ids_only
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
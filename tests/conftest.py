@@ -0,0 +1,41 @@
+"""
+Shared fixtures: the tools module imported quietly, and a client connected to mock_cml.MockCML
+"""
+
+import os
+import sys
+import asyncio
+
+import httpx
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CML_LOG_LEVEL", "ERROR")
+
+import claude_modeling_labs as cml  # noqa: E402
+from mock_cml import MockCML  # noqa: E402
+
+
+@pytest.fixture
+def mock_cml():
+    """An empty mock controller"""
+    return MockCML(seed=1)
+
+
+@pytest.fixture
+def with_client(mock_cml):
+    """Run a coroutine function with the tools' client logged in to mock_cml"""
+    def run(coroutine_function):
+        async def main():
+            cml.cml_auth = cml.CMLAuth("http://mock-cml", mock_cml.username, mock_cml.password, transport=httpx.ASGITransport(app=mock_cml))
+            await cml.cml_auth.authenticate()
+            try:
+                return await coroutine_function()
+            finally:
+                await cml.cml_auth.client.aclose()
+        return asyncio.run(main())
+
+    yield run
+    cml.cml_auth = None
+    for cache in (cml._interface_indexes, cml._config_hashes, cml._lab_graphs):
+        cache.clear()
@@ -0,0 +1,26 @@
+import ipaddress
+
+import pytest
+
+from claude_modeling_labs import IPv4Allocator
+
+
+def test_allocates_consecutive_subnets():
+    allocator = IPv4Allocator("10.0.0.0/24", 30)
+    subnets = [str(ipaddress.IPv4Address(allocator.allocate())) for _ in range(3)]
+    assert subnets == ["10.0.0.0", "10.0.0.4", "10.0.0.8"]
+    assert allocator.netmask == "255.255.255.252"
+    assert allocator.hostmask == "0.0.0.3"
+
+
+def test_host_routes_fill_the_pool():
+    allocator = IPv4Allocator("192.168.1.0/30", 32)
+    assert [allocator.allocate() & 0xff for _ in range(4)] == [0, 1, 2, 3]
+    with pytest.raises(ValueError, match="exhausted"):
+        allocator.allocate()
+
+
+@pytest.mark.parametrize("pool, prefix_length", [("10.0.0.0/24", 16), ("10.0.0.0/24", 33), ("10.0.0.0/33", 30)])
+def test_invalid_sizes_raise_value_error(pool, prefix_length):
+    with pytest.raises(ValueError):
+        IPv4Allocator(pool, prefix_length)
@@ -0,0 +1,21 @@
+import pytest
+
+from claude_modeling_labs import _topological_order
+
+
+def test_steps_follow_their_dependencies():
+    dependencies = {"links": ["nodes", "interfaces"], "interfaces": ["nodes"], "nodes": ["lab"], "lab": [], "configs": ["nodes"]}
+    order = _topological_order(dependencies)
+    assert sorted(order) == sorted(dependencies)
+    for name, needs in dependencies.items():
+        assert all(order.index(dependency) < order.index(name) for dependency in needs)
+
+
+def test_unknown_dependency_raises_value_error():
+    with pytest.raises(ValueError, match="unknown step 'missing'"):
+        _topological_order({"a": ["missing"]})
+
+
+def test_cycle_raises_value_error():
+    with pytest.raises(ValueError, match="cycle"):
+        _topological_order({"a": ["c"], "b": ["a"], "c": ["b"], "d": []})
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+import claude_modeling_labs as cml
+
+
+def test_concurrent_batches_keep_their_own_stats(mock_cml, with_client):
+    lab_id = mock_cml.add_lab("lab")["id"]
+
+    async def two_batches():
+        small, large = {}, {}
+        await asyncio.gather(
+            cml.cml_auth.request_many([("GET", f"/api/v0/labs/{lab_id}")] * 2, stats=small),
+            cml.cml_auth.request_many([("GET", f"/api/v0/labs/{lab_id}")] * 5 + [("GET", "/api/v0/labs/missing")], stats=large)
+        )
+        return small, large
+
+    small, large = with_client(two_batches)
+    assert (small["requests"], small["errors"]) == (2, 0)
+    assert (large["requests"], large["errors"]) == (6, 1)
+
+
+def test_concurrent_401s_authenticate_once(mock_cml, with_client):
+    lab_id = mock_cml.add_lab("lab")["id"]
+
+    async def after_token_revoked():
+        mock_cml.tokens.clear()
+        mock_cml.reset_counts()
+        return await cml.cml_auth.request_many([("GET", f"/api/v0/labs/{lab_id}")] * 20)
+
+    responses = with_client(after_token_revoked)
+    assert all(response.status_code == 200 for response in responses)
+    assert mock_cml.request_counts["POST /api/v0/authenticate"] == 1
+
+
+def test_wait_for_state_reaches_a_state(mock_cml, with_client):
+    mock_cml.transition_time = 0.2
+    lab_id = mock_cml.add_lab("lab", state="STARTED")["id"]
+
+    async def stop_and_wait():
+        await cml.cml_auth.request("PUT", f"/api/v0/labs/{lab_id}/stop")
+        return await cml.cml_auth.wait_for_state(f"/api/v0/labs/{lab_id}", ("STOPPED",), timeout=5, initial_delay=0.05)
+
+    assert with_client(stop_and_wait) == "STOPPED"
+
+
+def test_wait_for_state_times_out(mock_cml, with_client):
+    lab_id = mock_cml.add_lab("lab", state="STARTED")["id"]
+
+    async def wait():
+        with pytest.raises(TimeoutError, match="still STARTED"):
+            await cml.cml_auth.wait_for_state(f"/api/v0/labs/{lab_id}", ("STOPPED",), timeout=0.3, initial_delay=0.05)
+
+    with_client(wait)
+
+
+def test_wait_for_state_stops_on_a_failure_state(mock_cml, with_client):
+    lab_id = mock_cml.add_lab("lab", state="STARTED")["id"]
+
+    async def wait():
+        with pytest.raises(RuntimeError, match="entered STARTED"):
+            await cml.cml_auth.wait_for_state(f"/api/v0/labs/{lab_id}", ("STOPPED",), timeout=5, failure_states=("STARTED",))
+
+    with_client(wait)
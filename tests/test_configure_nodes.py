@@ -0,0 +1,53 @@
+import pytest
+
+import claude_modeling_labs as cml
+
+
+@pytest.mark.parametrize("bulk_listings", [True, False])
+def test_reported_requests_match_the_controller(mock_cml, with_client, bulk_listings):
+    mock_cml.bulk_listings = bulk_listings
+    lab_id = mock_cml.add_lab("lab")["id"]
+    node_ids = [mock_cml.add_node(lab_id, f"R{index}", "iosv")["id"] for index in range(10)]
+
+    async def configure():
+        mock_cml.reset_counts()
+        return await cml.configure_nodes(lab_id, {node_id: "hostname R" for node_id in node_ids[:3]})
+
+    result = with_client(configure)
+    assert result["status"] == "success"
+    assert result["requests"] == mock_cml.total_requests == (4 if bulk_listings else 14)
+
+
+def test_repushing_the_same_configs_sends_nothing(mock_cml, with_client):
+    lab_id = mock_cml.add_lab("lab")["id"]
+    node_ids = [mock_cml.add_node(lab_id, f"R{index}", "iosv")["id"] for index in range(5)]
+    configs = {node_id: f"hostname R{index}" for index, node_id in enumerate(node_ids)}
+
+    async def push_twice():
+        first = await cml.configure_nodes(lab_id, configs)
+        mock_cml.reset_counts()
+        second = await cml.configure_nodes(lab_id, configs)
+        return first, second, mock_cml.total_requests
+
+    first, second, requests = with_client(push_twice)
+    assert sorted(first["configured"]) == sorted(node_ids)
+    assert second["configured"] == [] and sorted(second["unchanged"]) == sorted(node_ids)
+    assert second["requests"] == requests == 0
+
+
+def test_state_changes_force_a_fresh_comparison(mock_cml, with_client):
+    lab_id = mock_cml.add_lab("lab")["id"]
+    node_id = mock_cml.add_node(lab_id, "R1", "iosv")["id"]
+
+    async def push_edit_stop_push():
+        await cml.configure_nodes(lab_id, {node_id: "hostname R1"})
+        mock_cml.nodes[node_id]["configuration"] = "hostname edited"
+        stale = await cml.configure_nodes(lab_id, {node_id: "hostname R1"})
+        await cml.stop_lab(lab_id)
+        fresh = await cml.configure_nodes(lab_id, {node_id: "hostname R1"})
+        return stale, fresh
+
+    stale, fresh = with_client(push_edit_stop_push)
+    assert stale["unchanged"] == [node_id]
+    assert fresh["configured"] == [node_id]
+    assert mock_cml.nodes[node_id]["configuration"] == "hostname R1"
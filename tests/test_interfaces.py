@@ -0,0 +1,39 @@
+import asyncio
+
+import claude_modeling_labs as cml
+
+
+def test_concurrent_links_get_distinct_interfaces(mock_cml, with_client):
+    lab_id = mock_cml.add_lab("lab")["id"]
+    hub = mock_cml.add_node(lab_id, "hub", "iosv", interface_count=6)["id"]
+    spokes = [mock_cml.add_node(lab_id, f"spoke{index}", "iosv", interface_count=1)["id"] for index in range(7)]
+
+    async def link_all():
+        return await asyncio.gather(*[cml.link_nodes(lab_id, hub, spoke) for spoke in spokes])
+
+    results = with_client(link_all)
+    assert sum(1 for result in results if "error" in result) == 1
+    assert sum(1 for result in results if "error" not in result) == 6
+
+    links = mock_cml.links.values()
+    hub_interfaces = [link["src_int"] if link["src_node"] == hub else link["dst_int"] for link in links]
+    assert len(hub_interfaces) == len(set(hub_interfaces)) == 6
+    assert all(interface["is_connected"] for interface in mock_cml.interfaces.values() if interface["node"] == hub)
+
+
+def test_deleted_links_free_their_interfaces(mock_cml, with_client):
+    lab_id = mock_cml.add_lab("lab")["id"]
+    node_a = mock_cml.add_node(lab_id, "A", "iosv", interface_count=1)["id"]
+    node_b = mock_cml.add_node(lab_id, "B", "iosv", interface_count=1)["id"]
+
+    async def relink():
+        first = await cml.link_nodes(lab_id, node_a, node_b)
+        full = await cml.link_nodes(lab_id, node_a, node_b)
+        await cml.delete_link(lab_id, first["link_id"])
+        second = await cml.link_nodes(lab_id, node_a, node_b)
+        return first, full, second
+
+    first, full, second = with_client(relink)
+    assert "error" in full
+    assert "error" not in second
+    assert list(mock_cml.links) == [second["link_id"]]
@@ -0,0 +1,71 @@
+import re
+
+import claude_modeling_labs as cml
+
+
+def titles(listing):
+    return re.findall(r"^- (\S+) \(ID: ", listing, re.MULTILINE)
+
+
+def test_pages_cover_every_lab_once(mock_cml, with_client):
+    for index in range(7):
+        mock_cml.add_lab(f"lab-{index}")
+
+    async def page_through():
+        pages = []
+        offset = 0
+        while True:
+            listing = await cml.list_labs(offset=offset, limit=3)
+            pages.append(listing)
+            match = re.search(r"continue with offset=(\d+)", listing)
+            if not match:
+                return pages
+            offset = int(match.group(1))
+
+    pages = with_client(page_through)
+    assert [len(titles(page)) for page in pages] == [3, 3, 1]
+    assert sum((titles(page) for page in pages), []) == [f"lab-{index}" for index in range(7)]
+    assert pages[-1].endswith("Showing labs 7-7 of 7")
+
+
+def test_filters_apply_before_paging(mock_cml, with_client):
+    for index in range(6):
+        mock_cml.add_lab(f"lab-{index}", state="STARTED" if index % 2 else "STOPPED")
+
+    listing = with_client(lambda: cml.list_labs(offset=1, limit=5, state="STARTED"))
+    assert titles(listing) == ["lab-3", "lab-5"]
+    assert "Showing labs 2-3 of 3" in listing
+
+
+def test_empty_and_past_the_end(mock_cml, with_client):
+    assert with_client(lambda: cml.list_labs()) == "No labs found in CML."
+    mock_cml.add_lab("only")
+    assert with_client(lambda: cml.list_labs(offset=5)) == "No labs beyond offset 5."
+    assert with_client(lambda: cml.list_labs(title_contains="nothing")) == "No labs match the given filters."
+
+
+def test_max_chars_holds_even_for_an_oversized_first_lab(mock_cml, with_client):
+    mock_cml.add_lab("huge", description="x" * 5000)
+    mock_cml.add_lab("small")
+
+    listing = with_client(lambda: cml.list_labs(max_chars=1000))
+    assert len(listing) <= 1000
+    assert titles(listing) == ["huge"]
+    assert "(truncated)" in listing
+    assert "continue with offset=1" in listing
+
+
+def test_unknown_fields_are_rejected(with_client):
+    assert with_client(lambda: cml.list_labs(fields=["colour"])).startswith("Error listing labs: unknown fields")
+
+
+def test_details_are_fetched_for_one_lab_past_the_page(mock_cml, with_client):
+    for index in range(100):
+        mock_cml.add_lab(f"lab-{index}")
+
+    for limit in (50, 60):
+        mock_cml.reset_counts()
+        listing = with_client(lambda: cml.list_labs(limit=limit))
+        assert f"continue with offset={limit}" in listing
+        # Details for the page and the one-lab look-ahead, nothing more
+        assert mock_cml.request_counts["GET /api/v0/labs/([^/]+)"] == limit + 1
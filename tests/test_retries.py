@@ -0,0 +1,91 @@
+import httpx
+import pytest
+
+from claude_modeling_labs import RetryBudget, RetryPolicy, _parse_retry_after
+
+
+def test_budget_allows_a_steady_minimum():
+    budget = RetryBudget(ratio=0.0, min_retries_per_second=0.5, window=10.0)
+    assert [budget.try_spend() for _ in range(6)] == [True] * 5 + [False]
+
+
+def test_budget_grows_with_requests():
+    budget = RetryBudget(ratio=0.5, min_retries_per_second=0.0, window=10.0)
+    assert not budget.try_spend()
+    for _ in range(4):
+        budget.record_request()
+    assert [budget.try_spend() for _ in range(3)] == [True, True, False]
+
+
+def test_budget_forgets_old_requests(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("claude_modeling_labs.time.monotonic", lambda: now[0])
+    budget = RetryBudget(ratio=1.0, min_retries_per_second=0.0, window=10.0)
+    budget.record_request()
+    assert budget.try_spend()
+    now[0] += 11
+    assert not budget.try_spend()
+
+
+def policy(**kwargs):
+    return RetryPolicy(budget=RetryBudget(min_retries_per_second=100.0), **kwargs)
+
+
+@pytest.mark.parametrize("method, status, retried", [
+    ("GET", 503, True),
+    ("GET", 502, True),
+    ("GET", 500, False),
+    ("GET", 404, False),
+    ("POST", 503, True),
+    ("POST", 429, True),
+    ("POST", 502, False),
+    ("PUT", 504, True),
+])
+def test_retried_statuses(method, status, retried):
+    delay = policy().retry_delay(method, 0, response=httpx.Response(status))
+    assert (delay is not None) == retried
+
+
+def test_backoff_stays_within_the_exponential_ceiling():
+    retry_policy = policy(base_delay=0.5, max_delay=3.0)
+    for attempt, ceiling in enumerate([0.5, 1.0, 2.0, 3.0, 3.0]):
+        assert all(0 <= retry_policy.backoff(attempt) <= ceiling for _ in range(50))
+
+
+def test_gives_up_after_max_retries():
+    retry_policy = policy(max_retries=2)
+    response = httpx.Response(503)
+    assert retry_policy.retry_delay("GET", 1, response=response) is not None
+    assert retry_policy.retry_delay("GET", 2, response=response) is None
+    assert policy(max_retries=0).retry_delay("GET", 0, response=response) is None
+
+
+def test_retry_after_sets_the_delay_or_gives_up():
+    retry_policy = policy(max_delay=30.0)
+    assert retry_policy.retry_delay("GET", 0, response=httpx.Response(429, headers={"Retry-After": "7"})) == 7.0
+    assert retry_policy.retry_delay("GET", 0, response=httpx.Response(429, headers={"Retry-After": "120"})) is None
+
+
+def test_only_unsent_errors_retry_non_idempotent_requests():
+    retry_policy = policy()
+    assert retry_policy.retry_delay("POST", 0, error=httpx.ConnectError("refused")) is not None
+    assert retry_policy.retry_delay("POST", 0, error=httpx.ReadTimeout("slow")) is None
+    assert retry_policy.retry_delay("GET", 0, error=httpx.ReadTimeout("slow")) is not None
+    assert retry_policy.retry_delay("POST", 0, error=httpx.ReadTimeout("slow"), idempotent=True) is not None
+    assert retry_policy.retry_delay("GET", 0, error=ValueError("bug")) is None
+
+
+def test_exhausted_budget_stops_retries():
+    retry_policy = RetryPolicy(budget=RetryBudget(ratio=0.0, min_retries_per_second=0.1, window=10.0))
+    response = httpx.Response(503)
+    assert retry_policy.retry_delay("GET", 0, response=response) is not None
+    assert retry_policy.retry_delay("GET", 0, response=response) is None
+
+
+@pytest.mark.parametrize("value, expected", [("3", 3.0), ("0.5", 0.5), ("-2", 0.0), ("", None), (None, None), ("soon", None)])
+def test_parse_retry_after(value, expected):
+    assert _parse_retry_after(value) == expected
+
+
+def test_parse_retry_after_http_date():
+    assert _parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
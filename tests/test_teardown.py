@@ -0,0 +1,56 @@
+import claude_modeling_labs as cml
+
+
+def seed(mock_cml):
+    labs = {}
+    for state in ("STARTED", "STOPPED", "DEFINED_ON_CORE"):
+        lab_id = mock_cml.add_lab(f"ci-{state.lower()}", state=state)["id"]
+        mock_cml.add_node(lab_id, "R1", "iosv", interface_count=1)
+        if state != "DEFINED_ON_CORE":
+            mock_cml.set_lab_state(lab_id, state, "BOOTED" if state == "STARTED" else "STOPPED")
+        labs[state] = lab_id
+    labs["keep"] = mock_cml.add_lab("keep-me", state="STARTED")["id"]
+    return labs
+
+
+def test_dry_run_only_lists(mock_cml, with_client):
+    labs = seed(mock_cml)
+
+    async def dry_run():
+        mock_cml.reset_counts()
+        return await cml.teardown_labs(title_contains="ci-")
+
+    result = with_client(dry_run)
+    assert result["dry_run"] is True
+    assert {lab["lab_id"] for lab in result["selected"]} == {labs["STARTED"], labs["STOPPED"], labs["DEFINED_ON_CORE"]}
+    assert len(mock_cml.labs) == 4
+    assert all(route.startswith("GET ") for route in mock_cml.request_counts)
+
+
+def test_delete_stops_wipes_and_deletes(mock_cml, with_client):
+    labs = seed(mock_cml)
+
+    result = with_client(lambda: cml.teardown_labs(title_contains="ci-", dry_run=False))
+    assert result["status"] == "success"
+    assert result["deleted"] == 3
+    assert list(mock_cml.labs) == [labs["keep"]]
+    assert mock_cml.request_counts["PUT /api/v0/labs/([^/]+)/stop"] == 1
+    assert mock_cml.request_counts["PUT /api/v0/labs/([^/]+)/wipe"] == 2
+
+
+def test_lab_ids_are_fetched_directly(mock_cml, with_client):
+    labs = seed(mock_cml)
+    for index in range(50):
+        mock_cml.add_lab(f"other-{index}")
+
+    async def select():
+        mock_cml.reset_counts()
+        return await cml.teardown_labs(lab_ids=[labs["STOPPED"], labs["keep"], "missing"], state="STOPPED")
+
+    result = with_client(select)
+    assert [lab["lab_id"] for lab in result["selected"]] == [labs["STOPPED"]]
+    assert mock_cml.total_requests == 3
+
+
+def test_refuses_to_select_everything(with_client):
+    assert "error" in with_client(lambda: cml.teardown_labs(dry_run=False))
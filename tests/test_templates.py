@@ -0,0 +1,63 @@
+import pytest
+
+from claude_modeling_labs import ConfigTemplate
+
+
+def test_values_and_nested_keys():
+    template = ConfigTemplate("hostname {{ name }}\nip address {{ interface.ip }} {{ interface.mask }}\n")
+    rendered = template.render({"name": "R1", "interface": {"ip": "10.0.0.1", "mask": "255.255.255.0"}})
+    assert rendered == "hostname R1\nip address 10.0.0.1 255.255.255.0\n"
+
+
+def test_loops_and_conditions_drop_tag_lines():
+    template = ConfigTemplate(
+        "{% for vlan in vlans %}\n"
+        "vlan {{ vlan.id }}\n"
+        "{% if vlan.name == 'mgmt' %}\n"
+        " name management\n"
+        "{% elif not vlan.name %}\n"
+        " shutdown\n"
+        "{% else %}\n"
+        " name {{ vlan.name }}\n"
+        "{% endif %}\n"
+        "{% endfor %}\n"
+    )
+    rendered = template.render({"vlans": [{"id": 10, "name": "mgmt"}, {"id": 20, "name": ""}, {"id": 30, "name": "users"}]})
+    assert rendered == "vlan 10\n name management\nvlan 20\n shutdown\nvlan 30\n name users\n"
+
+
+def test_integer_comparison():
+    template = ConfigTemplate("{% if area != 0 %}area {{ area }}{% endif %}")
+    assert template.render({"area": 0}) == ""
+    assert template.render({"area": 2}) == "area 2"
+
+
+@pytest.mark.parametrize("literal", ["a\\b", "\\", "it\"s", "x' + str(1) + '"])
+def test_condition_literals_are_not_code(literal):
+    quoted = f"'{literal}'" if "'" not in literal else f'"{literal}"'
+    template = ConfigTemplate(f"{{% if value == {quoted} %}}match{{% endif %}}")
+    assert template.render({"value": literal}) == "match"
+    assert template.render({"value": "other"}) == ""
+
+
+def test_render_many_matches_render():
+    template = ConfigTemplate("interface {{ name }}\n")
+    variable_sets = [{"name": f"Gi0/{index}"} for index in range(5)]
+    assert template.render_many(variable_sets) == [template.render(variables) for variables in variable_sets]
+
+
+@pytest.mark.parametrize("source", [
+    "{% if x %}unclosed",
+    "{% endif %}",
+    "{% for x of xs %}{% endfor %}",
+    "{% include other %}",
+    "{{ not-a-name }}",
+])
+def test_syntax_errors_raise_value_error(source):
+    with pytest.raises(ValueError):
+        ConfigTemplate(source)
+
+
+def test_missing_variable_raises_value_error():
+    with pytest.raises(ValueError, match="Undefined template variable"):
+        ConfigTemplate("hostname {{ name }}").render({})
@@ -0,0 +1,68 @@
+import pytest
+import yaml
+
+import claude_modeling_labs as cml
+
+SPEC = {
+    "title": "Triangle",
+    "description": "Three routers",
+    "nodes": [
+        {"label": "R1", "node_definition": "iosv", "x": 0, "y": 0, "config": "hostname R1"},
+        {"label": "R2", "node_definition": "iosv", "x": 200, "y": 0, "config": "hostname R2", "ram": 1024},
+        {"label": "SW", "node_definition": "unmanaged_switch", "x": 100, "y": 200},
+    ],
+    "links": [{"a": "R1", "b": "R2", "a_slot": 2}, {"a": "R1", "b": "SW"}, {"a": "R2", "b": "SW"}],
+}
+
+
+def test_import_round_trip(mock_cml, with_client):
+    result = with_client(lambda: cml.import_topology(SPEC))
+    assert "error" not in result
+    lab = mock_cml.labs[result["lab_id"]]
+    assert lab["title"] == "Triangle"
+
+    nodes = {mock_cml.nodes[node_id]["label"]: mock_cml.nodes[node_id] for node_id in result["node_ids"].values()}
+    assert set(nodes) == {"R1", "R2", "SW"}
+    assert nodes["R1"]["configuration"] == "hostname R1"
+    assert nodes["R2"]["ram"] == 1024
+
+    def endpoint(interface_id):
+        interface = mock_cml.interfaces[interface_id]
+        return mock_cml.nodes[interface["node"]]["label"], interface["slot"]
+
+    links = {tuple(sorted([endpoint(link["src_int"]), endpoint(link["dst_int"])])) for link in mock_cml.links.values()}
+    assert len(links) == 3
+    assert (("R1", 2), ("R2", 0)) in links
+    assert {label for link in links for label, _ in link} == {"R1", "R2", "SW"}
+
+
+def test_imported_configs_are_known_to_configure_nodes(mock_cml, with_client):
+    async def import_then_configure():
+        result = await cml.import_topology(SPEC)
+        mock_cml.reset_counts()
+        configs = {result["node_ids"]["R1"]: "hostname R1", result["node_ids"]["R2"]: "hostname R2"}
+        return await cml.configure_nodes(result["lab_id"], configs)
+
+    result = with_client(import_then_configure)
+    assert result["configured"] == []
+    assert result["requests"] == 0
+
+
+@pytest.mark.parametrize("spec, problem", [
+    ({"nodes": [{"label": "R1", "node_definition": "iosv"}], "links": [{"a": "R1", "b": "R9"}]}, "R9"),
+    ({"nodes": [{"label": "R1", "node_definition": "iosv"}, {"label": "R1", "node_definition": "iosv"}]}, "duplicate node label"),
+    ({"nodes": [{"label": "R1", "node_definition": "iosv", "interfaces": 40}]}, "at most 16"),
+])
+def test_inconsistent_specs_are_rejected_before_upload(mock_cml, with_client, spec, problem):
+    result = with_client(lambda: cml.import_topology(spec))
+    assert "error" in result
+    assert any(problem in error for error in result["errors"])
+    assert mock_cml.labs == {}
+
+
+def test_rendered_document_describes_every_link():
+    document = yaml.safe_load(cml._render_topology(SPEC))
+    assert document["lab"]["title"] == "Triangle"
+    interfaces = {interface["id"]: (node["label"], interface["slot"]) for node in document["nodes"] for interface in node["interfaces"]}
+    assert len(document["links"]) == 3
+    assert {tuple(sorted([interfaces[link["i1"]], interfaces[link["i2"]]])) for link in document["links"]} >= {(("R1", 2), ("R2", 0))}
@@ -0,0 +1,36 @@
+import pytest
+
+from claude_modeling_labs import _format_image_definitions, _format_node_definitions, _validate_node_spec
+from mock_cml import DEFAULT_IMAGE_DEFINITIONS, DEFAULT_NODE_DEFINITIONS
+
+NODE_CATALOG = _format_node_definitions(DEFAULT_NODE_DEFINITIONS)
+IMAGE_CATALOG = _format_image_definitions(DEFAULT_IMAGE_DEFINITIONS)
+
+
+def test_valid_nodes_pass():
+    assert _validate_node_spec({"node_definition": "iosv", "ram": 1024, "cpu_limit": 50, "interfaces": 4}, NODE_CATALOG, IMAGE_CATALOG) == []
+    assert _validate_node_spec({"node_definition": "unmanaged_switch"}, NODE_CATALOG, IMAGE_CATALOG, interface_count=32) == []
+
+
+@pytest.mark.parametrize("node, interface_count, problem", [
+    ({"node_definition": "nope"}, 0, "unknown node definition 'nope'"),
+    ({"node_definition": "iosv", "ram": 0}, 0, "ram must be a positive number"),
+    ({"node_definition": "iosv", "cpu_limit": 10}, 0, "cpu_limit must be a percentage"),
+    ({"node_definition": "iosv", "cpus": 0}, 0, "cpus must be between 1 and 128"),
+    ({"node_definition": "iosv", "interfaces": "many"}, 0, "interfaces must be a number"),
+    ({"node_definition": "iosv", "interfaces": 17}, 0, "interfaces asks for 17 interfaces but iosv has at most 16"),
+    ({"node_definition": "iosv", "parameters": {"slot1": 20}}, 0, "slot1 asks for 20 interfaces"),
+    ({"node_definition": "iosv"}, 17, "links need 17 interfaces but iosv has at most 16"),
+    ({"node_definition": "iosv", "image_definition": "missing"}, 0, "unknown image definition 'missing'"),
+    ({"node_definition": "iosv", "image_definition": "alpine-default"}, 0, "belongs to alpine, not iosv"),
+])
+def test_rejections(node, interface_count, problem):
+    errors = _validate_node_spec(node, NODE_CATALOG, IMAGE_CATALOG, interface_count)
+    assert len(errors) == 1
+    assert problem in errors[0]
+
+
+def test_missing_images_are_only_checked_with_an_image_catalog():
+    no_images = _format_image_definitions([])
+    assert _validate_node_spec({"node_definition": "iosv"}, NODE_CATALOG, no_images) == ["no image is installed for iosv"]
+    assert _validate_node_spec({"node_definition": "iosv"}, NODE_CATALOG) == []
@@ -0,0 +1,66 @@
+"""
+Trace to Folded Stacks - Convert CML_TRACE_FILE spans for flame graph tools
+
+Reads the JSON-lines spans written when CML_TRACE_FILE is set and prints one
+"root;child;leaf <microseconds>" line per stack, weighted by self time (a
+span's duration minus the time covered by its children). The output feeds
+flamegraph.pl, speedscope or inferno directly:
+
+    python trace_to_folded.py trace.jsonl > trace.folded
+    flamegraph.pl trace.folded > trace.svg
+
+Children of concurrent steps can overlap, so self time is floored at zero.
+
+License: MIT
+"""
+
+import sys
+import json
+import argparse
+import collections
+from typing import Dict, List, Any
+
+
+def fold_spans(spans: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Fold spans into stacks weighted by self time
+
+    Args:
+        spans: Span dictionaries as written to CML_TRACE_FILE
+
+    Returns:
+        Dictionary mapping "root;child;leaf" stacks to microseconds
+    """
+    by_id = {span["span_id"]: span for span in spans}
+    child_time = collections.Counter()
+    for span in spans:
+        if span.get("parent_span_id") in by_id:
+            child_time[span["parent_span_id"]] += span["end_time_unix_nano"] - span["start_time_unix_nano"]
+
+    stacks = collections.Counter()
+    for span in spans:
+        names = []
+        current = span
+        while current is not None:
+            names.append(current["name"].replace(";", ":"))
+            current = by_id.get(current.get("parent_span_id"))
+        self_time = span["end_time_unix_nano"] - span["start_time_unix_nano"] - child_time[span["span_id"]]
+        stacks[";".join(reversed(names))] += max(0, self_time) // 1000
+    return stacks
+
+
+def main() -> None:
+    """Print folded stacks for a trace file"""
+    parser = argparse.ArgumentParser(description="Convert CML_TRACE_FILE spans to folded stacks for flame graphs")
+    parser.add_argument("trace_file", help="JSON-lines file written by the CML_TRACE_FILE exporter")
+    args = parser.parse_args()
+
+    with open(args.trace_file, encoding="utf-8") as trace_file:
+        spans = [json.loads(line) for line in trace_file if line.strip()]
+    for stack, microseconds in sorted(fold_spans(spans).items()):
+        if microseconds:
+            sys.stdout.write(f"{stack} {microseconds}\n")
+
+
+if __name__ == "__main__":
+    main()